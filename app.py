@@ -9,6 +9,11 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from simulator import PromoSimulator
+from cleaner import FrameValidator
+from clean_cache import CleaningCache
+from ingest import CLEAN_FILES, read_tables, table_paths
+from exporter import available_formats, export_filename, export_mime, get_export
+from fingerprint import dataset_fingerprint
 import numpy as np
 import io
 import sys
@@ -19,6 +24,7 @@ from datetime import datetime
 from typing import Tuple, Dict, Optional, List
 import warnings
 import json
+from collections import OrderedDict
 
 # Suppress warnings for cleaner output
 warnings.filterwarnings('ignore')
@@ -30,6 +36,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Uploads may be plain CSV or gzip / zstd / zip compressed CSV
+UPLOAD_TYPES = ['csv', 'gz', 'zst', 'zip']
+
+# simulate_promo uplift models and their sidebar labels
+UPLIFT_MODEL_LABELS = {
+    'rules': 'Rule-based multipliers',
+    'elasticity': 'Fitted elasticity (segment)',
+    'sku_elasticity': 'Fitted elasticity (per SKU)',
+}
+BASELINE_MODEL_LABELS = {
+    'average': '30-day average',
+    'forecast': 'Seasonal forecast',
+}
+
+# Exact KPIs remembered per session (dataset x filters), least recently used dropped first
+MAX_EXACT_KPI_ENTRIES = 32
+
 # Add utils to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.streamlit'))
 
@@ -323,6 +346,11 @@ def validate_dataframe(df: pd.DataFrame, required_cols: List[str], df_name: str
     log_error(f"{df_name} validation passed: {len(df)} rows, {len(df.columns)} columns", "INFO")
     return True, []
 
+@st.cache_resource
+def get_cleaning_cache() -> CleaningCache:
+    """Content-addressed cache of cleaned uploads (shared across sessions)"""
+    return CleaningCache()
+
 def load_custom_datasets(products_file, stores_file, sales_file, inventory_file, issues_file=None) -> Optional[Tuple]:
     """Load and clean custom datasets from uploaded files with comprehensive validation"""
     try:
@@ -333,21 +361,53 @@ def load_custom_datasets(products_file, stores_file, sales_file, inventory_file,
         st.session_state.error_logs = []
         st.session_state.data_quality_report = {}
         
+        # Byte-identical uploads under the same cleaning rules (and this app's
+        # cleaning code) reuse the last result
+        cache = get_cleaning_cache()
+        cache_key = cache.key({
+            'products': products_file, 'stores': stores_file, 'sales': sales_file,
+            'inventory': inventory_file, 'issues': issues_file,
+        }, namespace='app', code=APP_CLEANING_CODE)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            st.session_state.data_quality_report = cached['report']
+            success_msg = f"Unchanged upload - reused cleaned data in {time.time() - start_time:.2f}s"
+            st.success(f"✅ {success_msg}")
+            log_error(success_msg, "INFO")
+            return cached['tables']
+        
         # Load raw data
         with st.spinner("📂 Loading files..."):
-            products = pd.read_csv(products_file)
-            stores = pd.read_csv(stores_file)
-            sales = pd.read_csv(sales_file)
-            inventory = pd.read_csv(inventory_file)
+            uploads = {
+                'products': (products_file, 'products'),
+                'stores': (stores_file, 'stores'),
+                'sales': (sales_file, 'sales_raw'),
+                'inventory': (inventory_file, 'inventory'),
+            }
+            if issues_file:
+                uploads['issues'] = (issues_file, 'issues')
+            raw = read_tables(uploads)
+            products, stores, sales, inventory = (raw['products'], raw['stores'],
+                                                  raw['sales'], raw['inventory'])
             
             if issues_file:
-                issues = pd.read_csv(issues_file)
+                issues = raw['issues']
             else:
                 issues = pd.DataFrame({'issue_type': []})
                 log_error("No issues file provided, using empty DataFrame", "INFO")
         
         log_error(f"Raw data loaded - Products: {len(products)}, Stores: {len(stores)}, Sales: {len(sales)}, Inventory: {len(inventory)}", "INFO")
         
+        # Run the full validation rule set on the raw uploads (vectorized, one pass per table)
+        with st.spinner("🔎 Validating business rules..."):
+            validator = FrameValidator()
+            rule_violations = {}
+            for name, df in [('products', products), ('stores', stores),
+                             ('sales', sales), ('inventory', inventory)]:
+                rule_violations[name] = validator.summarize(validator.validate(df))
+                if rule_violations[name]['rows_with_violations'] > 0:
+                    log_error(f"{name.title()}: {rule_violations[name]['rows_with_violations']} rows violate validation rules", "WARNING")
+        
         # Clean each DataFrame
         with st.spinner("🧹 Cleaning data..."):
             products_clean, products_report = clean_dataframe(products, "Products")
@@ -364,6 +424,9 @@ def load_custom_datasets(products_file, stores_file, sales_file, inventory_file,
             'inventory': inventory_report,
             'issues': issues_report
         }
+        for name, counts in rule_violations.items():
+            st.session_state.data_quality_report[name]['rule_violations'] = counts
+        st.session_state.data_quality_report['issues']['issue_counts'] = summarize_issues(issues_clean)
         
         # Validate required columns
         required_products = ['product_id', 'category', 'brand', 'unit_cost_aed']
@@ -418,7 +481,12 @@ def load_custom_datasets(products_file, stores_file, sales_file, inventory_file,
         if total_removed > 0:
             st.warning(f"⚠️ Cleaned data: Removed {total_removed} problematic rows across all datasets")
         
-        return (products_clean, stores_clean, sales_clean, inventory_clean, issues_clean)
+        tables = (products_clean, stores_clean, sales_clean, inventory_clean, issues_clean)
+        try:
+            cache.put(cache_key, {'tables': tables, 'report': st.session_state.data_quality_report})
+        except OSError as e:
+            log_error(f"Could not cache cleaned upload: {str(e)}", "WARNING")
+        return tables
     
     except pd.errors.ParserError as e:
         error_msg = f"CSV format error: {str(e)}"
@@ -441,27 +509,20 @@ def load_data() -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame,
         start_time = time.time()
         log_error("Loading pre-built datasets", "INFO")
         
-        data_files = {
-            'products': 'products_clean.csv',
-            'stores': 'stores_clean.csv',
-            'sales': 'sales_clean.csv',
-            'inventory': 'inventory_clean.csv',
-            'issues': 'issues.csv'
-        }
+        # Plain or compressed (.gz / .zst / .zip) copies are both accepted
+        data_files = table_paths({**CLEAN_FILES, 'issues': ('issues.csv', 'issues')})
         
-        loaded_data = {}
-        missing_files = []
+        present = {name: spec for name, spec in data_files.items() if os.path.exists(spec[0])}
+        missing_files = [spec[0] for name, spec in data_files.items() if name not in present]
         
-        for name, filepath in data_files.items():
-            try:
-                if os.path.exists(filepath):
-                    loaded_data[name] = pd.read_csv(filepath)
-                    log_error(f"Loaded {name}: {len(loaded_data[name])} rows", "INFO")
-                else:
-                    missing_files.append(filepath)
-            except Exception as e:
-                logger.error(f"Error loading {filepath}: {str(e)}")
-                missing_files.append(filepath)
+        # All files are parsed concurrently with their declared schemas
+        try:
+            loaded_data = read_tables(present)
+        except Exception as e:
+            logger.error(f"Error loading data files: {str(e)}")
+            raise FileNotFoundError(f"Unreadable data files: {str(e)}")
+        for name, df in loaded_data.items():
+            log_error(f"Loaded {name}: {len(df)} rows", "INFO")
         
         if missing_files:
             raise FileNotFoundError(f"Missing files: {', '.join(missing_files)}")
@@ -490,9 +551,40 @@ def load_data() -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame,
         logger.exception("Data loading failed")
         st.stop()
 
-@st.cache_resource
-def initialize_simulator(_products, _stores, _sales, _inventory):
-    """Initialize simulator"""
+@st.cache_data
+def load_issue_summary() -> Optional[pd.DataFrame]:
+    """Exact per-rule issue counts written by cleaner.py (None if not available)"""
+    if not os.path.exists('issues_summary.csv'):
+        return None
+    try:
+        return pd.read_csv('issues_summary.csv')
+    except Exception as e:
+        logger.error(f"Error loading issues_summary.csv: {str(e)}")
+        return None
+
+def summarize_issues(issues: pd.DataFrame, issue_summary: Optional[pd.DataFrame] = None) -> Dict[str, int]:
+    """
+    Issue counts by type. Reads the cleaner's aggregates when available, since
+    issues.csv may only hold exemplar rows at aggregate/sample log levels.
+    """
+    if issue_summary is not None and len(issue_summary):
+        counts = issue_summary.groupby('issue_type')['issues'].sum()
+    elif 'issue_type' in issues.columns:
+        counts = issues['issue_type'].value_counts()
+    else:
+        return {}
+    return {str(k): int(v) for k, v in counts.sort_values(ascending=False).items()}
+
+# Code that turns an upload into the cached tables and report (hashed into the cache key)
+APP_CLEANING_CODE = (load_custom_datasets, clean_dataframe, validate_dataframe, summarize_issues)
+
+def dataset_key(*frames) -> str:
+    """Content fingerprint of the loaded tables (identifies a dataset across reruns and uploads)"""
+    return '-'.join(dataset_fingerprint(df) for df in frames)
+
+@st.cache_resource(max_entries=4)
+def initialize_simulator(_products, _stores, _sales, _inventory, data_key):
+    """Initialize simulator (one per dataset: the frames are not hashed, data_key is)"""
     return PromoSimulator(_products, _stores, _sales, _inventory)
 
 def calculate_advanced_kpis(sales: pd.DataFrame, products: pd.DataFrame, stores: pd.DataFrame, 
@@ -526,7 +618,8 @@ def calculate_advanced_kpis(sales: pd.DataFrame, products: pd.DataFrame, stores:
         logger.error(f"Error calculating KPIs: {str(e)}")
         return {}
 
-def create_scenario_comparison(sim, city, channel, category, budget, margin_floor, days):
+def create_scenario_comparison(sim, city, channel, category, budget, margin_floor, days,
+                               uplift_model='rules', baseline_model='average'):
     """Compare multiple scenarios"""
     scenarios = []
     discount_levels = [10, 15, 20, 25, 30, 35]
@@ -534,7 +627,8 @@ def create_scenario_comparison(sim, city, channel, category, budget, margin_floo
     for disc in discount_levels:
         try:
             _, violations, s_kpis = sim.simulate_promo(
-                city, channel, category, disc, budget, margin_floor, days
+                city, channel, category, disc, budget, margin_floor, days, uplift_model,
+                baseline_model, include_rows=False
             )
             scenarios.append({
                 'Discount %': disc,
@@ -550,22 +644,16 @@ def create_scenario_comparison(sim, city, channel, category, budget, margin_floo
     
     return pd.DataFrame(scenarios) if scenarios else pd.DataFrame()
 
-def create_product_matrix(sales_enriched):
-    """BCG-style matrix"""
-    product_perf = sales_enriched[sales_enriched['payment_status'] == 'Paid'].copy()
-    product_perf['revenue'] = product_perf['qty'] * product_perf['selling_price_aed']
-    product_perf['cogs'] = product_perf['qty'] * product_perf['unit_cost_aed']
-    product_perf['margin'] = product_perf['revenue'] - product_perf['cogs']
-    
-    perf = product_perf.groupby('category').agg({
-        'revenue': 'sum',
-        'margin': 'sum',
-        'qty': 'sum'
-    }).reset_index()
-    
-    perf['margin_pct'] = (perf['margin'] / perf['revenue'] * 100).fillna(0)
-    
-    return perf
+def format_interval(intervals, key, template):
+    """'± half-width' line for an approximate KPI card (empty for exact KPIs)"""
+    if not intervals:
+        return ""
+    low, high = intervals[key]
+    return f"<p>± {template.format((high - low) / 2)}</p>"
+
+def create_product_matrix(rollups):
+    """BCG-style matrix from the category rollup of the filtered sales"""
+    return rollups['category'][['category', 'revenue', 'margin', 'qty', 'margin_pct']]
 
 def create_revenue_margin_chart(sales_data):
     """Create enhanced Revenue vs Margin Trend chart"""
@@ -708,6 +796,19 @@ def display_data_quality_report():
                     for error in report['errors_found']:
                         st.write(f"• {error}")
                 
+                violated = {rule: n for rule, n in report.get('rule_violations', {}).items()
+                            if rule != 'rows_with_violations' and n > 0}
+                if violated:
+                    st.markdown("**Validation Rule Violations (raw upload):**")
+                    for rule, n in violated.items():
+                        st.write(f"• {rule}: {n:,} rows")
+                
+                issue_counts = report.get('issue_counts')
+                if issue_counts:
+                    st.markdown(f"**Logged Issues by Type ({sum(issue_counts.values()):,} total):**")
+                    for issue_type, n in issue_counts.items():
+                        st.write(f"• {issue_type}: {n:,}")
+                
                 if report['columns_cleaned']:
                     with st.expander(f"🔧 Columns Cleaned ({len(report['columns_cleaned'])})"):
                         for col_info in report['columns_cleaned']:
@@ -728,6 +829,7 @@ def main():
     if data_source == "📁 Pre-Built Dataset":
         try:
             products, stores, sales, inventory, issues = load_data()
+            issue_summary = load_issue_summary()
             st.sidebar.success("✅ Pre-built data loaded")
         except Exception as e:
             st.sidebar.error(f"Error loading pre-built data: {e}")
@@ -739,14 +841,14 @@ def main():
         
         col1, col2 = st.sidebar.columns(2)
         with col1:
-            products_file = st.file_uploader("📦 Products CSV", type="csv", key="products_upload")
-            sales_file = st.file_uploader("🛍️ Sales CSV", type="csv", key="sales_upload")
+            products_file = st.file_uploader("📦 Products CSV", type=UPLOAD_TYPES, key="products_upload")
+            sales_file = st.file_uploader("🛍️ Sales CSV", type=UPLOAD_TYPES, key="sales_upload")
         
         with col2:
-            stores_file = st.file_uploader("🏪 Stores CSV", type="csv", key="stores_upload")
-            inventory_file = st.file_uploader("📊 Inventory CSV", type="csv", key="inventory_upload")
+            stores_file = st.file_uploader("🏪 Stores CSV", type=UPLOAD_TYPES, key="stores_upload")
+            inventory_file = st.file_uploader("📊 Inventory CSV", type=UPLOAD_TYPES, key="inventory_upload")
         
-        issues_file = st.file_uploader("📋 Issues CSV (Optional)", type="csv", key="issues_upload")
+        issues_file = st.file_uploader("📋 Issues CSV (Optional)", type=UPLOAD_TYPES, key="issues_upload")
         
         # Validate and load uploaded files
         if products_file and stores_file and sales_file and inventory_file:
@@ -764,6 +866,7 @@ def main():
                 st.stop()
             else:
                 products, stores, sales, inventory, issues = result
+                issue_summary = None
                 st.sidebar.success("✅ Custom data loaded successfully!")
                 
                 # Display data quality report
@@ -804,7 +907,8 @@ def main():
     display_error_logs()
     
     # Initialize simulator
-    sim = initialize_simulator(products, stores, sales, inventory)
+    data_key = dataset_key(products, stores, sales, inventory)
+    sim = initialize_simulator(products, stores, sales, inventory, data_key)
     
     # Professional Executive Header
     st.markdown("""
@@ -896,6 +1000,11 @@ def main():
             date_range = None
             brand_filter = "All"
         
+        approximate_mode = st.toggle(
+            "⚡ Approximate KPIs",
+            help="Show KPIs estimated from a stratified sample (95% CI) instantly, then swap in exact values"
+        )
+        
         st.markdown("---")
         st.header("🎯 Simulation Lab")
         
@@ -908,6 +1017,16 @@ def main():
             promo_budget = st.number_input("💵 Budget (AED)", 10000, 200000, 50000, 5000)
             margin_floor = st.slider("📉 Margin Floor %", 0, 30, 10, 5)
             sim_days = st.selectbox("⏱️ Duration (days)", [7, 14], index=1)
+            uplift_model = st.selectbox(
+                "📈 Uplift Model", list(UPLIFT_MODEL_LABELS),
+                format_func=UPLIFT_MODEL_LABELS.get,
+                help="Fixed rule multipliers, or price elasticities fitted from sales history"
+            )
+            baseline_model = st.selectbox(
+                "📆 Baseline Demand", list(BASELINE_MODEL_LABELS),
+                format_func=BASELINE_MODEL_LABELS.get,
+                help="Flat 30-day average, or a weekly-seasonal forecast over the promo duration"
+            )
         
         run_sim = st.button("🚀 Launch Simulation", type="primary", use_container_width=True)
         
@@ -922,7 +1041,8 @@ def main():
                         start_time = time.time()
                         simulated, violations, sim_kpis = sim.simulate_promo(
                             sim_city, sim_channel, sim_category,
-                            discount_pct, promo_budget, margin_floor, sim_days
+                            discount_pct, promo_budget, margin_floor, sim_days, uplift_model,
+                            baseline_model
                         )
                         elapsed = time.time() - start_time
                         
@@ -982,14 +1102,32 @@ def main():
             filtered_sales = filtered_sales[filtered_sales['category'] == category_filter]
         if preset == "Custom" and brand_filter != 'All':
             filtered_sales = filtered_sales[filtered_sales['brand'] == brand_filter]
+        
+        # Breakdowns for the same filters in one cached pass
+        custom_range = preset == "Custom" and date_range and len(date_range) == 2
+        kpi_filters = dict(
+            city=city_filter, channel=channel_filter, category=category_filter,
+            brand=brand_filter if preset == "Custom" else None,
+            start=pd.Timestamp(date_range[0]) if custom_range else None,
+            end=pd.Timestamp(date_range[1]) + pd.Timedelta(days=1) if custom_range else None
+        )
+        filtered_rollups = sim.rollups(**kpi_filters)
     
     except Exception as e:
         st.error(f"❌ Error during data preparation: {str(e)}")
         log_error(f"Data preparation error: {str(e)}", "ERROR")
     
-    # Calculate KPIs
+    # Calculate KPIs (approximate mode: sampled estimates first, exact ones on the next run)
+    kpi_intervals = None
     try:
-        kpis = sim.compute_kpis(filtered_sales)
+        exact_key = (data_key,) + tuple(kpi_filters.values())
+        exact_kpis = st.session_state.setdefault('exact_kpis', OrderedDict())
+        if exact_key in exact_kpis:
+            exact_kpis.move_to_end(exact_key)
+        if approximate_mode and exact_key not in exact_kpis:
+            kpis, kpi_intervals = sim.approximate_kpis(**kpi_filters)
+        else:
+            kpis = exact_kpis.get(exact_key) or sim.compute_kpis(filtered_sales)
         if not kpis or len(kpis) == 0:
             raise ValueError("KPI calculation returned empty results")
     except Exception as e:
@@ -1012,6 +1150,9 @@ def main():
     )
     st.markdown("---")
     
+    if kpi_intervals:
+        st.caption("⚡ Approximate KPIs from a stratified sample (± 95% confidence interval) - exact values are loading")
+    
     # EXECUTIVE VIEW
     if "Executive" in view_mode:
         st.markdown("## 💼 Executive Suite")
@@ -1025,6 +1166,7 @@ def main():
                 <h3>NET REVENUE</h3>
                 <h1>AED {kpis['net_revenue']:,.0f}</h1>
                 <p>Gross: AED {kpis['gross_revenue']:,.0f}</p>
+                {format_interval(kpi_intervals, 'net_revenue', 'AED {:,.0f}')}
             </div>
             """, unsafe_allow_html=True)
         
@@ -1034,6 +1176,7 @@ def main():
                 <h3>GROSS MARGIN</h3>
                 <h1>{kpis['gross_margin_pct']:.1f}%</h1>
                 <p>Amount: AED {kpis['gross_margin_aed']:,.0f}</p>
+                {format_interval(kpi_intervals, 'gross_margin_pct', '{:.1f}%')}
             </div>
             """, unsafe_allow_html=True)
         
@@ -1089,7 +1232,7 @@ def main():
         
         # BCG Matrix
         st.markdown("### 🎯 Product Performance Matrix (BCG)")
-        perf_matrix = create_product_matrix(filtered_sales)
+        perf_matrix = create_product_matrix(filtered_rollups)
         
         fig = px.scatter(
             perf_matrix, x='revenue', y='margin_pct', size='qty', color='category',
@@ -1112,7 +1255,7 @@ def main():
             
             scenario_df = create_scenario_comparison(
                 sim, sim_city, sim_channel, sim_category,
-                promo_budget, margin_floor, sim_days
+                promo_budget, margin_floor, sim_days, uplift_model, baseline_model
             )
             
             if not scenario_df.empty:
@@ -1144,6 +1287,7 @@ def main():
                     <h3>STOCKOUT RISK</h3>
                     <h1 style="color:{risk_color};">{sim_kpis['stockout_risk_pct']:.1f}%</h1>
                     <p>{sim_kpis['high_risk_skus']} SKUs at risk</p>
+                    <p>{sim_kpis['projected_stockouts']} run out with reorders · {sim_kpis['lost_revenue']:,.0f} AED lost</p>
                 </div>
                 """, unsafe_allow_html=True)
             else:
@@ -1155,6 +1299,7 @@ def main():
                 <h3>RETURN RATE</h3>
                 <h1>{kpis['return_rate_pct']:.1f}%</h1>
                 <p>Target: < 5%</p>
+                {format_interval(kpi_intervals, 'return_rate_pct', '{:.1f}%')}
             </div>
             """, unsafe_allow_html=True)
         
@@ -1164,6 +1309,7 @@ def main():
                 <h3>PAYMENT FAILURES</h3>
                 <h1>{kpis['payment_failure_rate_pct']:.1f}%</h1>
                 <p>Target: < 10%</p>
+                {format_interval(kpi_intervals, 'payment_failure_rate_pct', '{:.1f}%')}
             </div>
             """, unsafe_allow_html=True)
         
@@ -1171,7 +1317,7 @@ def main():
             st.markdown(f"""
             <div class="metric-card">
                 <h3>DATA QUALITY</h3>
-                <h1>{len(issues)}</h1>
+                <h1>{sum(summarize_issues(issues, issue_summary).values())}</h1>
                 <p>Issues Resolved</p>
             </div>
             """, unsafe_allow_html=True)
@@ -1186,28 +1332,71 @@ def main():
         )
         fig.update_layout(height=600)
         st.plotly_chart(fig, use_container_width=True)
+        
+        st.divider()
+        st.markdown("### 📐 Basket & Discount Distributions")
+        st.caption("Estimated from mergeable sketches over all dates (city, channel and category filters apply)")
+        
+        sketches = sim.sales_sketches()
+        segment_filters = dict(city=city_filter, channel=channel_filter, category=category_filter)
+        overall = sketches.summary(**segment_filters)
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Distinct Orders (≈)", f"{overall['distinct_orders']:,}")
+        col2.metric("Distinct Products (≈)", f"{overall['distinct_products']:,}")
+        col3.metric("Median Discount", f"{overall['discount_pct_p50']:.0f}%")
+        col4.metric("p90 Basket Qty", f"{overall['basket_qty_p90']:.0f}")
+        
+        segment_by = st.radio("Percentiles by:", ['channel', 'city', 'category'],
+                              horizontal=True, key='sketch_segment')
+        st.dataframe(sketches.breakdown(segment_by, **segment_filters),
+                     use_container_width=True, hide_index=True)
+        
+        if 'sim_results' in st.session_state:
+            st.divider()
+            st.markdown("### 🔁 Stock Rebalancing")
+            
+            simulated, _, _ = st.session_state['sim_results']
+            pool = st.radio("Transfer between stores in the same:", ['city', 'channel'],
+                            horizontal=True, key='transfer_pool')
+            transfers, transfer_summary = sim.recommend_transfers(simulated, by=pool)
+            
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Transfers", f"{transfer_summary['transfers']:,}")
+            col2.metric("Units Moved", f"{transfer_summary['units_moved']:,}")
+            col3.metric("Residual Shortfall", f"{transfer_summary['residual_shortfall']:,}",
+                        f"{-transfer_summary['units_moved']:,} units", delta_color="inverse")
+            
+            if not transfers.empty:
+                st.dataframe(transfers.nlargest(50, 'qty'), use_container_width=True, hide_index=True)
     
     # Download Section
     st.markdown("---")
     st.subheader("💾 Download & Export")
     
+    # Exports are rendered only when a button is clicked (deferred callables)
+    # and cached by content fingerprint, so reruns never serialize the tables
+    export_format = st.radio(
+        "Export format:", available_formats(), horizontal=True, key='export_format'
+    )
+    export_stamp = datetime.now().strftime('%Y%m%d')
+    
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         st.download_button(
             "📊 Sales Data", 
-            sales.to_csv(index=False).encode('utf-8'),
-            f"sales_{datetime.now().strftime('%Y%m%d')}.csv", 
-            "text/csv", 
+            lambda: get_export(sales, export_format),
+            export_filename("sales", export_format, export_stamp), 
+            export_mime(export_format), 
             use_container_width=True
         )
     
     with col2:
         st.download_button(
             "📋 Issues Log", 
-            issues.to_csv(index=False).encode('utf-8'),
-            f"issues_{datetime.now().strftime('%Y%m%d')}.csv", 
-            "text/csv", 
+            lambda: get_export(issues, export_format),
+            export_filename("issues", export_format, export_stamp), 
+            export_mime(export_format), 
             use_container_width=True
         )
     
@@ -1216,9 +1405,9 @@ def main():
             simulated, _, _ = st.session_state['sim_results']
             st.download_button(
                 "🎯 Simulation", 
-                simulated.to_csv(index=False).encode('utf-8'),
-                f"simulation_{datetime.now().strftime('%Y%m%d')}.csv", 
-                "text/csv", 
+                lambda: get_export(simulated, export_format),
+                export_filename("simulation", export_format, export_stamp), 
+                export_mime(export_format), 
                 use_container_width=True
             )
     
@@ -1233,6 +1422,16 @@ def main():
                 "text/csv",
                 use_container_width=True
             )
+    
+    # The page is up with approximate KPIs: compute the exact ones and redraw with them
+    if kpi_intervals:
+        try:
+            exact_kpis[exact_key] = sim.filtered_kpis(**kpi_filters)
+            while len(exact_kpis) > MAX_EXACT_KPI_ENTRIES:
+                exact_kpis.popitem(last=False)
+            st.rerun()
+        except Exception as e:
+            log_error(f"Exact KPI refinement failed: {str(e)}", "ERROR")
 
 if __name__ == "__main__":
     main()
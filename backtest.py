@@ -0,0 +1,257 @@
+"""
+UAE Promo Pulse - Backtest
+Replays the simulate_promo demand model at every historical day and scores
+its predictions against realized sales per segment
+
+Usage:
+    python backtest.py --data-dir . --uplift-model rules --out backtest_results.csv
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from elasticity import SEGMENT_KEYS, UPLIFT_MODELS
+from money import FILS_PER_AED, line_fils, to_aed, to_fils
+
+
+BACKTEST_COLUMNS = ['order_time', 'payment_status', 'product_id', 'store_id', 'qty',
+                    'selling_price_aed', 'discount_pct']
+# Same trailing window as PromoSimulator.calculate_baseline_demand
+BASELINE_WINDOW_DAYS = 30
+GROUP_KEYS = SEGMENT_KEYS + ['discount_pct']
+# Per-cell sums that _score turns into metrics
+SUM_COLUMNS = ['cells', 'realized_qty', 'predicted_qty', 'abs_error', 'sq_error',
+               'realized_revenue_fils', 'predicted_revenue_fils', 'abs_revenue_error_fils']
+
+
+def trailing_sums(series, days, values, query_series, query_days, window):
+    """
+    Sum of values over the `window` days before each query day of its series
+    (days d - window .. d - 1). One cumulative sum over the rows sorted by
+    (series, day) answers every query with two searchsorted lookups.
+    """
+    stride = int(max(days.max(initial=0), query_days.max(initial=0))) + 2
+    keys = series.astype(np.int64) * stride + days
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    cumulative = np.concatenate([[0], np.cumsum(values[order])])
+    # Series are stride apart, so a bound below day 0 stops at the previous series
+    base = query_series.astype(np.int64) * stride
+    upper = np.searchsorted(keys, base + query_days - 1, side='right')
+    lower = np.searchsorted(keys, base + np.maximum(query_days - window - 1, -1), side='right')
+    return cumulative[upper] - cumulative[lower]
+
+
+def _reduce(values, starts):
+    """Sums of the runs of sorted values that begin at starts"""
+    return np.add.reduceat(values, starts) if len(starts) else values[:0]
+
+
+def _score(sums):
+    """Error metrics from summed cell errors (a grouped frame or a one-row total)"""
+    realized = sums['realized_qty'].where(sums['realized_qty'] > 0)
+    realized_revenue = sums['realized_revenue_fils'].where(sums['realized_revenue_fils'] > 0)
+    return pd.DataFrame({
+        'cells': sums['cells'],
+        'realized_qty': sums['realized_qty'],
+        'predicted_qty': sums['predicted_qty'],
+        'mae': sums['abs_error'] / sums['cells'],
+        'rmse': np.sqrt(sums['sq_error'] / sums['cells']),
+        'wape_pct': sums['abs_error'] / realized * 100,
+        'bias_pct': (sums['predicted_qty'] - sums['realized_qty']) / realized * 100,
+        'realized_revenue': to_aed(sums['realized_revenue_fils']),
+        'predicted_revenue': to_aed(sums['predicted_revenue_fils']),
+        'revenue_wape_pct': sums['abs_revenue_error_fils'] / realized_revenue * 100,
+    }, index=sums.index)
+
+
+def _empty_result(by, start, end):
+    """Metrics (no rows) and summary (zero cells) when there is nothing to score"""
+    zero = pd.DataFrame({col: [0] for col in SUM_COLUMNS})
+    metrics = pd.concat([pd.DataFrame(columns=by), _score(zero.iloc[:0]).reset_index(drop=True)], axis=1)
+    summary = _score(zero).iloc[0].to_dict()
+    summary['cells'] = 0
+    summary['start'], summary['end'] = start, end
+    return metrics, summary
+
+
+def run_backtest(sim, uplift_model='rules', discount_levels=None, start=None, end=None,
+                 window_days=BASELINE_WINDOW_DAYS, by=SEGMENT_KEYS):
+    """
+    Score the uplift model of a PromoSimulator against its own sales history.
+
+    For every day D and product x store, the baseline is what
+    calculate_baseline_demand would have returned the evening before: paid
+    qty over the trailing window_days, per day. Each product x store x day x
+    discount_pct with paid sales is a cell: predicted qty is baseline x
+    uplift(discount_pct) and predicted revenue is that qty at the promo
+    price (rounded to the fils); realized qty and revenue are the paid sales
+    at that discount on that day. discount_levels keeps only cells at those
+    discounts. The fitted uplift models use elasticities fitted on the full
+    history, so their scores are in-sample.
+
+    Baselines come from one cumulative sum over the day axis of every
+    series (trailing_sums), so all days and segments replay at once.
+
+    Returns (metrics, summary): metrics has one row per `by` group (any of
+    category, channel, city, discount_pct) with cells, realized / predicted
+    qty and revenue, MAE, RMSE, WAPE % and bias % of predicted vs realized
+    qty, and revenue WAPE %; summary has the same over all cells plus the
+    replayed date range. With no paid sales in range, metrics has no rows
+    and summary reports 0 cells (ratios NaN).
+    """
+    if uplift_model not in UPLIFT_MODELS:
+        raise ValueError(f"Unknown uplift model: {uplift_model} (use one of {UPLIFT_MODELS})")
+    by = list(by)
+    unknown = set(by) - set(GROUP_KEYS)
+    if unknown:
+        raise ValueError(f"Cannot group backtest by {sorted(unknown)} (use any of {GROUP_KEYS})")
+
+    sales = (sim.sales_store.scan(BACKTEST_COLUMNS) if sim.sales_store is not None
+             else sim.sales_enriched[BACKTEST_COLUMNS])
+    times = pd.to_datetime(sales['order_time'])
+    paid = ((sales['payment_status'] == 'Paid') & times.notna()).to_numpy(dtype=bool)
+    sales, times = sales[paid], times[paid]
+    if not len(sales):
+        return _empty_result(by, None if start is None else pd.Timestamp(start).date(),
+                             None if end is None else pd.Timestamp(end).date())
+    first_day = times.min().normalize()
+    days = (times.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+            - np.datetime64(first_day.date(), 'D')).astype(np.int64)
+
+    # Series code per row (product x store pair of the sales themselves)
+    product_codes, products = pd.factorize(sales['product_id'])
+    store_codes, stores = pd.factorize(sales['store_id'])
+    pair = product_codes.astype(np.int64) * len(stores) + store_codes
+    qty = np.nan_to_num(sales['qty'].to_numpy(dtype=np.float64))
+    discount = sales['discount_pct'].to_numpy(dtype=np.float64)
+
+    first_eval = (days.min() + window_days if start is None
+                  else (pd.Timestamp(start).normalize() - first_day).days)
+    last_eval = days.max() if end is None else (pd.Timestamp(end).normalize() - first_day).days
+    cell_rows = (days >= first_eval) & (days <= last_eval) & ~np.isnan(discount)
+    if discount_levels is not None:
+        cell_rows &= np.isin(discount, np.asarray(discount_levels, dtype=np.float64))
+    start_date = (first_day + pd.Timedelta(days=int(first_eval))).date()
+    end_date = (first_day + pd.Timedelta(days=int(last_eval))).date()
+    if not cell_rows.any():
+        return _empty_result(by, start_date, end_date)
+
+    # Cells: one sorted integer key per pair x day x discount; sorted keys also
+    # make the baseline lookups below sequential
+    discount_codes, levels = pd.factorize(discount[cell_rows])
+    stride = int(days.max(initial=0)) + 1
+    cell_keys = (pair[cell_rows] * stride + days[cell_rows]) * max(len(levels), 1) + discount_codes
+    order = np.argsort(cell_keys, kind='stable')
+    cell_keys = cell_keys[order]
+    starts = np.flatnonzero(np.diff(cell_keys, prepend=-1) != 0)
+    realized = _reduce(qty[cell_rows][order], starts)
+    realized_revenue = _reduce(line_fils(qty[cell_rows], sales['selling_price_aed'].to_numpy()[cell_rows])[order],
+                               starts)
+    cell_keys = cell_keys[starts]
+    cell_discount = np.asarray(levels, dtype=np.float64)[cell_keys % max(len(levels), 1)]
+    cell_pair, cell_day = np.divmod(cell_keys // max(len(levels), 1), stride)
+
+    baseline = trailing_sums(pair, days, qty, cell_pair, cell_day, window_days) / window_days
+
+    # Product / store attributes by simulator lookup code (-1: unknown)
+    lookups = sim.promo_lookups()
+    product = lookups['products'].get_indexer(products)[cell_pair // len(stores)]
+    store = lookups['stores'].get_indexer(stores)[cell_pair % len(stores)]
+    uplift, _ = sim.uplift_factors(product, store, cell_discount, uplift_model,
+                                   np.asarray(products, dtype=object)[cell_pair // len(stores)])
+    predicted = baseline * uplift
+    base_price = np.append(lookups['base_price_aed'], np.nan)[product]
+    price_fils = to_fils(base_price * (1 - cell_discount / 100))
+
+    predicted_revenue = to_fils(predicted * price_fils / FILS_PER_AED)
+    sums = pd.DataFrame({
+        'cells': 1,
+        'realized_qty': realized,
+        'predicted_qty': predicted,
+        'abs_error': np.abs(predicted - realized),
+        'sq_error': (predicted - realized) ** 2,
+        'realized_revenue_fils': realized_revenue,
+        'predicted_revenue_fils': predicted_revenue,
+        'abs_revenue_error_fils': np.abs(predicted_revenue - realized_revenue),
+    })
+
+    groups = {
+        'category': lookups['category'].take(product, allow_fill=True),
+        'channel': lookups['channel'].take(store, allow_fill=True),
+        'city': lookups['city'].take(store, allow_fill=True),
+        'discount_pct': cell_discount,
+    }
+    # Integer sums stay integer (exact fils) through groupby
+    total = _score(sums.groupby(np.zeros(len(sums), dtype=np.int8)).sum())
+    if by:
+        keys = [pd.Series(groups[col], name=col) for col in by]
+        metrics = _score(sums.groupby(keys, dropna=False, observed=True).sum()).reset_index()
+    else:
+        metrics = total.reset_index(drop=True)
+
+    summary = total.iloc[0].to_dict()
+    summary['cells'] = int(summary['cells'])
+    summary['start'], summary['end'] = start_date, end_date
+    return metrics, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest simulate_promo demand predictions")
+    parser.add_argument('--data-dir', default='.', help="Directory with the *_clean.csv files")
+    parser.add_argument('--uplift-model', choices=UPLIFT_MODELS, default='rules')
+    parser.add_argument('--discount-levels', default=None,
+                        help="Comma-separated discount_pct values to score (default: all)")
+    parser.add_argument('--start', default=None, help="First replayed day (default: after one window)")
+    parser.add_argument('--end', default=None, help="Last replayed day (default: last sales day)")
+    parser.add_argument('--window-days', type=int, default=BASELINE_WINDOW_DAYS)
+    parser.add_argument('--by', default=','.join(SEGMENT_KEYS),
+                        help=f"Comma-separated grouping columns out of {GROUP_KEYS}")
+    parser.add_argument('--out', default='backtest_results.csv', help="Per-segment metrics CSV")
+    args = parser.parse_args(argv)
+
+    # Imported here: the batch runner pulls in the process-pool machinery
+    from batch_runner import load_simulator
+
+    try:
+        sim = load_simulator(args.data_dir)
+    except FileNotFoundError as e:
+        print(f"❌ Error: {e}")
+        print("Please run cleaner.py first to generate cleaned datasets.")
+        return 2
+
+    levels = ([float(level) for level in args.discount_levels.split(',')]
+              if args.discount_levels else None)
+    by = [col for col in args.by.split(',') if col]
+
+    start_time = time.time()
+    metrics, summary = run_backtest(sim, args.uplift_model, levels, args.start, args.end,
+                                    args.window_days, by)
+    elapsed = time.time() - start_time
+
+    out_dir = os.path.dirname(args.out)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    metrics.to_csv(args.out, index=False)
+
+    if summary['cells'] == 0:
+        print(f"⚠️ No paid sales to score between {summary['start'] or 'the first day'} "
+              f"and {summary['end'] or 'the last day'}")
+        print(f"   • Empty metrics → {args.out}")
+        return 0
+
+    print(f"✅ Replayed {summary['start']} to {summary['end']} "
+          f"({summary['cells']:,} cells) in {elapsed:.2f}s")
+    print(f"   • WAPE: {summary['wape_pct']:.1f}%  bias: {summary['bias_pct']:+.1f}%  "
+          f"revenue WAPE: {summary['revenue_wape_pct']:.1f}%")
+    print(f"   • {len(metrics)} segments → {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
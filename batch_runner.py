@@ -0,0 +1,224 @@
+"""
+UAE Promo Pulse - Batch Runner
+Headless CLI that scores a file of promo scenarios with PromoSimulator
+
+Usage:
+    python batch_runner.py scenarios.csv --data-dir . --out-dir batch_results --workers 8
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from ingest import CLEAN_FILES, read_tables, table_paths
+from shared_dataset import SharedDataset, attach_dataset
+from simulator import PromoSimulator
+
+
+# Scenario columns and the defaults used by PromoSimulator.simulate_promo
+SCENARIO_DEFAULTS = {
+    'city': 'All',
+    'channel': 'All',
+    'category': 'All',
+    'discount_pct': 20,
+    'promo_budget_aed': 100000,
+    'margin_floor_pct': 10,
+    'simulation_days': 14,
+    'uplift_model': 'rules',
+    'baseline_model': 'average',
+}
+
+# Columnar output needs pyarrow; fall back to CSV when it is not installed
+DEFAULT_FORMAT = 'parquet' if importlib.util.find_spec('pyarrow') else 'csv'
+
+VIOLATION_LISTS = ['top_budget_contributors', 'top_margin_violators', 'top_stockout_risks']
+
+# Worker-side simulator, built or attached once per worker process, and the
+# source it came from (so a run against other data never reuses it)
+_SIMULATOR = None
+_SIMULATOR_SOURCE = None
+
+
+def load_scenarios(path):
+    """Read scenarios from CSV, JSON array or JSON lines and apply defaults"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        scenarios = pd.read_csv(path)
+    elif ext in ('.jsonl', '.ndjson'):
+        scenarios = pd.read_json(path, lines=True)
+    elif ext == '.json':
+        with open(path) as f:
+            scenarios = pd.DataFrame(json.load(f))
+    else:
+        raise ValueError(f"Unsupported scenario file type: {ext} (use .csv, .json or .jsonl)")
+
+    for col, default in SCENARIO_DEFAULTS.items():
+        if col not in scenarios.columns:
+            scenarios[col] = default
+        else:
+            scenarios[col] = scenarios[col].fillna(default)
+
+    if 'scenario_id' not in scenarios.columns:
+        scenarios.insert(0, 'scenario_id', [f"SC{i:06d}" for i in range(1, len(scenarios) + 1)])
+
+    scenarios['simulation_days'] = scenarios['simulation_days'].astype(int)
+    return scenarios[['scenario_id'] + list(SCENARIO_DEFAULTS)]
+
+
+def load_simulator(data_dir):
+    """Load the clean tables from data_dir and build a PromoSimulator"""
+    frames = read_tables(table_paths(CLEAN_FILES, data_dir))
+    return PromoSimulator(frames['products'], frames['stores'],
+                          frames['sales'], frames['inventory'])
+
+
+def _simulator_source(data_dir=None, dataset_path=None):
+    """Identity of a simulator's data: the shared dataset, or the clean files' paths, sizes and mtimes"""
+    if dataset_path is not None:
+        return ('dataset', os.path.abspath(dataset_path))
+    files = []
+    for name, (path, _) in sorted(table_paths(CLEAN_FILES, data_dir).items()):
+        try:
+            stat = os.stat(path)
+            files.append((name, os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            files.append((name, os.path.abspath(path), None, None))
+    return ('data_dir', tuple(files))
+
+
+def _init_worker(data_dir=None, dataset_path=None):
+    global _SIMULATOR, _SIMULATOR_SOURCE
+    source = _simulator_source(data_dir, dataset_path)
+    if _SIMULATOR is not None and _SIMULATOR_SOURCE == source:
+        return
+    if dataset_path is not None:
+        _SIMULATOR = attach_dataset(dataset_path)
+    else:
+        _SIMULATOR = load_simulator(data_dir)
+    _SIMULATOR_SOURCE = source
+
+
+def run_scenario(scenario):
+    """Run one scenario dict; returns (result row, violation rows)"""
+    params = {k: scenario[k] for k in SCENARIO_DEFAULTS}
+    try:
+        _, violations, sim_kpis = _SIMULATOR.simulate_promo(**params, include_rows=False)
+    except Exception as e:
+        return {'scenario_id': scenario['scenario_id'], **params, 'error': str(e)}, []
+
+    result = {
+        'scenario_id': scenario['scenario_id'],
+        **params,
+        **{k: float(v) for k, v in sim_kpis.items()},
+        'budget_exceeded': bool(violations['budget_exceeded']),
+        'margin_below_floor': bool(violations['margin_below_floor']),
+        'stockouts_exist': bool(violations['stockouts_exist']),
+        'margin_gap': float(violations['margin_gap']),
+        'error': None,
+    }
+
+    violation_rows = []
+    for kind in VIOLATION_LISTS:
+        for rank, record in enumerate(violations[kind], start=1):
+            violation_rows.append({
+                'scenario_id': scenario['scenario_id'],
+                'violation_type': kind,
+                'rank': rank,
+                'product_id': record.get('product_id'),
+                'store_id': record.get('store_id'),
+                'promo_spend': record.get('promo_spend'),
+                'margin_pct': record.get('margin_pct'),
+                'simulated_revenue': record.get('simulated_revenue'),
+                'simulated_qty': record.get('simulated_qty'),
+                'stock_on_hand': record.get('stock_on_hand'),
+                'stock_shortfall': record.get('stock_shortfall'),
+            })
+    return result, violation_rows
+
+
+def run_batch(scenarios, data_dir='.', workers=None, chunksize=None):
+    """Score every scenario; returns (results_df, violations_df)"""
+    records = scenarios.to_dict('records')
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        _init_worker(data_dir)
+        outputs = [run_scenario(s) for s in records]
+    else:
+        # Load and enrich once, publish the arrays as memory-mapped files and
+        # let every worker attach to the same pages instead of re-reading CSVs
+        with SharedDataset(load_simulator(data_dir)) as dataset_path:
+            chunksize = chunksize or max(1, len(records) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(None, dataset_path)) as pool:
+                outputs = list(pool.map(run_scenario, records, chunksize=chunksize))
+
+    results = pd.DataFrame([r for r, _ in outputs])
+    violations = pd.DataFrame([v for _, rows in outputs for v in rows],
+                              columns=['scenario_id', 'violation_type', 'rank', 'product_id',
+                                       'store_id', 'promo_spend', 'margin_pct',
+                                       'simulated_revenue', 'simulated_qty', 'stock_on_hand',
+                                       'stock_shortfall'])
+    return results, violations
+
+
+def write_table(df, path_stem, fmt):
+    """Write df as parquet, feather or csv; returns the written path"""
+    path = f"{path_stem}.{fmt}"
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False)
+    elif fmt == 'feather':
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run PromoSimulator over a scenario file")
+    parser.add_argument('scenarios', help="CSV, JSON or JSON-lines file of scenarios")
+    parser.add_argument('--data-dir', default='.', help="Directory with the *_clean.csv files")
+    parser.add_argument('--out-dir', default='batch_results', help="Output directory")
+    parser.add_argument('--format', choices=['parquet', 'feather', 'csv'], default=DEFAULT_FORMAT,
+                        help="Output format (default: parquet, or csv without pyarrow)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--chunksize', type=int, default=None, help="Scenarios per worker task")
+    args = parser.parse_args(argv)
+
+    try:
+        scenarios = load_scenarios(args.scenarios)
+        print(f"📂 Loaded {len(scenarios)} scenarios from {args.scenarios}")
+
+        start_time = time.time()
+        results, violations = run_batch(scenarios, args.data_dir, args.workers, args.chunksize)
+        elapsed = time.time() - start_time
+
+        os.makedirs(args.out_dir, exist_ok=True)
+        results_path = write_table(results, os.path.join(args.out_dir, 'results'), args.format)
+        violations_path = write_table(violations, os.path.join(args.out_dir, 'violations'), args.format)
+
+        failed = results['error'].notna().sum()
+        print(f"✅ Scored {len(results)} scenarios in {elapsed:.2f}s "
+              f"({len(results) / elapsed if elapsed > 0 else 0:.1f}/s), {failed} failed")
+        print(f"   • {results_path}")
+        print(f"   • {violations_path}")
+        return 0 if failed == 0 else 1
+
+    except FileNotFoundError as e:
+        print(f"❌ Error: {e}")
+        print("Please run cleaner.py first to generate cleaned datasets.")
+        return 2
+    except ImportError as e:
+        print(f"❌ Error: {e}")
+        print("Parquet/feather output requires pyarrow; use --format csv otherwise.")
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
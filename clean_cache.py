@@ -0,0 +1,215 @@
+"""
+UAE Promo Pulse - Cleaning Cache
+Content-addressed cache of cleaning results keyed by the raw input bytes and
+the cleaning rules version, so unchanged extracts are not cleaned twice
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import tempfile
+import time
+
+import cleaner
+import ingest
+import issue_log
+from cleaner import CleaningPolicies, DataCleaner, FrameValidator, ValidationRules, ValueNormalizer
+
+
+# Bump when cleaning output changes in a way rules_version() can't see
+# (e.g. a library upgrade that parses or renders values differently)
+CACHE_VERSION = 3
+# Modules whose code shapes cleaning output; any edit to them invalidates the cache
+RULE_MODULES = (cleaner, issue_log, ingest)
+
+DEFAULT_CACHE_DIR = '.clean_cache'
+DEFAULT_MAX_BYTES = 1024 ** 3          # 1 GB
+DEFAULT_MAX_AGE_S = 14 * 24 * 3600     # 14 days
+HASH_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def file_digest(source):
+    """
+    blake2b digest of a raw input. Accepts a path or a file-like object
+    (e.g. a Streamlit UploadedFile); file positions are left unchanged.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+                h.update(chunk)
+    elif hasattr(source, 'getvalue'):
+        h.update(source.getvalue())
+    else:
+        position = source.tell()
+        source.seek(0)
+        for chunk in iter(lambda: source.read(HASH_CHUNK_BYTES), b''):
+            h.update(chunk)
+        source.seek(position)
+    return h.hexdigest()
+
+
+def _defaults(func):
+    return {name: p.default for name, p in inspect.signature(func).parameters.items()
+            if p.default is not inspect.Parameter.empty}
+
+
+def _source_digest(module):
+    with open(module.__file__, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=20).hexdigest()
+
+
+def code_digest(objects):
+    """blake2b of the source code of functions, classes or modules"""
+    h = hashlib.blake2b(digest_size=20)
+    for obj in objects:
+        h.update(inspect.getsource(obj).encode('utf-8'))
+    return h.hexdigest()
+
+
+def rules_version():
+    """
+    Digest of everything that affects cleaning output: the rule constants,
+    every column's ValueNormalizer (valid values, default, mapping and
+    detail templates), the DataCleaner / ValueNormalizer constructor
+    defaults and the source of the cleaning modules, so logic edits that
+    no constant reflects still invalidate cached results
+    """
+    bounds = {
+        name: sorted(value) if isinstance(value, (set, frozenset)) else value
+        for name, value in vars(ValidationRules).items()
+        if name.isupper()
+    }
+    normalizers = {
+        column: {name: sorted(value) if isinstance(value, (set, frozenset)) else value
+                 for name, value in vars(normalizer).items()}
+        for column, normalizer in DataCleaner().normalizers.items()
+    }
+    rules = {
+        'cache_version': CACHE_VERSION,
+        'bounds': bounds,
+        'policies': CleaningPolicies.POLICIES,
+        'city_mapping': DataCleaner.CITY_MAPPING,
+        'frame_rules': FrameValidator.RULES,
+        'normalizers': normalizers,
+        'defaults': {'DataCleaner': _defaults(DataCleaner.__init__),
+                     'ValueNormalizer': _defaults(ValueNormalizer.__init__)},
+        'sources': {module.__name__: _source_digest(module) for module in RULE_MODULES},
+    }
+    payload = json.dumps(rules, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.blake2b(payload, digest_size=20).hexdigest()
+
+
+class CleaningCache:
+    """
+    One pickle file per cache key under `root`. Entries older than max_age_s
+    (since last use) are dropped, then least recently used entries until the
+    cache fits in max_bytes.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age_s=DEFAULT_MAX_AGE_S):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, sources, namespace='', options=None, code=()):
+        """
+        Cache key for a set of raw inputs. sources maps table name -> path or
+        file-like; options holds any extra settings that change the output;
+        code lists functions / modules outside RULE_MODULES that produce the
+        cached payload (e.g. the dashboard's own cleaning helpers), whose
+        source is hashed into the key.
+        """
+        h = hashlib.blake2b(digest_size=20)
+        h.update(json.dumps([namespace, rules_version(), options, code_digest(code)],
+                            sort_keys=True, default=str).encode('utf-8'))
+        for name in sorted(sources):
+            source = sources[name]
+            h.update(name.encode('utf-8'))
+            h.update(b'-' if source is None else file_digest(source).encode('ascii'))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.pkl")
+
+    def get(self, key):
+        """Stored payload for key, or None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                payload = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Unreadable or written by an incompatible version: treat as a miss
+            self._remove(path)
+            self.misses += 1
+            return None
+        os.utime(path)  # mark as recently used
+        self.hits += 1
+        return payload
+
+    def put(self, key, payload):
+        """Store payload under key (atomically), then enforce size and age limits"""
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones over max_bytes"""
+        if not os.path.isdir(self.root):
+            return 0
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith('.pkl'):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        removed = 0
+        kept = []
+        for mtime, size, path in entries:
+            if self.max_age_s is not None and now - mtime > self.max_age_s:
+                self._remove(path)
+                removed += 1
+            else:
+                kept.append((mtime, size, path))
+
+        total = sum(size for _, size, _ in kept)
+        for mtime, size, path in sorted(kept):
+            if self.max_bytes is None or total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        if os.path.isdir(self.root):
+            for name in os.listdir(self.root):
+                self._remove(os.path.join(self.root, name))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,150 @@
+"""
+UAE Promo Pulse - Cleaning Checkpoints
+Persists cleaning progress after every table and every sales step so an
+interrupted run can resume from the last completed step
+"""
+
+import os
+import pickle
+import re
+import tempfile
+
+
+# The checkpoint lives in its own subdirectory of the directory given
+CHECKPOINT_SUBDIR = '.promo_pulse_checkpoint'
+STATE_FILE = 'state.pkl'
+TMP_PREFIX = 'checkpoint-'
+# Every file this class writes; nothing else is ever deleted
+OWN_FILES = re.compile(r'^(state|products|stores|inventory)\.pkl$|^sales\.step\d+\.pkl$'
+                       rf'|^{TMP_PREFIX}.*\.tmp$')
+
+
+class CleaningCheckpoint:
+    """
+    Checkpoint directory for one cleaning run, created as
+    <directory>/.promo_pulse_checkpoint:
+
+    state.pkl           fingerprint, completed tables, last sales step,
+                        issue log (columnar) and cleaning summary
+    <table>.pkl         cleaned products / stores / inventory
+    sales.step<N>.pkl   sales table after step N (only the latest is kept)
+
+    The state file is replaced atomically after the data it refers to is
+    written, so a crash at any point leaves a consistent checkpoint.
+    A checkpoint whose fingerprint (raw inputs + rules + options) differs
+    from the current run is discarded. Only the files listed above are
+    ever removed; a checkpoint directory holding anything else is refused.
+    """
+
+    def __init__(self, directory, fingerprint, resume=False):
+        self.path = os.path.join(directory, CHECKPOINT_SUBDIR)
+        self.fingerprint = fingerprint
+        self.state = None
+        if os.path.isdir(self.path):
+            foreign = [name for name in os.listdir(self.path) if not OWN_FILES.match(name)]
+            if foreign:
+                raise ValueError(f"{self.path} holds files not written by a cleaning checkpoint "
+                                 f"({', '.join(sorted(foreign)[:3])}); refusing to use it")
+        if resume:
+            state = self._read_state()
+            if state is not None and state['fingerprint'] == fingerprint:
+                self.state = state
+        if self.state is None:
+            self._remove_files()
+            self.state = {'fingerprint': fingerprint, 'tables': [], 'sales_step': 0}
+        os.makedirs(self.path, exist_ok=True)
+
+    @property
+    def resumed(self):
+        return bool(self.state['tables'] or self.state['sales_step'])
+
+    def _read_state(self):
+        try:
+            with open(os.path.join(self.path, STATE_FILE), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+    def _dump(self, obj, filename):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=TMP_PREFIX, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, os.path.join(self.path, filename))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _load(self, filename):
+        with open(os.path.join(self.path, filename), 'rb') as f:
+            return pickle.load(f)
+
+    def _save_state(self, cleaner):
+        self.state['issues_log'] = cleaner.issues_log
+        self.state['cleaning_summary'] = cleaner.cleaning_summary
+        self._dump(self.state, STATE_FILE)
+
+    def restore(self, cleaner):
+        """Put the checkpointed issue log and summary back on cleaner"""
+        if 'issues_log' in self.state:
+            cleaner.issues_log = self.state['issues_log']
+            cleaner.cleaning_summary = self.state['cleaning_summary']
+
+    # ------------------------
+    # Whole tables
+    # ------------------------
+    def table_done(self, name):
+        return name in self.state['tables']
+
+    def load_table(self, name):
+        return self._load(f"{name}.pkl")
+
+    def save_table(self, name, df, cleaner):
+        self._dump(df, f"{name}.pkl")
+        self.mark_done(name, cleaner)
+
+    def mark_done(self, name, cleaner):
+        """Record a table as complete (its data is already persisted)"""
+        self.state['tables'].append(name)
+        self._save_state(cleaner)
+
+    # ------------------------
+    # Sales steps
+    # ------------------------
+    def resume_sales(self):
+        """(last completed sales step, sales table after it) or (0, None)"""
+        step = self.state['sales_step']
+        if step == 0:
+            return 0, None
+        return step, self._load(f"sales.step{step}.pkl")
+
+    def save_sales_step(self, step, df, cleaner):
+        previous = self.state['sales_step']
+        self._dump(df, f"sales.step{step}.pkl")
+        self.state['sales_step'] = step
+        self._save_state(cleaner)
+        if previous:
+            try:
+                os.remove(os.path.join(self.path, f"sales.step{previous}.pkl"))
+            except OSError:
+                pass
+
+    def _remove_files(self):
+        """Delete this checkpoint's own files, then its directory if that left it empty"""
+        if not os.path.isdir(self.path):
+            return
+        for name in os.listdir(self.path):
+            if OWN_FILES.match(name):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+        try:
+            os.rmdir(self.path)
+        except OSError:
+            pass
+
+    def finish(self):
+        """Remove the checkpoint once the run has completed"""
+        self._remove_files()
@@ -3,11 +3,14 @@ UAE Promo Pulse - Data Cleaner (PHASE 1)
 Complete cleaning pipeline with validation, issues logging, and justified policies
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import re
 
+from issue_log import LOG_LEVELS, IssueLog
+
 class ValidationRules:
     """Defines all validation rules with policies"""
     
@@ -122,6 +125,189 @@ class ValidationRules:
             return False, f"Not numeric: {value}"
 
 
+class FrameValidator:
+    """
+    Whole-frame versions of the ValidationRules checks. Each rule is compiled
+    once into a vectorized function returning a boolean violation mask, and
+    validate() evaluates every applicable rule over a DataFrame in one pass.
+    Semantics match the scalar validators (e.g. a blank price passes
+    validate_price, a blank qty fails validate_quantity).
+    """
+    
+    # (rule name, rule kind, columns it reads)
+    RULES = [
+        ('order_time_invalid', 'timestamp', ('order_time',)),
+        ('selling_price_out_of_range', 'price', ('selling_price_aed',)),
+        ('base_price_out_of_range', 'price', ('base_price_aed',)),
+        ('qty_out_of_range', 'quantity', ('qty',)),
+        ('stock_out_of_range', 'stock', ('stock_on_hand',)),
+        ('city_invalid', 'city', ('city',)),
+        ('channel_invalid', 'channel', ('channel',)),
+        ('category_invalid', 'category', ('category',)),
+        ('payment_status_invalid', 'payment_status', ('payment_status',)),
+        ('fulfillment_type_invalid', 'fulfillment', ('fulfillment_type',)),
+        ('unit_cost_above_price', 'cost_constraint', ('unit_cost_aed', 'base_price_aed')),
+    ]
+    
+    def __init__(self, rules=None):
+        self.rules = [
+            (name, columns, self._compile(kind)) for name, kind, columns in (rules or self.RULES)
+        ]
+    
+    # ------------------------
+    # Rule compilers
+    # ------------------------
+    @staticmethod
+    def _numeric(series):
+        """Coerce to float; returns (values, not_numeric mask)"""
+        values = pd.to_numeric(series, errors='coerce')
+        return values, values.isna() & series.notna()
+    
+    @staticmethod
+    def _membership(valid_values):
+        """Resolve each distinct value once, then broadcast through the codes"""
+        def check(series):
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            bad = np.array([str(u) == '' or str(u).strip() not in valid_values for u in uniques] + [True])
+            return pd.Series(bad[codes], index=series.index)
+        return check
+    
+    @staticmethod
+    def _timestamp(series):
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series.isna()
+        text = series.astype('string')
+        shape_ok = text.str.fullmatch(ValidationRules.TIMESTAMP_PATTERN.strip('^$')).fillna(False)
+        parsed = pd.to_datetime(text.where(shape_ok), format='%Y-%m-%d %H:%M:%S', errors='coerce')
+        return ~shape_ok.astype(bool) | parsed.isna()
+    
+    @staticmethod
+    def _price(series):
+        values, not_numeric = FrameValidator._numeric(series)
+        out_of_range = (values < ValidationRules.PRICE_MIN) | (values > ValidationRules.PRICE_MAX)
+        return not_numeric | out_of_range
+    
+    @staticmethod
+    def _quantity(series):
+        values, _ = FrameValidator._numeric(series)
+        whole = np.trunc(values)
+        return ~whole.between(ValidationRules.QUANTITY_MIN, ValidationRules.QUANTITY_MAX)
+    
+    @staticmethod
+    def _stock(series):
+        values, not_numeric = FrameValidator._numeric(series)
+        return not_numeric | (values < 0) | (values > 1000)
+    
+    @staticmethod
+    def _cost_constraint(cost, price):
+        c, _ = FrameValidator._numeric(cost)
+        p, _ = FrameValidator._numeric(price)
+        return (c > p).fillna(False)
+    
+    def _compile(self, kind):
+        compiled = {
+            'timestamp': self._timestamp,
+            'price': self._price,
+            'quantity': self._quantity,
+            'stock': self._stock,
+            'city': self._membership(ValidationRules.VALID_CITIES),
+            'channel': self._membership(ValidationRules.VALID_CHANNELS),
+            'category': self._membership(ValidationRules.VALID_CATEGORIES),
+            'payment_status': self._membership(ValidationRules.VALID_PAYMENT_STATUS),
+            'fulfillment': self._membership(ValidationRules.VALID_FULFILLMENT),
+            'cost_constraint': self._cost_constraint,
+        }
+        if kind not in compiled:
+            raise ValueError(f"Unknown validation rule kind: {kind}")
+        return compiled[kind]
+    
+    # ------------------------
+    # Public API
+    # ------------------------
+    def validate(self, df):
+        """
+        Boolean violation matrix: one column per applicable rule (rules whose
+        columns are all present in df), True where the row breaks the rule.
+        """
+        masks = {}
+        for name, columns, check in self.rules:
+            if all(col in df.columns for col in columns):
+                masks[name] = np.asarray(check(*(df[col] for col in columns)), dtype=bool)
+        return pd.DataFrame(masks, index=df.index)
+    
+    @staticmethod
+    def summarize(masks):
+        """Violation count per rule plus rows failing at least one rule"""
+        counts = {name: int(masks[name].sum()) for name in masks.columns}
+        counts['rows_with_violations'] = int(masks.any(axis=1).sum()) if len(masks.columns) else 0
+        return counts
+
+
+class ValueNormalizer:
+    """
+    Standardizes a categorical column by resolving each distinct raw value
+    once (mapping → valid set → default) and broadcasting the result back
+    through factorized codes, so cost scales with cardinality, not rows.
+    """
+    
+    def __init__(self, valid_values, default, mapping=None, strip=True, skip_na=True,
+                 mapped_issue='INCONSISTENT_VALUE', invalid_issue='INVALID_VALUE',
+                 mapped_detail='"{value}" standardized to "{new}"',
+                 invalid_detail='Invalid value "{value}" → "{new}"'):
+        self.valid_values = set(valid_values)
+        self.default = default
+        self.mapping = mapping or {}
+        self.strip = strip
+        self.skip_na = skip_na
+        self.mapped_issue = mapped_issue
+        self.invalid_issue = invalid_issue
+        self.mapped_detail = mapped_detail
+        self.invalid_detail = invalid_detail
+    
+    def resolve(self, raw):
+        """Resolve one raw value → (new value, issue_type, detail) or None if unchanged"""
+        value = str(raw).strip() if self.strip else str(raw)
+        if value in self.mapping:
+            new = self.mapping[value]
+            return new, self.mapped_issue, self.mapped_detail.format(value=value, new=new)
+        if value in self.valid_values:
+            return None
+        return self.default, self.invalid_issue, self.invalid_detail.format(value=value, new=self.default)
+    
+    def normalize(self, series):
+        """
+        Returns (normalized series, changes) where changes lists one entry per
+        corrected raw value: {'raw', 'new', 'issue_type', 'detail', 'positions'}
+        with positions as row offsets into series, in row order.
+        """
+        codes, uniques = pd.factorize(series, use_na_sentinel=self.skip_na)
+        resolved = [self.resolve(u) for u in uniques]
+        changed = np.array([r is not None for r in resolved] + [False])
+        if not changed.any():
+            return series, []
+        
+        new_values = np.array([r[0] if r is not None else u for u, r in zip(uniques, resolved)] + [None],
+                              dtype=object)
+        row_changed = changed[codes]
+        result = series.copy()
+        result[row_changed] = new_values[codes[row_changed]]
+        
+        # Row positions per raw value via one stable sort of the codes
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        changes = []
+        for code, r in enumerate(resolved):
+            if r is not None:
+                changes.append({
+                    'raw': uniques[code],
+                    'new': r[0],
+                    'issue_type': r[1],
+                    'detail': r[2],
+                    'positions': order[bounds[code]:bounds[code + 1]],
+                })
+        return result, changes
+
+
 class CleaningPolicies:
     """Justified cleaning decisions for each issue type"""
     
@@ -184,211 +370,256 @@ class CleaningPolicies:
 class DataCleaner:
     """Complete data cleaning pipeline with comprehensive issue logging"""
     
-    def __init__(self):
-        self.issues_log = []
+    CITY_MAPPING = {
+        'dubai': 'Dubai', 'DUBAI': 'Dubai', 'Dubayy': 'Dubai',
+        'abu dhabi': 'Abu Dhabi', 'ABU DHABI': 'Abu Dhabi',
+        'AbuDhabi': 'Abu Dhabi', 'Abu-Dhabi': 'Abu Dhabi',
+        'sharjah': 'Sharjah', 'SHARJAH': 'Sharjah',
+        'Sharja': 'Sharjah', 'Sharjh': 'Sharjah'
+    }
+    
+    def __init__(self, log_level='full', exemplars=20, seed=None):
+        """
+        log_level controls how many issue rows are kept (counts are always exact):
+            'full'      every issue (default)
+            'aggregate' per-rule counts + the first `exemplars` issues per rule
+            'sample'    per-rule counts + a reservoir sample of `exemplars` issues per rule
+        """
+        self.issues_log = IssueLog(log_level, exemplars, seed)
         self.cleaning_summary = {}
+        self.validator = FrameValidator()
+        self.normalizers = {
+            'city': ValueNormalizer(
+                ValidationRules.VALID_CITIES, 'Dubai', self.CITY_MAPPING,
+                invalid_issue='INVALID_CITY',
+                mapped_detail='City "{value}" standardized to "{new}"',
+                invalid_detail='Invalid city "{value}" → defaulted to Dubai'),
+            'channel': ValueNormalizer(
+                ValidationRules.VALID_CHANNELS, 'App', invalid_issue='INVALID_CHANNEL',
+                invalid_detail='Invalid channel: "{value}" → "{new}"'),
+            'category': ValueNormalizer(
+                ValidationRules.VALID_CATEGORIES, 'Electronics', strip=False, skip_na=False,
+                invalid_issue='INVALID_CATEGORY',
+                invalid_detail='Invalid category: "{value}" → "{new}"'),
+            'payment_status': ValueNormalizer(
+                ValidationRules.VALID_PAYMENT_STATUS, 'Paid', strip=False, skip_na=False,
+                invalid_issue='INVALID_VALUE',
+                invalid_detail='Invalid payment_status: "{value}" → "{new}"'),
+            'fulfillment_type': ValueNormalizer(
+                ValidationRules.VALID_FULFILLMENT, 'Own', invalid_issue='INVALID_VALUE',
+                invalid_detail='Invalid fulfillment_type: "{value}" → "{new}"'),
+        }
+    
+    def normalize_column(self, df, column, id_column=None, table='sales'):
+        """
+        Normalize df[column] in place with its ValueNormalizer. When id_column
+        is given, issue rows are logged grouped by raw value.
+        Returns the per-raw-value changes (see ValueNormalizer.normalize).
+        """
+        df[column], changes = self.normalizers[column].normalize(df[column])
+        if id_column is not None:
+            ids = df[id_column].to_numpy()
+            for change in changes:
+                self.issues_log.add(table, change['issue_type'], 'CORRECTED', ids,
+                                    change['positions'], detail=change['detail'], rule=column)
+        return changes
+    
+    def validate_frame(self, df):
+        """Run the full rule set over df; returns (violation masks, counts per rule)"""
+        masks = self.validator.validate(df)
+        return masks, self.validator.summarize(masks)
     
     # ========================
     # SALES DATA CLEANING
     # ========================
-    def clean_sales_data(self, df):
-        """Clean sales_raw table with all data quality checks"""
+    SALES_STEPS = [
+        '_sales_duplicates', '_sales_timestamps', '_sales_missing_discounts',
+        '_sales_quantity_outliers', '_sales_price_outliers', '_sales_cities',
+        '_sales_payment_status', '_sales_validation',
+    ]
+    # Steps worth checkpointing the sales table after (the duplicate scan and
+    # timestamp parsing); the others are cheap column fixes, faster to redo
+    # than to pickle the whole frame. The final step is always saved.
+    SALES_CHECKPOINT_STEPS = {'_sales_duplicates', '_sales_timestamps'}
+    
+    def clean_sales_data(self, df, checkpoint=None):
+        """
+        Clean sales_raw table with all data quality checks.
+        With a CleaningCheckpoint, progress is saved after the expensive steps
+        (SALES_CHECKPOINT_STEPS) and the last one, and a resumed run skips the
+        steps already completed.
+        """
         print("\n" + "="*80)
         print("CLEANING: SALES DATA")
         print("="*80)
         
-        df_clean = df.copy()
-        original_count = len(df_clean)
+        original_count = len(df)
         
-        # Step 1: Handle duplicate order_ids (Policy: Keep latest by timestamp)
+        # Resume after the last checkpointed step, if any
+        done, df_clean = (0, None) if checkpoint is None else checkpoint.resume_sales()
+        if df_clean is None:
+            df_clean = df.copy()
+        
+        for step, name in enumerate(self.SALES_STEPS, 1):
+            if step <= done:
+                print(f"[{step}/{len(self.SALES_STEPS)}] Restored from checkpoint")
+                continue
+            df_clean = getattr(self, name)(df_clean)
+            if checkpoint is not None and (name in self.SALES_CHECKPOINT_STEPS
+                                           or step == len(self.SALES_STEPS)):
+                checkpoint.save_sales_step(step, df_clean, self)
+        
+        # Summary
+        dropped = original_count - len(df_clean)
+        valid = len(df_clean)
+        cleanliness = (valid / original_count) * 100 if original_count > 0 else 0
+        
+        summary = {
+            'original_records': original_count,
+            'cleaned_records': valid,
+            'dropped_records': dropped,
+            'issues_found': self.issues_log.count(table='sales'),
+            'cleanliness_score': cleanliness
+        }
+        
+        print(f"\n   Summary:")
+        print(f"   • Original: {summary['original_records']}")
+        print(f"   • Cleaned: {summary['cleaned_records']}")
+        print(f"   • Dropped: {summary['dropped_records']}")
+        print(f"   • Cleanliness: {summary['cleanliness_score']:.1f}%")
+        
+        self.cleaning_summary['sales'] = summary
+        return df_clean
+    
+    def _sales_duplicates(self, df_clean):
+        """Handle duplicate order_ids (Policy: Keep latest by timestamp)"""
         print("\n[1/8] Handling duplicate order IDs...")
         duplicates = df_clean['order_id'].duplicated(keep=False)
         dup_count = (duplicates.sum() + 1) // 2
         
         if dup_count > 0:
-            df_clean['_parsed_time'] = pd.to_datetime(df_clean['order_time'], errors='coerce')
-            dup_ids = df_clean[duplicates]['order_id'].unique()
-            indices_to_drop = []
+            dup_rows = df_clean[duplicates]
+            parsed_time = pd.to_datetime(dup_rows['order_time'], errors='coerce')
+            # Latest valid timestamp wins (first row on ties); if none parse, keep the first row
+            ranked = dup_rows[['order_id']].assign(
+                _t=parsed_time.fillna(pd.Timestamp.min),
+                _group=pd.factorize(dup_rows['order_id'])[0],
+                _row=np.arange(len(dup_rows))
+            )
+            keep = ranked.sort_values(['_t'], ascending=False, kind='stable').drop_duplicates('order_id').index
+            dropped = ranked.drop(keep).sort_values(['_group', '_row'])
+            indices_to_drop = dropped.index
             
-            for order_id in dup_ids:
-                dup_group = df_clean[df_clean['order_id'] == order_id]
-                valid_times = dup_group[dup_group['_parsed_time'].notna()]
-                
-                if len(valid_times) > 0:
-                    keep_idx = valid_times['_parsed_time'].idxmax()
-                else:
-                    keep_idx = dup_group.index[0]
-                
-                drop_indices = dup_group.index.difference([keep_idx]).tolist()
-                indices_to_drop.extend(drop_indices)
-                
-                for idx in drop_indices:
-                    self.issues_log.append({
-                        'record_identifier': order_id,
-                        'issue_type': 'DUPLICATE_ID',
-                        'issue_detail': 'Duplicate order_id - multiple transactions',
-                        'action_taken': 'DROPPED'
-                    })
+            self.issues_log.add(
+                'sales', 'DUPLICATE_ID', 'DROPPED', dropped['order_id'].to_numpy(),
+                detail='Duplicate order_id - multiple transactions', rule='order_id'
+            )
             
             df_clean = df_clean.drop(indices_to_drop).reset_index(drop=True)
-            df_clean = df_clean.drop('_parsed_time', axis=1)
             print(f"   ✓ Dropped {len(indices_to_drop)} duplicate records, kept latest")
         
-        # Step 2: Handle corrupted timestamps (Policy: DROP)
+        return df_clean
+    
+    def _sales_timestamps(self, df_clean):
+        """Handle corrupted timestamps (Policy: DROP)"""
         print("[2/8] Validating timestamps...")
         invalid_time_mask = pd.to_datetime(df_clean['order_time'], errors='coerce').isna()
         
-        for idx in df_clean[invalid_time_mask].index:
-            order_id = df_clean.loc[idx, 'order_id']
-            bad_time = str(df_clean.loc[idx, 'order_time'])[:50]
-            self.issues_log.append({
-                'record_identifier': order_id,
-                'issue_type': 'INVALID_TIMESTAMP',
-                'issue_detail': f'Corrupted timestamp: {bad_time}',
-                'action_taken': 'DROPPED'
-            })
+        positions = np.flatnonzero(invalid_time_mask.to_numpy())
+        self.issues_log.add(
+            'sales', 'INVALID_TIMESTAMP', 'DROPPED', df_clean['order_id'].to_numpy(), positions,
+            detail='Corrupted timestamp: {text!s:.50}',
+            text=df_clean['order_time'].to_numpy()[positions], rule='order_time'
+        )
         
         df_clean = df_clean[~invalid_time_mask].reset_index(drop=True)
         df_clean['order_time'] = pd.to_datetime(df_clean['order_time'])
         print(f"   ✓ Dropped {invalid_time_mask.sum()} invalid timestamps")
         
-        # Step 3: Handle missing discount_pct (Policy: IMPUTE to 0)
+        return df_clean
+    
+    def _sales_missing_discounts(self, df_clean):
+        """Handle missing discount_pct (Policy: IMPUTE to 0)"""
         print("[3/8] Imputing missing values...")
         missing_discount = df_clean['discount_pct'].isna()
         
-        for idx in df_clean[missing_discount].index:
-            order_id = df_clean.loc[idx, 'order_id']
-            self.issues_log.append({
-                'record_identifier': order_id,
-                'issue_type': 'MISSING_VALUE',
-                'issue_detail': 'Missing discount_pct',
-                'action_taken': 'IMPUTED'
-            })
+        self.issues_log.add(
+            'sales', 'MISSING_VALUE', 'IMPUTED', df_clean['order_id'].to_numpy(),
+            np.flatnonzero(missing_discount.to_numpy()), detail='Missing discount_pct',
+            rule='discount_pct'
+        )
         
         df_clean['discount_pct'] = df_clean['discount_pct'].fillna(0)
         print(f"   ✓ Imputed {missing_discount.sum()} missing discount values to 0")
         
-        # Step 4: Handle outlier quantities (Policy: CAP at 100)
+        return df_clean
+    
+    def _sales_quantity_outliers(self, df_clean):
+        """Handle outlier quantities (Policy: CAP at 100)"""
         print("[4/8] Capping quantity outliers...")
         outlier_qty = df_clean['qty'] > ValidationRules.QUANTITY_MAX
         
-        for idx in df_clean[outlier_qty].index:
-            order_id = df_clean.loc[idx, 'order_id']
-            old_qty = int(df_clean.loc[idx, 'qty'])
-            self.issues_log.append({
-                'record_identifier': order_id,
-                'issue_type': 'OUTLIER_VALUE',
-                'issue_detail': f'Quantity {old_qty} exceeds maximum {ValidationRules.QUANTITY_MAX}',
-                'action_taken': 'CAPPED'
-            })
-            df_clean.loc[idx, 'qty'] = ValidationRules.QUANTITY_MAX
+        positions = np.flatnonzero(outlier_qty.to_numpy())
+        self.issues_log.add(
+            'sales', 'OUTLIER_VALUE', 'CAPPED', df_clean['order_id'].to_numpy(), positions,
+            detail=f'Quantity {{old}} exceeds maximum {ValidationRules.QUANTITY_MAX}',
+            old=df_clean['qty'].to_numpy()[positions].astype(np.int64), rule='qty'
+        )
+        df_clean.loc[outlier_qty, 'qty'] = ValidationRules.QUANTITY_MAX
         
         print(f"   ✓ Capped {outlier_qty.sum()} quantity outliers at {ValidationRules.QUANTITY_MAX}")
         
-        # Step 5: Handle outlier prices (Policy: CAP at 10000 AED)
+        return df_clean
+    
+    def _sales_price_outliers(self, df_clean):
+        """Handle outlier prices (Policy: CAP at 10000 AED)"""
         print("[5/8] Capping price outliers...")
         outlier_price = df_clean['selling_price_aed'] > ValidationRules.PRICE_MAX
         
-        for idx in df_clean[outlier_price].index:
-            order_id = df_clean.loc[idx, 'order_id']
-            old_price = float(df_clean.loc[idx, 'selling_price_aed'])
-            self.issues_log.append({
-                'record_identifier': order_id,
-                'issue_type': 'OUTLIER_VALUE',
-                'issue_detail': f'Price {old_price:.2f} AED exceeds maximum {ValidationRules.PRICE_MAX}',
-                'action_taken': 'CAPPED'
-            })
-            df_clean.loc[idx, 'selling_price_aed'] = ValidationRules.PRICE_MAX
+        positions = np.flatnonzero(outlier_price.to_numpy())
+        self.issues_log.add(
+            'sales', 'OUTLIER_VALUE', 'CAPPED', df_clean['order_id'].to_numpy(), positions,
+            detail=f'Price {{old:.2f}} AED exceeds maximum {ValidationRules.PRICE_MAX}',
+            old=df_clean['selling_price_aed'].to_numpy(dtype=np.float64)[positions],
+            rule='selling_price_aed'
+        )
+        df_clean.loc[outlier_price, 'selling_price_aed'] = ValidationRules.PRICE_MAX
         
         print(f"   ✓ Capped {outlier_price.sum()} price outliers at {ValidationRules.PRICE_MAX} AED")
         
-        # Step 6: Standardize city names (Policy: CORRECT with mapping)
+        return df_clean
+    
+    def _sales_cities(self, df_clean):
+        """Standardize city names (Policy: CORRECT with mapping)"""
         print("[6/8] Standardizing city names...")
-        city_mapping = {
-            'dubai': 'Dubai', 'DUBAI': 'Dubai', 'Dubayy': 'Dubai',
-            'abu dhabi': 'Abu Dhabi', 'ABU DHABI': 'Abu Dhabi',
-            'AbuDhabi': 'Abu Dhabi', 'Abu-Dhabi': 'Abu Dhabi',
-            'sharjah': 'Sharjah', 'SHARJAH': 'Sharjah',
-            'Sharja': 'Sharjah', 'Sharjh': 'Sharjah'
-        }
-        
         corrections_count = 0
-        for idx in df_clean.index:
-            if 'city' in df_clean.columns and pd.notna(df_clean.loc[idx, 'city']):
-                city = str(df_clean.loc[idx, 'city']).strip()
-                if city in city_mapping:
-                    new_city = city_mapping[city]
-                    df_clean.loc[idx, 'city'] = new_city
-                    corrections_count += 1
-                    self.issues_log.append({
-                        'record_identifier': df_clean.loc[idx, 'order_id'],
-                        'issue_type': 'INCONSISTENT_VALUE',
-                        'issue_detail': f'City "{city}" standardized to "{new_city}"',
-                        'action_taken': 'CORRECTED'
-                    })
-                elif city not in ValidationRules.VALID_CITIES:
-                    df_clean.loc[idx, 'city'] = 'Dubai'  # Default
-                    self.issues_log.append({
-                        'record_identifier': df_clean.loc[idx, 'order_id'],
-                        'issue_type': 'INVALID_CITY',
-                        'issue_detail': f'Invalid city "{city}" → defaulted to Dubai',
-                        'action_taken': 'CORRECTED'
-                    })
+        if 'city' in df_clean.columns:
+            changes = self.normalize_column(df_clean, 'city', 'order_id')
+            corrections_count = sum(len(c['positions']) for c in changes
+                                    if c['issue_type'] == 'INCONSISTENT_VALUE')
         
         print(f"   ✓ Standardized {corrections_count} city names")
         
-        # Step 7: Validate payment_status (Policy: CORRECT to Paid)
+        return df_clean
+    
+    def _sales_payment_status(self, df_clean):
+        """Validate payment_status (Policy: CORRECT to Paid)"""
         print("[7/8] Validating payment status...")
-        invalid_payment = ~df_clean['payment_status'].isin(ValidationRules.VALID_PAYMENT_STATUS)
-        
-        for idx in df_clean[invalid_payment].index:
-            order_id = df_clean.loc[idx, 'order_id']
-            bad_status = str(df_clean.loc[idx, 'payment_status'])
-            self.issues_log.append({
-                'record_identifier': order_id,
-                'issue_type': 'INVALID_VALUE',
-                'issue_detail': f'Invalid payment_status: "{bad_status}" → "Paid"',
-                'action_taken': 'CORRECTED'
-            })
-            df_clean.loc[idx, 'payment_status'] = 'Paid'
+        self.normalize_column(df_clean, 'payment_status', 'order_id')
         
         print(f"   ✓ Validated {len(df_clean)} payment statuses")
         
-        # Step 8: Category validation if present
+        return df_clean
+    
+    def _sales_validation(self, df_clean):
+        """Category validation if present"""
         print("[8/8] Running full validation suite...")
         if 'category' in df_clean.columns:
-            invalid_cat = ~df_clean['category'].isin(ValidationRules.VALID_CATEGORIES)
-            for idx in df_clean[invalid_cat].index:
-                order_id = df_clean.loc[idx, 'order_id']
-                bad_cat = str(df_clean.loc[idx, 'category'])
-                self.issues_log.append({
-                    'record_identifier': order_id,
-                    'issue_type': 'INVALID_CATEGORY',
-                    'issue_detail': f'Invalid category: "{bad_cat}" → "Electronics"',
-                    'action_taken': 'CORRECTED'
-                })
-                df_clean.loc[idx, 'category'] = 'Electronics'
+            self.normalize_column(df_clean, 'category', 'order_id')
         
-        # Summary
-        dropped = original_count - len(df_clean)
-        valid = len(df_clean)
-        cleanliness = (valid / original_count) * 100 if original_count > 0 else 0
-        
-        summary = {
-            'original_records': original_count,
-            'cleaned_records': valid,
-            'dropped_records': dropped,
-            'issues_found': len([i for i in self.issues_log if 'ORD' in i['record_identifier']]),
-            'cleanliness_score': cleanliness
-        }
-        
-        print(f"\n   Summary:")
-        print(f"   • Original: {summary['original_records']}")
-        print(f"   • Cleaned: {summary['cleaned_records']}")
-        print(f"   • Dropped: {summary['dropped_records']}")
-        print(f"   • Cleanliness: {summary['cleanliness_score']:.1f}%")
+        _, residual = self.validate_frame(df_clean)
+        print(f"   ✓ Rule suite: {residual['rows_with_violations']} rows still violating a rule")
         
-        self.cleaning_summary['sales'] = summary
         return df_clean
     
     # ========================
@@ -407,18 +638,15 @@ class DataCleaner:
         print("\n[1/2] Imputing missing unit costs...")
         missing_cost = df_clean['unit_cost_aed'].isna()
         
-        for idx in df_clean[missing_cost].index:
-            product_id = df_clean.loc[idx, 'product_id']
-            base_price = df_clean.loc[idx, 'base_price_aed']
-            imputed_cost = base_price * 0.5
-            df_clean.loc[idx, 'unit_cost_aed'] = imputed_cost
-            
-            self.issues_log.append({
-                'record_identifier': product_id,
-                'issue_type': 'MISSING_VALUE',
-                'issue_detail': f'Missing unit_cost_aed - imputed as 50% of {base_price}',
-                'action_taken': 'IMPUTED'
-            })
+        positions = np.flatnonzero(missing_cost.to_numpy())
+        self.issues_log.add(
+            'products', 'MISSING_VALUE', 'IMPUTED', df_clean['product_id'].to_numpy(), positions,
+            detail='Missing unit_cost_aed - imputed as 50% of {old}',
+            old=df_clean['base_price_aed'].to_numpy()[positions], rule='unit_cost_aed'
+        )
+        df_clean['unit_cost_aed'] = df_clean['unit_cost_aed'].where(
+            ~missing_cost, df_clean['base_price_aed'] * 0.5
+        )
         
         print(f"   ✓ Imputed {missing_cost.sum()} missing unit costs")
         
@@ -426,25 +654,24 @@ class DataCleaner:
         print("[2/2] Validating cost constraints...")
         invalid_cost = df_clean['unit_cost_aed'] > df_clean['base_price_aed']
         
-        for idx in df_clean[invalid_cost].index:
-            product_id = df_clean.loc[idx, 'product_id']
-            old_cost = df_clean.loc[idx, 'unit_cost_aed']
-            new_cost = df_clean.loc[idx, 'base_price_aed']
-            df_clean.loc[idx, 'unit_cost_aed'] = new_cost
-            
-            self.issues_log.append({
-                'record_identifier': product_id,
-                'issue_type': 'CONSTRAINT_VIOLATION',
-                'issue_detail': f'unit_cost ({old_cost}) > base_price ({new_cost}) - capped',
-                'action_taken': 'CAPPED'
-            })
+        positions = np.flatnonzero(invalid_cost.to_numpy())
+        self.issues_log.add(
+            'products', 'CONSTRAINT_VIOLATION', 'CAPPED', df_clean['product_id'].to_numpy(), positions,
+            detail='unit_cost ({old}) > base_price ({new}) - capped',
+            old=df_clean['unit_cost_aed'].to_numpy()[positions],
+            new=df_clean['base_price_aed'].to_numpy()[positions],
+            rule='unit_cost_aed <= base_price_aed'
+        )
+        df_clean['unit_cost_aed'] = df_clean['unit_cost_aed'].where(
+            ~invalid_cost, df_clean['base_price_aed']
+        )
         
         print(f"   ✓ Fixed {invalid_cost.sum()} cost constraint violations")
         
         summary = {
             'original_records': original_count,
             'cleaned_records': len(df_clean),
-            'issues_found': len([i for i in self.issues_log if 'P' in i['record_identifier']]),
+            'issues_found': self.issues_log.count(table='products'),
             'cleanliness_score': 100.0
         }
         
@@ -466,26 +693,13 @@ class DataCleaner:
         # Standardize city names
         print("\n[1/1] Standardizing store attributes...")
         
-        city_mapping = {
-            'dubai': 'Dubai', 'DUBAI': 'Dubai', 'Dubayy': 'Dubai',
-            'abu dhabi': 'Abu Dhabi', 'ABU DHABI': 'Abu Dhabi',
-            'AbuDhabi': 'Abu Dhabi', 'Abu-Dhabi': 'Abu Dhabi',
-            'sharjah': 'Sharjah', 'SHARJAH': 'Sharjah',
-            'Sharja': 'Sharjah', 'Sharjh': 'Sharjah'
-        }
-        
         corrections = 0
-        for idx in df_clean.index:
-            if 'city' in df_clean.columns and pd.notna(df_clean.loc[idx, 'city']):
-                city = str(df_clean.loc[idx, 'city']).strip()
-                if city in city_mapping:
-                    df_clean.loc[idx, 'city'] = city_mapping[city]
-                    corrections += 1
-                elif city not in ValidationRules.VALID_CITIES:
-                    df_clean.loc[idx, 'city'] = 'Dubai'
-                    corrections += 1
-        
-        print(f"   ✓ Standardized {corrections} city names")
+        for column in ('city', 'channel', 'fulfillment_type'):
+            if column in df_clean.columns:
+                changes = self.normalize_column(df_clean, column)
+                corrections += sum(len(c['positions']) for c in changes)
+        
+        print(f"   ✓ Standardized {corrections} store attribute values")
         
         summary = {
             'original_records': original_count,
@@ -500,6 +714,14 @@ class DataCleaner:
     # ========================
     # INVENTORY DATA CLEANING
     # ========================
+    @staticmethod
+    def _inventory_record_ids(df, mask):
+        """"<snapshot_date>_<product_id>" identifiers for the rows selected by mask"""
+        rows = df.loc[mask, ['snapshot_date', 'product_id']]
+        # Missing parts render as "nan", like the f-string they replace
+        parts = [rows[col].astype(str).fillna('nan') for col in ('snapshot_date', 'product_id')]
+        return (parts[0] + '_' + parts[1]).to_numpy()
+    
     def clean_inventory_data(self, df):
         """Clean inventory_snapshot table"""
         print("\n" + "="*80)
@@ -513,20 +735,13 @@ class DataCleaner:
         print("\n[1/2] Correcting impossible inventory values...")
         negative_stock = df_clean['stock_on_hand'] < 0
         
-        for idx in df_clean[negative_stock].index:
-            snapshot_date = df_clean.loc[idx, 'snapshot_date']
-            product_id = df_clean.loc[idx, 'product_id']
-            old_stock = df_clean.loc[idx, 'stock_on_hand']
-            record_id = f"{snapshot_date}_{product_id}"
-            
-            df_clean.loc[idx, 'stock_on_hand'] = 0
-            
-            self.issues_log.append({
-                'record_identifier': record_id,
-                'issue_type': 'IMPOSSIBLE_VALUE',
-                'issue_detail': f'Negative stock {old_stock} corrected to 0',
-                'action_taken': 'CORRECTED'
-            })
+        self.issues_log.add(
+            'inventory', 'IMPOSSIBLE_VALUE', 'CORRECTED', self._inventory_record_ids(df_clean, negative_stock),
+            detail='Negative stock {old} corrected to 0',
+            old=df_clean['stock_on_hand'].to_numpy()[negative_stock.to_numpy()],
+            rule='stock_on_hand >= 0'
+        )
+        df_clean['stock_on_hand'] = df_clean['stock_on_hand'].where(~negative_stock, 0)
         
         print(f"   ✓ Corrected {negative_stock.sum()} negative stock values")
         
@@ -534,20 +749,13 @@ class DataCleaner:
         print("[2/2] Capping extreme inventory...")
         extreme_stock = df_clean['stock_on_hand'] > 1000
         
-        for idx in df_clean[extreme_stock].index:
-            snapshot_date = df_clean.loc[idx, 'snapshot_date']
-            product_id = df_clean.loc[idx, 'product_id']
-            old_stock = df_clean.loc[idx, 'stock_on_hand']
-            record_id = f"{snapshot_date}_{product_id}"
-            
-            df_clean.loc[idx, 'stock_on_hand'] = 500
-            
-            self.issues_log.append({
-                'record_identifier': record_id,
-                'issue_type': 'OUTLIER_VALUE',
-                'issue_detail': f'Extreme stock {old_stock} capped to 500',
-                'action_taken': 'CAPPED'
-            })
+        self.issues_log.add(
+            'inventory', 'OUTLIER_VALUE', 'CAPPED', self._inventory_record_ids(df_clean, extreme_stock),
+            detail='Extreme stock {old} capped to 500',
+            old=df_clean['stock_on_hand'].to_numpy()[extreme_stock.to_numpy()],
+            rule='stock_on_hand <= 1000'
+        )
+        df_clean['stock_on_hand'] = df_clean['stock_on_hand'].where(~extreme_stock, 500)
         
         print(f"   ✓ Capped {extreme_stock.sum()} extreme inventory values")
         
@@ -564,21 +772,49 @@ class DataCleaner:
     # ========================
     # MAIN CLEANING PIPELINE
     # ========================
-    def clean_all_data(self, products_df, stores_df, sales_df, inventory_df):
-        """Execute complete cleaning pipeline for all datasets"""
+    def _clean_table(self, name, clean, df, checkpoint):
+        """Run one table's cleaner, or restore its result from the checkpoint"""
+        if checkpoint is not None and checkpoint.table_done(name):
+            print(f"\n♻️  {name.title()} restored from checkpoint")
+            return checkpoint.load_table(name)
+        df_clean = clean(df)
+        if checkpoint is not None:
+            checkpoint.save_table(name, df_clean, self)
+        return df_clean
+    
+    def clean_all_data(self, products_df, stores_df, sales_df, inventory_df, checkpoint=None):
+        """
+        Execute complete cleaning pipeline for all datasets.
+        checkpoint: optional CleaningCheckpoint; progress is saved after each
+        table and the expensive sales steps, and a resumed checkpoint skips
+        finished work.
+        """
         
         print("\n" + "="*80)
         print(" "*15 + "UAE PROMO PULSE - PHASE 1 DATA CLEANING PIPELINE")
         print("="*80)
         
-        # Clean each dataset
-        products_clean = self.clean_products_data(products_df)
-        stores_clean = self.clean_stores_data(stores_df)
-        sales_clean = self.clean_sales_data(sales_df)
-        inventory_clean = self.clean_inventory_data(inventory_df)
+        if checkpoint is not None and checkpoint.resumed:
+            print("\n♻️  Resuming from checkpoint")
+            checkpoint.restore(self)
         
-        # Generate issues log
-        issues_df = pd.DataFrame(self.issues_log)
+        # Clean each dataset
+        products_clean = self._clean_table('products', self.clean_products_data, products_df, checkpoint)
+        stores_clean = self._clean_table('stores', self.clean_stores_data, stores_df, checkpoint)
+        if checkpoint is not None and checkpoint.table_done('sales'):
+            print("\n♻️  Sales restored from checkpoint")
+            sales_clean = checkpoint.resume_sales()[1]
+        else:
+            sales_clean = self.clean_sales_data(sales_df, checkpoint)
+            if checkpoint is not None:
+                checkpoint.mark_done('sales', self)
+        inventory_clean = self._clean_table('inventory', self.clean_inventory_data, inventory_df, checkpoint)
+        
+        if checkpoint is not None:
+            checkpoint.finish()
+        
+        # Issues stay columnar; details are rendered when the log is written
+        issues_log = self.issues_log
         
         # Print comprehensive summary
         print("\n" + "="*80)
@@ -611,50 +847,109 @@ class DataCleaner:
         print(f"   • Quality Score: {self.cleaning_summary['inventory']['cleanliness_score']:.1f}%")
         
         print("\n" + "-"*80)
-        print(f"TOTAL ISSUES LOGGED: {len(issues_df)}")
+        print(f"TOTAL ISSUES LOGGED: {len(issues_log)}")
+        if issues_log.level != 'full':
+            print(f"   ({issues_log.logged} exemplar rows kept, log level '{issues_log.level}')")
         
-        if len(issues_df) > 0:
+        if len(issues_log) > 0:
             print("\nIssue Breakdown by Type:")
-            for issue_type, count in issues_df['issue_type'].value_counts().items():
+            for issue_type, count in issues_log.type_breakdown().items():
                 print(f"   • {issue_type}: {count}")
         
         print("\n" + "="*80)
         print(" "*25 + "✅ CLEANING PIPELINE COMPLETE")
         print("="*80 + "\n")
         
-        return products_clean, stores_clean, sales_clean, inventory_clean, issues_df
+        return products_clean, stores_clean, sales_clean, inventory_clean, issues_log
 
 
-def main():
+def main(argv=None):
     """Main execution - load, clean, and save data"""
+    parser = argparse.ArgumentParser(description="Clean the raw UAE Promo Pulse datasets")
+    parser.add_argument('--log-level', choices=LOG_LEVELS, default='full',
+                        help="Issue rows to keep: all, first N per rule, or a sample per rule")
+    parser.add_argument('--exemplars', type=int, default=20,
+                        help="Issue rows kept per rule for aggregate/sample levels")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for sampled exemplars")
+    parser.add_argument('--cache-dir', default='.clean_cache',
+                        help="Reuse results when raw files and cleaning rules are unchanged")
+    parser.add_argument('--no-cache', action='store_true', help="Always re-clean")
+    parser.add_argument('--compress', choices=['gzip', 'zstd', 'zip'], default=None,
+                        help="Write the *_clean and issues files compressed")
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help="Save progress under <dir>/.promo_pulse_checkpoint so a failed "
+                             "run can be resumed (off by default)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue an interrupted run from its last completed step "
+                             "(checkpoint dir defaults to .)")
+    args = parser.parse_args(argv)
+    
+    from clean_cache import CleaningCache
+    from clean_checkpoint import CleaningCheckpoint
+    from ingest import RAW_FILES, compressed_path, open_output, read_tables, table_paths
+    
+    # Raw inputs may also be shipped compressed (e.g. sales_raw.csv.gz)
+    raw_sources = table_paths(RAW_FILES)
+    raw_files = {name: path for name, (path, _) in raw_sources.items()}
+    
     try:
-        print("📂 Loading raw datasets...")
-        products = pd.read_csv('products.csv')
-        stores = pd.read_csv('stores.csv')
-        sales = pd.read_csv('sales_raw.csv')
-        inventory = pd.read_csv('inventory_snapshot.csv')
-        
-        print(f"✓ Loaded: {len(products)} products, {len(stores)} stores, {len(sales)} sales, {len(inventory)} inventory")
-        
-        # Execute cleaning pipeline
-        cleaner = DataCleaner()
-        products_c, stores_c, sales_c, inventory_c, issues_df = \
-            cleaner.clean_all_data(products, stores, sales, inventory)
+        cache = CleaningCache(args.cache_dir)
+        # Identifies this run's inputs, rules and options (cache + checkpoint)
+        run_key = cache.key(raw_files, namespace='cleaner', options={
+            'log_level': args.log_level, 'exemplars': args.exemplars, 'seed': args.seed,
+        })
+        cached = None if args.no_cache else cache.get(run_key)
+        
+        if cached is not None:
+            print("♻️  Raw files and cleaning rules unchanged - reusing cached clean tables")
+            products_c, stores_c, sales_c, inventory_c, issues_log = cached['tables']
+            print(f"✓ {len(sales_c)} clean sales, {len(issues_log)} issues logged")
+        else:
+            print("📂 Loading raw datasets...")
+            raw = read_tables(raw_sources)
+            products, stores, sales, inventory = (raw['products'], raw['stores'],
+                                                  raw['sales'], raw['inventory'])
+            
+            print(f"✓ Loaded: {len(products)} products, {len(stores)} stores, {len(sales)} sales, {len(inventory)} inventory")
+            
+            # Execute cleaning pipeline
+            cleaner = DataCleaner(args.log_level, args.exemplars, args.seed)
+            # Checkpointing is opt-in: it pickles every table as it completes
+            checkpoint = None
+            if args.checkpoint_dir is not None or args.resume:
+                checkpoint = CleaningCheckpoint(args.checkpoint_dir or '.', run_key, resume=args.resume)
+                if args.resume and not checkpoint.resumed:
+                    print("ℹ️  No matching checkpoint found - starting from the beginning")
+            products_c, stores_c, sales_c, inventory_c, issues_log = \
+                cleaner.clean_all_data(products, stores, sales, inventory, checkpoint)
+            
+            if not args.no_cache:
+                cache.put(run_key, {
+                    'tables': (products_c, stores_c, sales_c, inventory_c, issues_log),
+                    'cleaning_summary': cleaner.cleaning_summary,
+                })
         
         # Save cleaned datasets
         print("💾 Saving cleaned datasets...")
-        products_c.to_csv('products_clean.csv', index=False)
-        stores_c.to_csv('stores_clean.csv', index=False)
-        sales_c.to_csv('sales_clean.csv', index=False)
-        inventory_c.to_csv('inventory_clean.csv', index=False)
-        issues_df.to_csv('issues.csv', index=False)
+        outputs = {
+            'products_clean.csv': products_c,
+            'stores_clean.csv': stores_c,
+            'sales_clean.csv': sales_c,
+            'inventory_clean.csv': inventory_c,
+            'issues.csv': issues_log,
+        }
+        written = []
+        for filename, data in outputs.items():
+            path = compressed_path(filename, args.compress)
+            with open_output(path, args.compress) as f:
+                data.to_csv(f, index=False)
+            written.append(path)
+        issues_log.summary().to_csv('issues_summary.csv', index=False)
+        written.append('issues_summary.csv')
         
         print("✅ All files saved successfully!")
-        print("   • products_clean.csv")
-        print("   • stores_clean.csv")
-        print("   • sales_clean.csv")
-        print("   • inventory_clean.csv")
-        print("   • issues.csv")
+        for path in written:
+            print(f"   • {path}")
         
     except FileNotFoundError as e:
         print(f"❌ Error: {e}")
@@ -0,0 +1,297 @@
+"""
+UAE Promo Pulse - Columnar Sales Store
+On-disk, month-partitioned column files for sales history larger than RAM.
+Queries memory-map only the partitions and columns they need.
+
+Usage:
+    python columnar_store.py sales_clean.csv products_clean.csv stores_clean.csv sales_store/
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from ingest import iter_table, read_table
+from sketches import SalesSketches
+
+
+MANIFEST_FILE = 'manifest.json'
+SKETCH_FILE = 'sketches.json'
+TIME_COLUMN = 'order_time'
+
+# Attributes joined onto every sales row at build time (same as PromoSimulator)
+PRODUCT_ATTRS = ['product_id', 'category', 'brand', 'unit_cost_aed']
+STORE_ATTRS = ['store_id', 'city', 'channel', 'fulfillment_type']
+
+# order_id is unique per row and not needed by any aggregate query
+EXCLUDE_COLUMNS = ('order_id',)
+
+# Stands for NaN in integer column files
+INT_MISSING = np.iinfo(np.int64).min
+
+
+class SalesStore:
+    """
+    Month-partitioned store of enriched sales rows.
+
+    Layout:
+        <path>/manifest.json              column specs, categories, partition index
+        <path>/sketches.json              distinct-count / quantile sketches (see sketches.py)
+        <path>/<YYYY-MM>/<part>.<col>.npy one file per column per appended chunk
+
+    Text columns are dictionary-encoded with one global category list per
+    column, so codes are comparable across partitions. Numeric columns keep
+    the dtype of the first chunk (int64 or float64, recorded in the
+    manifest); NaN in an integer column is written as INT_MISSING and the
+    column reads back as float64, like pandas reads it from CSV.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        self.columns = manifest['columns']
+        self.partitions = manifest['partitions']
+        self._dtypes = {
+            name: pd.CategoricalDtype(spec['categories'])
+            for name, spec in self.columns.items() if spec['kind'] == 'category'
+        }
+
+    # ------------------------
+    # Building
+    # ------------------------
+    @staticmethod
+    def enrich(sales_df, products_df, stores_df):
+        """Join product and store attributes onto raw sales rows"""
+        enriched = sales_df.merge(products_df[PRODUCT_ATTRS], on='product_id', how='left')
+        return enriched.merge(stores_df[STORE_ATTRS], on='store_id', how='left')
+
+    @staticmethod
+    def _encode_numeric(series, spec):
+        """Column values in the spec's dtype; flags spec['missing'] when an integer column has NaN"""
+        if spec['dtype'] == 'float64':
+            return series.to_numpy(dtype=np.float64)
+        missing = series.isna().to_numpy()
+        if missing.any():
+            spec['missing'] = True
+            series = series.fillna(0)
+        if not pd.api.types.is_integer_dtype(series):
+            values = series.to_numpy(dtype=np.float64)
+            if (values != np.round(values)).any():
+                raise ValueError(f"Integer column {series.name} has non-integer values in a later chunk")
+        return np.where(missing, INT_MISSING, series.to_numpy(dtype=np.int64))
+
+    @classmethod
+    def build(cls, chunks, path, products_df, stores_df):
+        """
+        Write an iterable of raw sales DataFrames into a new store at path.
+        Chunks are enriched, split by order month and appended one at a time,
+        so peak memory is one chunk regardless of history size. Sales
+        sketches are updated chunk by chunk on the way (before order_id is
+        dropped).
+        """
+        os.makedirs(path, exist_ok=True)
+        columns = {}
+        categories = {}
+        partitions = {}
+        part_no = 0
+        sketches = SalesSketches()
+
+        for chunk in chunks:
+            chunk = chunk.copy()
+            chunk[TIME_COLUMN] = pd.to_datetime(chunk[TIME_COLUMN], errors='coerce')
+            chunk = chunk[chunk[TIME_COLUMN].notna()]
+            chunk = cls.enrich(chunk, products_df, stores_df)
+            sketches.update(chunk)
+            chunk = chunk.drop(columns=[c for c in EXCLUDE_COLUMNS if c in chunk.columns])
+
+            encoded = {}
+            for col in chunk.columns:
+                series = chunk[col]
+                if col not in columns:
+                    if col == TIME_COLUMN:
+                        kind = 'datetime'
+                    elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                        kind = 'numeric'
+                    else:
+                        kind = 'category'
+                    columns[col] = {'kind': kind}
+                    if kind == 'numeric':
+                        columns[col]['dtype'] = ('int64' if pd.api.types.is_integer_dtype(series)
+                                                 else 'float64')
+
+                kind = columns[col]['kind']
+                if kind == 'datetime':
+                    encoded[col] = series.to_numpy(dtype='datetime64[ns]').view(np.int64)
+                elif kind == 'numeric':
+                    encoded[col] = cls._encode_numeric(series, columns[col])
+                else:
+                    known = categories.setdefault(col, {})
+                    uniques = pd.unique(series.dropna())
+                    for value in sorted(v for v in uniques if v not in known):
+                        known[value] = len(known)
+                    encoded[col] = series.map(known).fillna(-1).to_numpy(dtype=np.int32)
+
+            months = chunk[TIME_COLUMN].dt.strftime('%Y-%m').to_numpy()
+            for month in np.unique(months):
+                rows = months == month
+                part_dir = os.path.join(path, month)
+                os.makedirs(part_dir, exist_ok=True)
+                part = f"part-{part_no:05d}"
+                for col, values in encoded.items():
+                    np.save(os.path.join(part_dir, f"{part}.{col}.npy"),
+                            np.ascontiguousarray(values[rows]), allow_pickle=False)
+
+                times = encoded[TIME_COLUMN][rows]
+                entry = partitions.setdefault(month, {
+                    'key': month, 'rows': 0, 'parts': [],
+                    'min_time': int(times.min()), 'max_time': int(times.max()),
+                })
+                entry['rows'] += int(rows.sum())
+                entry['parts'].append(part)
+                entry['min_time'] = min(entry['min_time'], int(times.min()))
+                entry['max_time'] = max(entry['max_time'], int(times.max()))
+            part_no += 1
+
+        for col, known in categories.items():
+            columns[col]['categories'] = list(known)
+
+        manifest = {
+            'columns': columns,
+            'partitions': [partitions[k] for k in sorted(partitions)],
+        }
+        with open(os.path.join(path, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, default=str)
+        sketches.save(os.path.join(path, SKETCH_FILE))
+        return cls(path)
+
+    @classmethod
+    def build_from_csv(cls, sales_csv, path, products_df, stores_df, chunksize=1_000_000):
+        """Stream a (possibly compressed) sales CSV into a new store without loading it whole"""
+        return cls.build(iter_table(sales_csv, 'sales_clean', chunksize), path, products_df, stores_df)
+
+    # ------------------------
+    # Querying
+    # ------------------------
+    @property
+    def min_time(self):
+        return pd.Timestamp(min(p['min_time'] for p in self.partitions)) if self.partitions else pd.NaT
+
+    @property
+    def max_time(self):
+        return pd.Timestamp(max(p['max_time'] for p in self.partitions)) if self.partitions else pd.NaT
+
+    @property
+    def rows(self):
+        return sum(p['rows'] for p in self.partitions)
+
+    def sketches(self):
+        """SalesSketches built with the store (None for stores built without them)"""
+        path = os.path.join(self.path, SKETCH_FILE)
+        return SalesSketches.load(path) if os.path.exists(path) else None
+
+    def prune(self, start=None, end=None):
+        """Partitions whose time range overlaps [start, end)"""
+        lo = pd.Timestamp(start).value if start is not None else None
+        hi = pd.Timestamp(end).value if end is not None else None
+        return [p for p in self.partitions
+                if (lo is None or p['max_time'] >= lo) and (hi is None or p['min_time'] < hi)]
+
+    def _load(self, partition, part, col):
+        return np.load(os.path.join(self.path, partition['key'], f"{part}.{col}.npy"), mmap_mode='r')
+
+    def _filter_codes(self, filters):
+        """Translate {column: value} filters into category codes (None = no match)"""
+        codes = {}
+        for col, value in (filters or {}).items():
+            if value is None or value == 'All':
+                continue
+            categories = self.columns[col]['categories']
+            codes[col] = categories.index(value) if value in categories else None
+        return codes
+
+    def _frame(self, columns, data):
+        frame = {}
+        for col in columns:
+            values = data[col]
+            kind = self.columns[col]['kind']
+            if kind == 'datetime':
+                frame[col] = values.view('datetime64[ns]')
+            elif kind == 'category':
+                frame[col] = pd.Categorical.from_codes(values, dtype=self._dtypes[col], validate=False)
+            elif self.columns[col].get('missing'):
+                frame[col] = np.where(values == INT_MISSING, np.nan, values)
+            else:
+                frame[col] = values
+        return pd.DataFrame(frame, columns=columns, copy=False)
+
+    def iter_partitions(self, columns, start=None, end=None, filters=None):
+        """
+        Yield one DataFrame per month partition holding only `columns`, rows
+        in [start, end) and rows matching the equality filters.
+        """
+        columns = list(columns)
+        codes = self._filter_codes(filters)
+        if any(code is None for code in codes.values()):
+            return
+        lo = pd.Timestamp(start).value if start is not None else None
+        hi = pd.Timestamp(end).value if end is not None else None
+        needed = list(dict.fromkeys(columns + list(codes) + ([TIME_COLUMN] if lo is not None or hi is not None else [])))
+
+        for partition in self.prune(start, end):
+            pieces = []
+            for part in partition['parts']:
+                arrays = {col: self._load(partition, part, col) for col in needed}
+                mask = None
+                for col, code in codes.items():
+                    hit = arrays[col] == code
+                    mask = hit if mask is None else mask & hit
+                if lo is not None and partition['min_time'] < lo:
+                    hit = arrays[TIME_COLUMN] >= lo
+                    mask = hit if mask is None else mask & hit
+                if hi is not None and partition['max_time'] >= hi:
+                    hit = arrays[TIME_COLUMN] < hi
+                    mask = hit if mask is None else mask & hit
+                if mask is not None:
+                    arrays = {col: arrays[col][mask] for col in columns}
+                pieces.append(self._frame(columns, arrays))
+            frame = pieces[0] if len(pieces) == 1 else pd.concat(pieces, ignore_index=True)
+            if len(frame):
+                yield frame
+
+    def scan(self, columns, start=None, end=None, filters=None):
+        """Concatenate iter_partitions() into a single DataFrame"""
+        frames = list(self.iter_partitions(columns, start, end, filters))
+        if not frames:
+            return self._frame(list(columns), {
+                col: np.empty(0, dtype={'datetime': np.int64, 'category': np.int32}.get(
+                    self.columns[col]['kind'], self.columns[col].get('dtype', 'float64')))
+                for col in columns
+            })
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a month-partitioned columnar sales store")
+    parser.add_argument('sales_csv')
+    parser.add_argument('products_csv')
+    parser.add_argument('stores_csv')
+    parser.add_argument('store_path')
+    parser.add_argument('--chunksize', type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    start_time = time.time()
+    store = SalesStore.build_from_csv(
+        args.sales_csv, args.store_path,
+        read_table(args.products_csv, 'products'), read_table(args.stores_csv, 'stores'), args.chunksize
+    )
+    print(f"✅ Built store with {store.rows:,} rows in {len(store.partitions)} monthly partitions "
+          f"({store.min_time} → {store.max_time}) in {time.time() - start_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+UAE Promo Pulse - Elasticity
+Fits price elasticity of demand from sales history per category x channel x
+city segment (optionally per SKU), for data-driven promo uplift
+"""
+
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from fingerprint import fingerprint_frames
+
+
+SEGMENT_KEYS = ['category', 'channel', 'city']
+SKU_KEYS = ['product_id', 'channel', 'city']
+FIT_COLUMNS = ['order_time', 'payment_status', 'product_id', 'qty', 'discount_pct'] + SEGMENT_KEYS
+# Additive regression sums per group: cells, Sx, Sy, Sxx, Sxy
+SUM_COLUMNS = ['n', 'sx', 'sy', 'sxx', 'sxy']
+
+# Uplift models accepted by PromoSimulator.simulate_promo
+UPLIFT_MODELS = ('rules', 'elasticity', 'sku_elasticity')
+
+# Fitted models kept in memory, keyed by dataset fingerprint and fit options
+MAX_CACHED_MODELS = 8
+# ... and on disk, one JSON file per key; bump MODEL_VERSION when the fit changes
+DEFAULT_MODEL_DIR = '.elasticity_cache'
+MODEL_VERSION = 2
+
+
+def _log_price(discount_pct):
+    """Log of the price paid relative to base price"""
+    return np.log1p(-np.asarray(discount_pct, dtype=np.float64) / 100)
+
+
+def _fit_rows(sales):
+    """Paid orders with positive qty, a known discount below 100% and a complete segment"""
+    df = sales[FIT_COLUMNS]
+    df = df[(df['payment_status'] == 'Paid') & (df['qty'] > 0)
+            & df['discount_pct'].between(0, 100, inclusive='left')]
+    return df.dropna(subset=SEGMENT_KEYS + ['order_time'])
+
+
+def _regression_sums(df, keys):
+    """
+    Demand cells (qty summed per keys x day x discount level) reduced to
+    SUM_COLUMNS per keys group, with x = log price and y = log cell qty.
+    Days never straddle two chunks of a day-aligned split (e.g. month
+    partitions), so sums of such chunks add up to the sums of the whole.
+    """
+    day = pd.to_datetime(df['order_time']).dt.floor('D').rename('day')
+    cells = df.groupby([df[k] for k in keys] + [day, df['discount_pct']],
+                       observed=True, sort=False)['qty'].sum().reset_index()
+    x = _log_price(cells['discount_pct'].to_numpy())
+    y = np.log(cells['qty'].to_numpy(dtype=np.float64))
+    sums = pd.DataFrame({'n': 1.0, 'sx': x, 'sy': y, 'sxx': x * x, 'sxy': x * y})
+    return sums.groupby([cells[k] for k in keys], observed=True, sort=True).sum()
+
+
+def demand_sums(sales, per_sku=True):
+    """
+    Regression sums of enriched sales (FIT_COLUMNS) per segment and, with
+    per_sku, per SKU (keyed by SKU_KEYS + category, the SKU's parent segment)
+    """
+    df = _fit_rows(sales)
+    return {
+        'segment': _regression_sums(df, SEGMENT_KEYS),
+        'sku': _regression_sums(df, SKU_KEYS + ['category']) if per_sku else None,
+    }
+
+
+def merge_demand_sums(left, right):
+    """Combine the demand_sums() of two day-aligned chunks of sales"""
+    if left is None:
+        return right
+    def merge(a, b):
+        if a is None:
+            return None
+        both = pd.concat([a, b])
+        return both.groupby(level=list(range(both.index.nlevels)), observed=True, sort=True).sum()
+    return {level: merge(left[level], right[level]) for level in left}
+
+
+def _centered(sums):
+    """n, centered Sxx / Sxy and mean x of every row of a regression sums table"""
+    n, sx, sy, sxx, sxy = (sums[col].to_numpy(dtype=np.float64) for col in SUM_COLUMNS)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = np.where(n > 0, sx / n, 0.0)
+        mean_y = np.where(n > 0, sy / n, 0.0)
+    # Clip tiny negative values left by cancellation
+    cxx = np.maximum(sxx - n * mean_x * mean_x, 0.0)
+    cxy = sxy - n * mean_x * mean_y
+    return n, cxx, cxy, mean_x
+
+
+def _shrink(cxx, cxy, k, parent):
+    """Ridge slope shrunk toward parent; groups without price variation get parent"""
+    denom = cxx + k
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(denom > 0, (cxy + k * parent) / denom, parent)
+
+
+class ElasticityModel:
+    """
+    Constant-elasticity demand model  log(qty) = a + e * log(price / base_price).
+
+    Demand is observed per cell: the paid qty of a group summed per day and
+    discount level, so an observation is how much sold at one price, not
+    the basket size of one order. Every segment is a ridge regression of
+    log(cell qty) on log price, shrunk toward its parent:
+    e = (Sxy + k * e_parent) / (Sxx + k)  with centered sums. Segments
+    shrink toward the pooled fit and SKUs (product x channel x city) toward
+    their segment, so sparse groups fall back gracefully. k equals
+    `prior_rows` cells of average price variation; `rows` in the fitted
+    tables counts cells.
+
+    Uplift at a discount is measured against the segment's historical
+    average price, which is what the 30-day baseline demand was sold at.
+    """
+
+    def __init__(self, pooled, segments, skus=None, fingerprint=None):
+        self.pooled = pooled
+        self.segments = segments
+        self.skus = skus
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def fit(cls, sales, prior_rows=50, per_sku=True, max_elasticity=0.0, fingerprint=None):
+        """
+        Fit from enriched sales (FIT_COLUMNS). Only paid orders with a known
+        discount below 100% and positive qty are used. Elasticities above
+        max_elasticity (demand falling as price drops) are clipped.
+        """
+        return cls.from_sums(demand_sums(sales, per_sku), prior_rows, max_elasticity, fingerprint)
+
+    @classmethod
+    def from_sums(cls, sums, prior_rows=50, max_elasticity=0.0, fingerprint=None):
+        """Fit from demand_sums() output"""
+        seg_sums = sums['segment']
+        n, cxx, cxy, mean_x = _centered(seg_sums.sum().to_frame().T)
+        pooled_e = min(cxy[0] / cxx[0], max_elasticity) if cxx[0] > 0 else 0.0
+        k = prior_rows * cxx[0] / n[0] if n[0] > 0 else 0.0
+        pooled = {'rows': int(n[0]), 'elasticity': pooled_e,
+                  'ref_log_price': float(mean_x[0]) if n[0] > 0 else 0.0}
+
+        n, cxx, cxy, mean_x = _centered(seg_sums)
+        seg_e = np.minimum(_shrink(cxx, cxy, k, pooled_e), max_elasticity)
+        segments = pd.DataFrame({'rows': n.astype(np.int64), 'elasticity': seg_e,
+                                 'ref_log_price': mean_x}, index=seg_sums.index)
+
+        skus = None
+        if sums['sku'] is not None:
+            sku_sums = sums['sku']
+            # Parent segment of every SKU (a product has a single category)
+            parent = segments.index.get_indexer(
+                sku_sums.index.droplevel('product_id').reorder_levels(SEGMENT_KEYS))
+            n, cxx, cxy, mean_x = _centered(sku_sums)
+            sku_e = np.minimum(_shrink(cxx, cxy, k, seg_e[parent]), max_elasticity)
+            skus = pd.DataFrame({'rows': n.astype(np.int64), 'elasticity': sku_e,
+                                 'ref_log_price': mean_x},
+                                index=sku_sums.index.droplevel('category'))
+
+        return cls(pooled, segments, skus, fingerprint)
+
+    def to_dict(self):
+        def table(frame):
+            return None if frame is None else frame.reset_index().to_dict(orient='list')
+        return {'version': MODEL_VERSION, 'fingerprint': self.fingerprint, 'pooled': self.pooled,
+                'segments': table(self.segments), 'skus': table(self.skus)}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != MODEL_VERSION:
+            raise ValueError(f"Elasticity model version {data.get('version')} != {MODEL_VERSION}")
+        def table(columns, keys):
+            return None if columns is None else pd.DataFrame(columns).set_index(keys)
+        return cls(data['pooled'], table(data['segments'], SEGMENT_KEYS),
+                   table(data['skus'], SKU_KEYS), data['fingerprint'])
+
+    def save(self, path):
+        """Write the model as JSON (atomically, so readers never see a partial file)"""
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.to_dict(), f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def coefficients(self, level='segment'):
+        """Fitted table per segment ('segment') or SKU ('sku'), as a flat DataFrame"""
+        table = self.skus if level == 'sku' else self.segments
+        if table is None:
+            raise ValueError("Model was fitted without per-SKU coefficients")
+        out = table.reset_index()
+        out['ref_discount_pct'] = -np.expm1(out.pop('ref_log_price')) * 100
+        return out
+
+    def _lookup(self, table, keys, df):
+        index = pd.MultiIndex.from_frame(df[keys].astype(object))
+        found = table.reindex(index)
+        return (found['elasticity'].to_numpy(dtype=np.float64, copy=True),
+                found['ref_log_price'].to_numpy(dtype=np.float64, copy=True))
+
+    def elasticities(self, df, level='segment'):
+        """
+        Elasticity and reference log price for each row of df (which carries
+        SEGMENT_KEYS, plus product_id for level='sku'). Unknown SKUs use their
+        segment, unknown segments the pooled fit.
+        """
+        e, ref = self._lookup(self.segments, SEGMENT_KEYS, df)
+        missing = np.isnan(e)
+        e[missing] = self.pooled['elasticity']
+        ref[missing] = self.pooled['ref_log_price']
+        if level == 'sku':
+            if self.skus is None:
+                raise ValueError("Model was fitted without per-SKU coefficients")
+            sku_e, sku_ref = self._lookup(self.skus, SKU_KEYS, df)
+            known = ~np.isnan(sku_e)
+            e[known] = sku_e[known]
+            ref[known] = sku_ref[known]
+        return e, ref
+
+    def uplift(self, df, discount_pct, level='segment'):
+        """Demand multiplier at discount_pct relative to historical pricing"""
+        e, ref = self.elasticities(df, level)
+        return np.exp(e * (_log_price(discount_pct) - ref)), e
+
+
+_MODELS = OrderedDict()
+_MODELS_LOCK = threading.Lock()
+
+
+def _model_path(model_dir, fingerprint, prior_rows, per_sku, max_elasticity):
+    level = 'sku' if per_sku else 'segment'
+    return os.path.join(model_dir, f"v{MODEL_VERSION}-{fingerprint}-{level}-{prior_rows}-{max_elasticity:g}.json")
+
+
+def fit_elasticities(sales, prior_rows=50, per_sku=True, max_elasticity=0.0,
+                     model_dir=DEFAULT_MODEL_DIR):
+    """
+    ElasticityModel for sales history, reusing an earlier fit when the same
+    data (by content fingerprint) was fitted with the same options: first
+    from memory, then from the coefficients saved under model_dir (None:
+    memory only), so a restarted process does not refit unchanged data.
+
+    sales is a DataFrame, or a callable returning a fresh iterator of
+    day-aligned chunks with FIT_COLUMNS (e.g. a ColumnarStore's month
+    partitions). Chunks are read one at a time, once to fingerprint and,
+    on a cache miss, once more to accumulate the regression sums, so the
+    history never has to fit in memory.
+    """
+    chunks = sales if callable(sales) else (lambda: [sales])
+    fingerprint = fingerprint_frames(df[FIT_COLUMNS] for df in chunks())
+    key = (fingerprint, prior_rows, per_sku, max_elasticity)
+    with _MODELS_LOCK:
+        model = _MODELS.get(key)
+        if model is not None:
+            _MODELS.move_to_end(key)
+            return model
+
+    path = _model_path(model_dir, *key) if model_dir is not None else None
+    try:
+        model = ElasticityModel.load(path) if path is not None else None
+    except (OSError, ValueError, KeyError):
+        # Missing, unreadable or written by an older fit: refit
+        model = None
+    if model is None:
+        sums = None
+        for df in chunks():
+            sums = merge_demand_sums(sums, demand_sums(df, per_sku))
+        if sums is None:
+            sums = demand_sums(pd.DataFrame(columns=FIT_COLUMNS), per_sku)
+        model = ElasticityModel.from_sums(sums, prior_rows, max_elasticity, fingerprint)
+        if path is not None:
+            try:
+                model.save(path)
+            except OSError:
+                pass  # read-only location: the in-memory copy still serves this process
+    with _MODELS_LOCK:
+        _MODELS[key] = model
+        while len(_MODELS) > MAX_CACHED_MODELS:
+            _MODELS.popitem(last=False)
+    return model
@@ -0,0 +1,145 @@
+"""
+UAE Promo Pulse - Exporter
+On-demand dataset exports: chunked serialization, gzip/columnar formats and a
+content-addressed cache so repeat downloads are free
+"""
+
+import gzip
+import io
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional
+
+import pandas as pd
+
+from fingerprint import dataset_fingerprint
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+
+# label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'CSV (gzip)': ('csv.gz', 'application/gzip'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+CHUNK_ROWS = 100_000
+
+
+def available_formats():
+    """Export formats supported by the installed libraries"""
+    return [fmt for fmt in EXPORT_FORMATS if fmt != 'Parquet' or pq is not None]
+
+
+def iter_csv_chunks(df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """Serialize a DataFrame to UTF-8 CSV one block of rows at a time"""
+    if len(df) == 0:
+        yield df.to_csv(index=False).encode('utf-8')
+        return
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        yield chunk.to_csv(index=False, header=(start == 0)).encode('utf-8')
+
+
+def write_export(df: pd.DataFrame, fmt: str, fileobj) -> None:
+    """Write df to a binary file object in the requested export format"""
+    if fmt == 'CSV':
+        for block in iter_csv_chunks(df):
+            fileobj.write(block)
+    elif fmt == 'CSV (gzip)':
+        # mtime=0 keeps the archive bytes identical for identical content
+        with gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=6, mtime=0) as gz:
+            for block in iter_csv_chunks(df):
+                gz.write(block)
+    elif fmt == 'Parquet':
+        if pq is None:
+            raise ImportError("Parquet export requires pyarrow (pip install pyarrow)")
+        writer = None
+        try:
+            for start in range(0, max(len(df), 1), CHUNK_ROWS):
+                table = pa.Table.from_pandas(df.iloc[start:start + CHUNK_ROWS], preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(fileobj, table.schema, compression='zstd')
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+
+class ExportCache:
+    """Thread-safe LRU of rendered exports keyed by (fingerprint, format)"""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, key, payload: bytes) -> None:
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = payload
+            self._size += len(payload)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+_EXPORT_CACHE = ExportCache()
+
+
+def get_export(df: pd.DataFrame, fmt: str = 'CSV', fingerprint: Optional[str] = None,
+               cache: Optional[ExportCache] = None) -> bytes:
+    """
+    Render df in the requested format, reusing a cached copy when the same
+    content was exported before. Pass `fingerprint` when the caller already
+    knows a cheaper identity for the data (e.g. simulation parameters).
+    """
+    cache = _EXPORT_CACHE if cache is None else cache
+    key = (fingerprint or dataset_fingerprint(df), fmt)
+
+    payload = cache.get(key)
+    if payload is None:
+        buffer = io.BytesIO()
+        write_export(df, fmt, buffer)
+        payload = buffer.getvalue()
+        cache.put(key, payload)
+    return payload
+
+
+def export_filename(stem: str, fmt: str, stamp: str) -> str:
+    """Build `<stem>_<stamp>.<ext>` for a given export format"""
+    return f"{stem}_{stamp}.{EXPORT_FORMATS[fmt][0]}"
+
+
+def export_mime(fmt: str) -> str:
+    """MIME type for a given export format"""
+    return EXPORT_FORMATS[fmt][1]
@@ -0,0 +1,33 @@
+"""
+UAE Promo Pulse - Fingerprint
+Stable content hashes of DataFrames, used to key caches of derived results
+(exports, fitted models) by the data they were computed from
+"""
+
+import hashlib
+from typing import Iterable
+
+import pandas as pd
+
+
+CHUNK_ROWS = 100_000
+
+
+def dataset_fingerprint(df: pd.DataFrame) -> str:
+    """Stable content hash of a DataFrame (columns, dtypes and values)"""
+    return fingerprint_frames([df])
+
+
+def fingerprint_frames(frames: Iterable[pd.DataFrame]) -> str:
+    """
+    dataset_fingerprint of the row-wise concatenation of frames (same
+    columns and dtypes), hashed one frame at a time without concatenating
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for i, df in enumerate(frames):
+        if i == 0:
+            digest.update(repr(list(zip(df.columns, df.dtypes.astype(str)))).encode('utf-8'))
+        for start in range(0, len(df), CHUNK_ROWS):
+            chunk = df.iloc[start:start + CHUNK_ROWS]
+            digest.update(pd.util.hash_pandas_object(chunk, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,128 @@
+"""
+UAE Promo Pulse - Demand Forecast
+Holt-Winters exponential smoothing (damped trend, weekly seasonality) fitted
+to every product x store daily demand series at once
+"""
+
+import numpy as np
+import pandas as pd
+
+
+FORECAST_COLUMNS = ['order_time', 'payment_status', 'product_id', 'store_id', 'qty']
+SEASON_LENGTH = 7
+
+# Baseline demand models accepted by PromoSimulator.simulate_promo
+BASELINE_MODELS = ('average', 'forecast')
+
+
+class DemandForecaster:
+    """
+    Additive Holt-Winters over a (day x series) matrix of paid qty.
+
+    Series are the product x store pairs with a paid sale in the last
+    history_days. The smoothing recurrences run once per day over a whole
+    row of the matrix, so every series is updated by the same handful of
+    vector operations; series are processed in blocks of block_size to
+    bound memory. Seasonal terms are indexed by weekday (season is
+    weekday x series).
+
+    Initial state: level = mean daily qty, trend = 0, season = weekday mean
+    minus overall mean over the history window.
+    """
+
+    def __init__(self, alpha=0.1, beta=0.01, gamma=0.05, phi=0.9,
+                 history_days=84, block_size=250_000):
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.phi = phi
+        self.history_days = history_days
+        self.block_size = block_size
+        self.keys = None
+        self.level = None
+        self.trend = None
+        self.season = None
+        self.last_day = None
+
+    def fit(self, sales):
+        """Fit every series of sales (FORECAST_COLUMNS); returns self"""
+        times = pd.to_datetime(sales['order_time'])
+        last_day = times.max().normalize()
+        start_day = last_day - pd.Timedelta(days=self.history_days - 1)
+        recent = (times >= start_day) & (sales['payment_status'] == 'Paid')
+        df = sales.loc[recent.to_numpy(), ['product_id', 'store_id', 'qty']]
+
+        # Series code per row: factorize each key column, then the pairs
+        product_codes, products = pd.factorize(df['product_id'], sort=True)
+        store_codes, stores = pd.factorize(df['store_id'], sort=True)
+        pair_keys = product_codes.astype(np.int64) * len(stores) + store_codes
+        days = (times[recent].to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+                - np.datetime64(start_day.date(), 'D')).astype(np.int64)
+        qty = df['qty'].to_numpy(dtype=np.float64)
+
+        # One sort groups rows by series and yields the sorted unique pairs
+        order = np.argsort(pair_keys, kind='stable')
+        pair_keys, days, qty = pair_keys[order], days[order], qty[order]
+        starts = np.empty(len(pair_keys), dtype=bool)
+        starts[:1] = True
+        np.not_equal(pair_keys[1:], pair_keys[:-1], out=starts[1:])
+        pairs = pair_keys[starts]
+        codes = np.cumsum(starts) - 1
+
+        n_series, n_days = len(pairs), self.history_days
+        weekdays = (start_day.dayofweek + np.arange(n_days)) % SEASON_LENGTH
+
+        self.keys = pd.DataFrame({'product_id': products[pairs // len(stores)],
+                                  'store_id': stores[pairs % len(stores)]})
+        self.level = np.empty(n_series)
+        self.trend = np.empty(n_series)
+        self.season = np.empty((SEASON_LENGTH, n_series))
+        self.last_day = last_day
+
+        for lo in range(0, n_series, self.block_size):
+            hi = min(lo + self.block_size, n_series)
+            a, b = np.searchsorted(codes, [lo, hi])
+            # Day-major (day x series) so each time step reads one contiguous row
+            demand = np.bincount(days[a:b] * (hi - lo) + codes[a:b] - lo, weights=qty[a:b],
+                                 minlength=n_days * (hi - lo)).reshape(n_days, hi - lo)
+            self.level[lo:hi], self.trend[lo:hi], self.season[:, lo:hi] = self._smooth(demand, weekdays)
+        return self
+
+    def _smooth(self, demand, weekdays):
+        """Run the Holt-Winters recurrences over the day axis of a (day x series) block"""
+        level = demand.mean(axis=0)
+        trend = np.zeros_like(level)
+        season = np.zeros((SEASON_LENGTH, len(level)))
+        for wd in range(SEASON_LENGTH):
+            rows = weekdays == wd
+            if rows.any():
+                season[wd] = demand[rows].mean(axis=0) - level
+
+        a, b, g, phi = self.alpha, self.beta, self.gamma, self.phi
+        previous = np.empty_like(level)
+        for t, wd in enumerate(weekdays):
+            y = demand[t]
+            previous[:] = level
+            level = a * (y - season[wd]) + (1 - a) * (previous + phi * trend)
+            trend *= (1 - b) * phi
+            trend += b * (level - previous)
+            season[wd] *= 1 - g
+            season[wd] += g * (y - level)
+        return level, trend, season
+
+    def forecast(self, horizon):
+        """(series x horizon) daily demand for the days after the history, floored at 0"""
+        steps = np.arange(1, horizon + 1)
+        if self.phi == 1:
+            damped = steps.astype(np.float64)
+        else:
+            damped = self.phi * (1 - self.phi ** steps) / (1 - self.phi)
+        weekdays = (self.last_day.dayofweek + steps) % SEASON_LENGTH
+        demand = self.level + damped[:, None] * self.trend + self.season[weekdays]
+        return np.maximum(demand, 0).T
+
+    def baseline(self, horizon):
+        """product_id, store_id, daily_demand averaged over the next horizon days"""
+        baseline = self.keys.copy()
+        baseline['daily_demand'] = self.forecast(horizon).mean(axis=1) if horizon > 0 else 0.0
+        return baseline
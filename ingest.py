@@ -0,0 +1,316 @@
+"""
+UAE Promo Pulse - Ingestion
+Typed CSV readers for every known table. Files are parsed by pyarrow's
+multi-threaded CSV reader (pandas C parser when pyarrow is not installed)
+and several tables can be loaded concurrently. gzip, zstd and zip inputs
+are decompressed as a stream while parsing.
+"""
+
+import contextlib
+import gzip
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow is optional
+    pa = None
+    pa_csv = None
+
+try:
+    import zstandard
+except ImportError:  # optional; pyarrow's zstd codec is used instead
+    zstandard = None
+
+
+# Column kinds:
+#   str       text, read as-is (dirty columns such as raw order_time stay strings)
+#   float     float64
+#   int       int64 (float64 when the column has missing values, like pandas)
+#   datetime  ISO-8601 timestamps, parsed after reading
+SCHEMAS = {
+    'products': {
+        'product_id': 'str', 'category': 'str', 'brand': 'str', 'base_price_aed': 'float',
+        'unit_cost_aed': 'float', 'tax_rate': 'float', 'launch_flag': 'str',
+    },
+    'stores': {
+        'store_id': 'str', 'city': 'str', 'channel': 'str', 'fulfillment_type': 'str',
+    },
+    'sales_raw': {
+        'order_id': 'str', 'order_time': 'str', 'product_id': 'str', 'store_id': 'str',
+        'qty': 'int', 'selling_price_aed': 'float', 'discount_pct': 'float',
+        'payment_status': 'str', 'return_flag': 'str',
+    },
+    'sales_clean': {
+        'order_id': 'str', 'order_time': 'datetime', 'product_id': 'str', 'store_id': 'str',
+        'qty': 'int', 'selling_price_aed': 'float', 'discount_pct': 'float',
+        'payment_status': 'str', 'return_flag': 'str',
+    },
+    'inventory': {
+        'snapshot_date': 'str', 'product_id': 'str', 'store_id': 'str',
+        'stock_on_hand': 'int', 'reorder_point': 'int', 'lead_time_days': 'int',
+    },
+    'issues': {
+        'record_identifier': 'str', 'issue_type': 'str', 'issue_detail': 'str', 'action_taken': 'str',
+    },
+    'campaign_plan': {
+        'campaign_id': 'str', 'start_date': 'datetime', 'end_date': 'datetime', 'city': 'str',
+        'channel': 'str', 'category': 'str', 'discount_pct': 'float', 'promo_budget_aed': 'float',
+    },
+}
+
+# pandas' default missing-value markers, so both parsers agree on what is NaN
+NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+]
+
+# Default file names of the raw and cleaned tables
+RAW_FILES = {
+    'products': ('products.csv', 'products'),
+    'stores': ('stores.csv', 'stores'),
+    'sales': ('sales_raw.csv', 'sales_raw'),
+    'inventory': ('inventory_snapshot.csv', 'inventory'),
+}
+CLEAN_FILES = {
+    'products': ('products_clean.csv', 'products'),
+    'stores': ('stores_clean.csv', 'stores'),
+    'sales': ('sales_clean.csv', 'sales_clean'),
+    'inventory': ('inventory_clean.csv', 'inventory'),
+}
+
+
+# Compression: file suffix and leading magic bytes
+COMPRESSIONS = {
+    'gzip': ('.gz', b'\x1f\x8b'),
+    'zstd': ('.zst', b'\x28\xb5\x2f\xfd'),
+    'zip': ('.zip', b'PK\x03\x04'),
+}
+
+
+def _rewind(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+
+def detect_compression(source):
+    """'gzip', 'zstd', 'zip' or None, from the file suffix or the first bytes"""
+    if isinstance(source, (str, os.PathLike)):
+        name = os.fspath(source).lower()
+        for method, (suffix, _) in COMPRESSIONS.items():
+            if name.endswith(suffix) or (method == 'zstd' and name.endswith('.zstd')):
+                return method
+        return None
+    _rewind(source)
+    head = source.read(4)
+    _rewind(source)
+    for method, (_, magic) in COMPRESSIONS.items():
+        if head.startswith(magic):
+            return method
+    return None
+
+
+class _KeepOpen(io.RawIOBase):
+    """Read-only view of a caller's binary file; closing the view leaves the file open"""
+
+    def __init__(self, fileobj):
+        super().__init__()
+        self._fileobj = fileobj
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._fileobj.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _zstd_reader(fileobj):
+    if zstandard is not None:
+        return zstandard.ZstdDecompressor().stream_reader(fileobj)
+    if pa is not None:
+        return pa.CompressedInputStream(pa.PythonFile(fileobj, mode='r'), 'zstd')
+    raise ValueError("Reading .zst files needs the zstandard or pyarrow package")
+
+
+def _zstd_writer(fileobj):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor().stream_writer(fileobj)
+    if pa is not None:
+        return pa.CompressedOutputStream(pa.PythonFile(fileobj, mode='w'), 'zstd')
+    raise ValueError("Writing .zst files needs the zstandard or pyarrow package")
+
+
+@contextlib.contextmanager
+def open_input(source):
+    """
+    Binary stream over a path or file-like, decompressing gzip / zstd / zip
+    on the fly (a zip must hold one CSV). Only handles opened here are closed.
+    """
+    method = detect_compression(source)
+    with contextlib.ExitStack() as stack:
+        if isinstance(source, (str, os.PathLike)):
+            raw = stack.enter_context(open(source, 'rb'))
+        else:
+            raw = source
+            _rewind(raw)
+        if method == 'gzip':
+            stream = stack.enter_context(gzip.GzipFile(fileobj=raw, mode='rb'))
+        elif method == 'zstd':
+            if raw is source:
+                # The zstd readers close what they wrap; keep the caller's object open
+                raw = _KeepOpen(raw)
+            stream = stack.enter_context(contextlib.closing(_zstd_reader(raw)))
+        elif method == 'zip':
+            archive = stack.enter_context(zipfile.ZipFile(raw))
+            members = [m for m in archive.namelist() if not m.endswith('/')]
+            if len(members) != 1:
+                raise ValueError(f"Expected one file in zip archive, found {len(members)}")
+            stream = stack.enter_context(archive.open(members[0]))
+        else:
+            stream = raw
+        yield stream
+
+
+def compressed_path(path, compression=None):
+    """Add the suffix for compression ('gzip', 'zstd', 'zip' or None) to path"""
+    return path if compression is None else path + COMPRESSIONS[compression][0]
+
+
+@contextlib.contextmanager
+def open_output(path, compression=None):
+    """Text handle for writing CSV to path, compressed as it is written"""
+    with contextlib.ExitStack() as stack:
+        if compression is None:
+            yield stack.enter_context(open(path, 'w', newline='', encoding='utf-8'))
+            return
+        raw = stack.enter_context(open(path, 'wb'))
+        if compression == 'gzip':
+            binary = stack.enter_context(gzip.GzipFile(fileobj=raw, mode='wb'))
+        elif compression == 'zstd':
+            binary = stack.enter_context(contextlib.closing(_zstd_writer(raw)))
+        elif compression == 'zip':
+            archive = stack.enter_context(zipfile.ZipFile(raw, 'w', zipfile.ZIP_DEFLATED))
+            member = os.path.basename(path)[:-len(COMPRESSIONS['zip'][0])]
+            binary = stack.enter_context(archive.open(member, 'w', force_zip64=True))
+        else:
+            raise ValueError(f"Unknown compression: {compression}")
+        text = io.TextIOWrapper(binary, encoding='utf-8', newline='')
+        try:
+            yield text
+        finally:
+            text.flush()
+            text.detach()
+
+
+def find_input(path):
+    """path itself, or its .gz / .zst / .zip variant when only that exists"""
+    if os.path.exists(path):
+        return path
+    for suffix, _ in COMPRESSIONS.values():
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return path
+
+
+def _arrow_types(schema):
+    kinds = {'str': pa.string(), 'float': pa.float64(), 'int': pa.int64(), 'datetime': pa.string()}
+    return {col: kinds[kind] for col, kind in schema.items()}
+
+
+def _read_arrow(source, schema):
+    table = pa_csv.read_csv(
+        source,
+        read_options=pa_csv.ReadOptions(use_threads=True),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=_arrow_types(schema),
+            null_values=NA_VALUES,
+            strings_can_be_null=True,
+        ),
+    )
+    return table.to_pandas()
+
+
+def _read_pandas(source, schema, **kwargs):
+    dtype = {col: {'str': 'str', 'float': 'float64', 'datetime': 'str'}[kind]
+             for col, kind in schema.items() if kind != 'int'}
+    # round_trip parses floats exactly like pyarrow (pandas' default can be off by an ulp)
+    kwargs.setdefault('float_precision', 'round_trip')
+    return pd.read_csv(source, dtype=dtype, **kwargs)
+
+
+def _parse_datetimes(df, schema):
+    for col, kind in schema.items():
+        if kind == 'datetime' and col in df.columns:
+            df[col] = pd.to_datetime(df[col], format='ISO8601', errors='coerce')
+    return df
+
+
+def read_table(source, table=None, engine='auto', **kwargs):
+    """
+    Read one CSV (path or file-like) with the schema of a known table.
+
+    table   key of SCHEMAS; None reads with plain type inference
+    engine  'auto' (pyarrow when installed), 'pyarrow' or 'c'
+    kwargs  passed to pd.read_csv (forces the pandas parser)
+
+    Decompression is streamed, but the parsed table is returned whole; use
+    iter_table to bound memory by chunk.
+    """
+    schema = SCHEMAS[table] if table is not None else {}
+    use_arrow = engine == 'pyarrow' or (engine == 'auto' and pa_csv is not None and not kwargs)
+    if use_arrow:
+        try:
+            with open_input(source) as stream:
+                df = _read_arrow(stream, schema)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            if engine == 'pyarrow':
+                raise
+            # e.g. non-numeric text in a numeric column: let pandas infer it
+            with open_input(source) as stream:
+                df = _read_pandas(stream, schema)
+    else:
+        with open_input(source) as stream:
+            df = _read_pandas(stream, schema, **kwargs)
+    return _parse_datetimes(df, schema)
+
+
+def iter_table(source, table=None, chunksize=1_000_000):
+    """
+    Yield a (possibly compressed) CSV as typed DataFrames of chunksize rows.
+    Decompression is streamed, so neither the file nor its decoded text is
+    held in memory as a whole.
+    """
+    schema = SCHEMAS[table] if table is not None else {}
+    with open_input(source) as stream:
+        for chunk in _read_pandas(stream, schema, chunksize=chunksize):
+            yield _parse_datetimes(chunk, schema)
+
+
+def read_tables(sources, max_workers=None):
+    """
+    Read several tables concurrently.
+    sources maps name -> (path or file-like, table key); returns name -> DataFrame.
+    """
+    if not sources:
+        return {}
+    workers = max_workers or min(len(sources), os.cpu_count() or 4)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest') as pool:
+        futures = {name: pool.submit(read_table, source, table)
+                   for name, (source, table) in sources.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def table_paths(files, data_dir='.'):
+    """
+    Prefix the file names of RAW_FILES / CLEAN_FILES with data_dir, picking
+    up compressed copies (e.g. sales_raw.csv.gz) when the plain file is absent
+    """
+    return {name: (find_input(os.path.join(data_dir, filename)), table)
+            for name, (filename, table) in files.items()}
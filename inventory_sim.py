@@ -0,0 +1,166 @@
+"""
+UAE Promo Pulse - Inventory Simulation
+Day-by-day stock depletion and replenishment over a promo horizon, and
+inter-store transfer recommendations, computed for every product x store
+at once
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Reorders bring the inventory position up to this multiple of reorder_point
+ORDER_UP_TO_FACTOR = 2.0
+
+
+def simulate_replenishment(daily_demand, stock_on_hand, reorder_point, lead_time_days,
+                           days, unit_price=None, order_up_to_factor=ORDER_UP_TO_FACTOR):
+    """
+    (s, S) reorder-point simulation. Each day, for all series at once:
+      1. orders due today arrive
+      2. demand is served from stock; what cannot be served is lost
+      3. if stock + open orders <= reorder_point, an order up to
+         order_up_to_factor x reorder_point is placed, arriving
+         lead_time_days later
+    An order placed on day d with lead time L is available on day d + L
+    (the next day at the earliest).
+
+    daily_demand is one value per series (constant over the horizon) or a
+    (series x days) array. Missing reorder points / lead times disable
+    replenishment for that series. Returns a dict of per-series arrays:
+    stockout_day (1-based first day with lost sales, NaN if none),
+    lost_units, lost_revenue (when unit_price is given), ending_stock,
+    units_ordered and units_received.
+    """
+    on_hand = np.nan_to_num(np.asarray(stock_on_hand, dtype=np.float64)).clip(min=0)
+    n = len(on_hand)
+    demand = np.asarray(daily_demand, dtype=np.float64)
+    if demand.ndim == 1:
+        demand = np.broadcast_to(demand[:, None], (n, days))
+    demand = np.nan_to_num(demand).clip(min=0)
+
+    reorder = np.asarray(reorder_point, dtype=np.float64)
+    lead = np.asarray(lead_time_days, dtype=np.float64)
+    can_reorder = ~(np.isnan(reorder) | np.isnan(lead))
+    reorder = np.where(can_reorder, reorder, -np.inf)
+    lead = np.where(can_reorder, lead, 0).clip(min=0).astype(np.int64)
+    order_up_to = np.where(can_reorder, reorder * order_up_to_factor, 0)
+
+    # Arrivals by day; orders due after the horizon are dropped off the end
+    arrivals = np.zeros((days + 1, n))
+    on_order = np.zeros(n)
+    lost = np.zeros(n)
+    ordered = np.zeros(n)
+    received = np.zeros(n)
+    stockout_day = np.full(n, np.nan)
+    rows = np.arange(n)
+
+    for day in range(days):
+        due = arrivals[day]
+        on_hand += due
+        on_order -= due
+        received += due
+
+        want = demand[:, day]
+        short = want - on_hand
+        np.maximum(on_hand - want, 0, out=on_hand)
+        short_today = short > 1e-9
+        lost += np.where(short_today, short, 0)
+        stockout_day[short_today & np.isnan(stockout_day)] = day + 1
+
+        position = on_hand + on_order
+        place = (position <= reorder) & (order_up_to > position)
+        qty = np.where(place, order_up_to - position, 0)
+        on_order += qty
+        ordered += qty
+        arrive = day + np.maximum(lead, 1)
+        in_horizon = place & (arrive < days)
+        arrivals[arrive[in_horizon], rows[in_horizon]] += qty[in_horizon]
+
+    result = {
+        'stockout_day': stockout_day,
+        'lost_units': lost,
+        'ending_stock': on_hand,
+        'units_ordered': ordered,
+        'units_received': received,
+    }
+    if unit_price is not None:
+        result['lost_revenue'] = lost * np.nan_to_num(np.asarray(unit_price, dtype=np.float64))
+    return result
+
+
+def _group_intervals(group, amount, matched, base):
+    """
+    Lay each row's amount end to end within its group, starting at the
+    group's base offset and capped at the group's matched total. Rows must
+    be sorted by group. Returns interval end points (non-decreasing).
+    """
+    cumulative = np.cumsum(amount)
+    group_start = np.zeros_like(cumulative)
+    firsts = np.flatnonzero(np.diff(group, prepend=-1) != 0)
+    group_start[firsts] = cumulative[firsts] - amount[firsts]
+    group_start = np.maximum.accumulate(group_start)
+    return base[group] + np.minimum(cumulative - group_start, matched[group])
+
+
+def rebalance_transfers(positions, by='city'):
+    """
+    Greedy transfers from surplus to shortfall stores of the same product
+    within each pool (`by` is a column of positions, e.g. city or channel).
+
+    positions has product_id, store_id, the pool column and integer
+    surplus / shortfall units per row. Within every product x pool the
+    largest donors are matched to the largest shortfalls. Donor and
+    receiver units are laid out as consecutive intervals on one axis per
+    group, so every transfer is the overlap of a donor interval with a
+    receiver interval, found for all groups at once with sorts and
+    searchsorted instead of per-SKU loops.
+
+    Returns (transfers, summary): transfers has product_id, the pool
+    column, from_store, to_store and qty; summary has transfers,
+    units_moved, shortfall_before and residual_shortfall.
+    """
+    positions = positions[positions['product_id'].notna() & positions[by].notna()]
+    keys = positions[['product_id', by]]
+    group = keys.groupby(['product_id', by], observed=True, sort=False).ngroup().to_numpy()
+    n_groups = group.max() + 1 if len(group) else 0
+    surplus = positions['surplus'].to_numpy(dtype=np.int64).clip(min=0)
+    shortfall = positions['shortfall'].to_numpy(dtype=np.int64).clip(min=0)
+
+    supply = np.bincount(group, weights=surplus, minlength=n_groups).astype(np.int64)
+    demand = np.bincount(group, weights=shortfall, minlength=n_groups).astype(np.int64)
+    matched = np.minimum(supply, demand)
+    base = np.concatenate([[0], np.cumsum(matched)[:-1]]) if n_groups else matched
+
+    donors = np.flatnonzero((surplus > 0) & (matched[group] > 0))
+    donors = donors[np.lexsort((-surplus[donors], group[donors]))]
+    receivers = np.flatnonzero((shortfall > 0) & (matched[group] > 0))
+    receivers = receivers[np.lexsort((-shortfall[receivers], group[receivers]))]
+
+    donor_ends = _group_intervals(group[donors], surplus[donors], matched, base)
+    receiver_ends = _group_intervals(group[receivers], shortfall[receivers], matched, base)
+
+    # Groups' matched ranges tile the axis, so consecutive breakpoints bound
+    # segments that each lie in one donor and one receiver interval
+    points = np.sort(np.concatenate([base[matched > 0], donor_ends, receiver_ends]))
+    keep = points[1:] > points[:-1]
+    starts, ends = points[:-1][keep], points[1:][keep]
+    src = donors[np.searchsorted(donor_ends, starts, side='right')]
+    dst = receivers[np.searchsorted(receiver_ends, starts, side='right')]
+    qty = ends - starts
+
+    store_ids = positions['store_id'].to_numpy()
+    transfers = pd.DataFrame({
+        'product_id': keys['product_id'].to_numpy()[src],
+        by: keys[by].to_numpy()[src],
+        'from_store': store_ids[src],
+        'to_store': store_ids[dst],
+        'qty': qty,
+    })
+    summary = {
+        'transfers': len(transfers),
+        'units_moved': int(qty.sum()),
+        'shortfall_before': int(shortfall.sum()),
+        'residual_shortfall': int(shortfall.sum() - qty.sum()),
+    }
+    return transfers, summary
@@ -0,0 +1,284 @@
+"""
+UAE Promo Pulse - Issue Log
+Append-optimized, columnar store for data quality issues logged by the cleaner
+"""
+
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+
+ISSUE_TYPES = [
+    'INVALID_TIMESTAMP', 'OUTLIER_VALUE', 'MISSING_VALUE', 'INVALID_CITY',
+    'INVALID_CHANNEL', 'INVALID_CATEGORY', 'INVALID_VALUE', 'CONSTRAINT_VIOLATION',
+    'IMPOSSIBLE_VALUE', 'DUPLICATE_ID', 'INCONSISTENT_VALUE',
+]
+ACTIONS = ['DROPPED', 'IMPUTED', 'CAPPED', 'CORRECTED']
+
+COLUMNS = ['record_identifier', 'issue_type', 'issue_detail', 'action_taken']
+
+
+class IssueBatch:
+    """
+    Issues that share a table, issue type, action and detail template.
+    ids holds the record identifier of each issue (only the logged rows of
+    the key column); old/new values are kept as typed arrays and only
+    formatted into the detail template when the log is rendered.
+    """
+
+    __slots__ = ('table', 'type_code', 'action_code', 'template', 'ids', 'old', 'new', 'text')
+
+    def __init__(self, table, type_code, action_code, template, ids, old, new, text):
+        self.table = table
+        self.type_code = type_code
+        self.action_code = action_code
+        self.template = template
+        self.ids = ids
+        self.old = old
+        self.new = new
+        self.text = text
+
+    def __len__(self):
+        return len(self.ids)
+
+    def details(self):
+        """Render the detail string for every issue in the batch"""
+        if not any(field in self.template for field in ('{old', '{new', '{text')):
+            return np.full(len(self), self.template, dtype=object)
+        old = self._values(self.old)
+        new = self._values(self.new)
+        text = self._values(self.text)
+        return np.array([self.template.format(old=o, new=n, text=t)
+                         for o, n, t in zip(old, new, text)], dtype=object)
+
+    def _values(self, values):
+        if values is None:
+            return [None] * len(self)
+        if np.ndim(values) == 0:
+            return [values] * len(self)
+        return values
+
+    def take(self, idx):
+        """New batch holding only the issues at idx"""
+        def pick(values):
+            return values if values is None or np.ndim(values) == 0 else values[idx]
+        return IssueBatch(self.table, self.type_code, self.action_code, self.template,
+                          self.ids[idx], pick(self.old), pick(self.new), pick(self.text))
+
+    @staticmethod
+    def concat(first, second):
+        """Concatenate two batches of the same rule"""
+        def join(a, b):
+            if a is None or np.ndim(a) == 0:
+                return a
+            return np.concatenate([np.asarray(a, dtype=object), np.asarray(b, dtype=object)])
+        return IssueBatch(first.table, first.type_code, first.action_code, first.template,
+                          np.concatenate([first.ids, second.ids]), join(first.old, second.old),
+                          join(first.new, second.new), join(first.text, second.text))
+
+
+LOG_LEVELS = ('full', 'aggregate', 'sample')
+
+
+class IssueLog:
+    """
+    Columnar issue log. Issues are appended in bulk (one IssueBatch per
+    cleaning step / rule), counts per table and issue type are kept
+    incrementally, and issues.csv is rendered in chunks on write.
+
+    Logging levels (counts are exact in every level):
+        full       keep every issue (default)
+        aggregate  keep the first `exemplars` issues per rule
+        sample     keep a uniform reservoir sample of `exemplars` issues per rule
+    """
+
+    def __init__(self, level='full', exemplars=20, seed=None):
+        if level not in LOG_LEVELS:
+            raise ValueError(f"Unknown issue log level: {level} (use one of {LOG_LEVELS})")
+        self.level = level
+        self.exemplars = exemplars
+        self._rng = np.random.default_rng(seed)
+        self.batches = []
+        self.table_counts = {}
+        self.type_counts = {}
+        self.rule_counts = {}
+        self._rule_batches = {}   # rule key -> exemplar batch (aggregate / sample)
+        self._rule_keys = {}      # rule key -> reservoir sort keys (sample)
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def logged(self):
+        """Number of issue rows actually retained (== len(self) in full mode)"""
+        return sum(len(b) for b in self.batches)
+
+    def add(self, table, issue_type, action, ids, positions=None, detail='',
+            old=None, new=None, text=None, rule=None):
+        """
+        Log one issue per position.
+
+        ids       key column (array-like) the positions refer into; only
+                  ids[positions] is kept, never the whole column
+        positions row offsets into ids (None = every row of ids)
+        detail    template; may reference {old}, {new} and {text}
+        old/new   per-issue typed values (aligned with positions) or a scalar
+        text      per-issue raw text values (aligned with positions) or a scalar
+        rule      name used to aggregate counts and exemplars (default: detail)
+        """
+        ids = np.asarray(ids)
+        if positions is not None:
+            ids = ids[np.asarray(positions, dtype=np.int64)]
+        if len(ids) == 0:
+            return 0
+
+        batch = IssueBatch(
+            table, ISSUE_TYPES.index(issue_type), ACTIONS.index(action), detail,
+            ids.astype(object, copy=False), self._aligned(old), self._aligned(new), self._aligned(text)
+        )
+        n = len(batch)
+        key = (table, issue_type, action, detail if rule is None else rule)
+        self._length += n
+        self.table_counts[table] = self.table_counts.get(table, 0) + n
+        self.type_counts[issue_type] = self.type_counts.get(issue_type, 0) + n
+        self.rule_counts[key] = self.rule_counts.get(key, 0) + n
+
+        if self.level == 'full':
+            self.batches.append(batch)
+        elif self.level == 'aggregate':
+            self._keep_first(key, batch)
+        else:
+            self._keep_sample(key, batch)
+        return n
+
+    def _keep_first(self, key, batch):
+        kept = self._rule_batches.get(key)
+        room = self.exemplars - (len(kept) if kept is not None else 0)
+        if room <= 0:
+            return
+        head = batch.take(np.arange(min(room, len(batch))))
+        if kept is None:
+            self._rule_batches[key] = head
+            self.batches.append(head)
+        else:
+            merged = IssueBatch.concat(kept, head)
+            self.batches[self.batches.index(kept)] = merged
+            self._rule_batches[key] = merged
+
+    def _keep_sample(self, key, batch):
+        """
+        Reservoir sampling by random keys: every issue draws a uniform key and
+        the rule keeps the `exemplars` smallest, which is a uniform sample of
+        everything seen so far (and merges exactly across batches).
+        """
+        keys = self._rng.random(len(batch))
+        if len(batch) > self.exemplars:
+            # Sorted so exemplars stay in source order
+            top = np.sort(np.argpartition(keys, self.exemplars)[:self.exemplars])
+            keys, batch = keys[top], batch.take(top)
+        else:
+            batch = batch.take(np.arange(len(batch)))
+
+        kept = self._rule_batches.get(key)
+        if kept is not None:
+            keys = np.concatenate([self._rule_keys[key], keys])
+            batch = IssueBatch.concat(kept, batch)
+        if len(keys) > self.exemplars:
+            top = np.sort(np.argpartition(keys, self.exemplars)[:self.exemplars])
+            keys, batch = keys[top], batch.take(top)
+
+        if kept is None:
+            self.batches.append(batch)
+        else:
+            self.batches[self.batches.index(kept)] = batch
+        self._rule_batches[key] = batch
+        self._rule_keys[key] = keys
+
+    def log(self, table, record_identifier, issue_type, detail, action, rule=None):
+        """Log a single issue (convenience for scalar call sites)"""
+        return self.add(table, issue_type, action, [record_identifier], detail=detail, rule=rule)
+
+    @staticmethod
+    def _aligned(values):
+        if values is None or np.ndim(values) == 0:
+            return values
+        return np.asarray(values)
+
+    def count(self, table=None, issue_type=None):
+        """Issue count for a table and/or issue type (maintained incrementally)"""
+        if table is None and issue_type is None:
+            return self._length
+        if issue_type is None:
+            return self.table_counts.get(table, 0)
+        if table is None:
+            return self.type_counts.get(issue_type, 0)
+        return sum(n for (t, k, _, _), n in self.rule_counts.items()
+                   if t == table and k == issue_type)
+
+    def summary(self):
+        """Exact per-rule counts and how many exemplar rows were retained"""
+        rows = []
+        for (table, issue_type, action, rule), count in self.rule_counts.items():
+            kept = self._rule_batches.get((table, issue_type, action, rule))
+            rows.append({
+                'table': table,
+                'rule': rule,
+                'issue_type': issue_type,
+                'action_taken': action,
+                'issues': count,
+                'exemplars': count if self.level == 'full' else (len(kept) if kept is not None else 0),
+            })
+        return pd.DataFrame(rows, columns=['table', 'rule', 'issue_type', 'action_taken',
+                                           'issues', 'exemplars'])
+
+    def type_breakdown(self):
+        """Issue counts by type, most frequent first (like value_counts)"""
+        return dict(sorted(self.type_counts.items(), key=lambda kv: -kv[1]))
+
+    def codes(self):
+        """Per-issue (issue type code, action code) arrays as int8"""
+        types = np.concatenate([np.full(len(b), b.type_code, dtype=np.int8) for b in self.batches]) \
+            if self.batches else np.empty(0, dtype=np.int8)
+        actions = np.concatenate([np.full(len(b), b.action_code, dtype=np.int8) for b in self.batches]) \
+            if self.batches else np.empty(0, dtype=np.int8)
+        return types, actions
+
+    def iter_frames(self):
+        """Yield one rendered DataFrame per retained batch"""
+        for batch in self.batches:
+            yield pd.DataFrame({
+                'record_identifier': batch.ids,
+                'issue_type': ISSUE_TYPES[batch.type_code],
+                'issue_detail': batch.details(),
+                'action_taken': ACTIONS[batch.action_code],
+            }, columns=COLUMNS)
+
+    def to_frame(self):
+        """Render the full log as a DataFrame (issues.csv layout)"""
+        frames = list(self.iter_frames())
+        if not frames:
+            return pd.DataFrame(columns=COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def to_csv(self, path_or_buf, index=False):
+        """
+        Render and write the log batch by batch without materializing it whole.
+        Accepts a path or an open text handle (e.g. a compressed stream).
+        """
+        if isinstance(path_or_buf, (str, os.PathLike)):
+            with open(path_or_buf, 'w', newline='') as f:
+                self._write_csv(f)
+        else:
+            self._write_csv(path_or_buf)
+
+    def _write_csv(self, f):
+        if not self.batches:
+            # Same output as an empty issues DataFrame
+            f.write('\n')
+            return
+        csv.writer(f, lineterminator='\n').writerow(COLUMNS)
+        for frame in self.iter_frames():
+            frame.to_csv(f, header=False, index=False)
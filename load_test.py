@@ -0,0 +1,111 @@
+"""
+UAE Promo Pulse - Service Load Test
+Fires concurrent requests at a running sim_service and reports latency
+
+Usage:
+    python sim_service.py &
+    python load_test.py --requests 500 --concurrency 16
+"""
+
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+CITIES = ['All', 'Dubai', 'Abu Dhabi', 'Sharjah']
+CHANNELS = ['All', 'App', 'Web', 'Marketplace']
+CATEGORIES = ['All', 'Electronics', 'Fashion', 'Home & Kitchen', 'Grocery',
+              'Beauty', 'Sports', 'Books', 'Toys']
+
+_local = threading.local()
+
+
+def _connection(host, port):
+    """One keep-alive connection per client thread"""
+    if getattr(_local, 'conn', None) is None:
+        _local.conn = http.client.HTTPConnection(host, port, timeout=60)
+    return _local.conn
+
+
+def random_request(rng, mix):
+    """Pick an endpoint by weight and build a random payload for it"""
+    endpoint = rng.choices(list(mix), weights=list(mix.values()))[0]
+    payload = {
+        'city': rng.choice(CITIES),
+        'channel': rng.choice(CHANNELS),
+        'category': rng.choice(CATEGORIES),
+    }
+    if endpoint != '/kpis':
+        payload.update({
+            'discount_pct': rng.choice([5, 10, 15, 20, 25, 30, 35, 40]),
+            'promo_budget_aed': rng.choice([25000, 50000, 100000, 200000]),
+            'margin_floor_pct': rng.choice([5, 10, 15, 20]),
+            'simulation_days': rng.choice([7, 14]),
+        })
+    return endpoint, payload
+
+
+def call(host, port, endpoint, payload):
+    """POST one request; returns (endpoint, seconds, ok)"""
+    body = json.dumps(payload)
+    start_time = time.perf_counter()
+    try:
+        conn = _connection(host, port)
+        conn.request('POST', endpoint, body, {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        response.read()
+        ok = response.status == 200
+    except (OSError, http.client.HTTPException):
+        _local.conn = None
+        ok = False
+    return endpoint, time.perf_counter() - start_time, ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the local simulation service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    mix = {'/kpis': 0.4, '/simulate': 0.5, '/sweep': 0.1}
+    jobs = [random_request(rng, mix) for _ in range(args.requests)]
+
+    print(f"🚀 {args.requests} requests, concurrency {args.concurrency} → http://{args.host}:{args.port}")
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda job: call(args.host, args.port, *job), jobs))
+    elapsed = time.perf_counter() - start_time
+
+    print(f"\nCompleted in {elapsed:.2f}s ({len(results) / elapsed:.1f} req/s)")
+    print(f"{'endpoint':<12}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for endpoint in mix:
+        rows = [(s, ok) for e, s, ok in results if e == endpoint]
+        if not rows:
+            continue
+        ms = np.array([s for s, _ in rows]) * 1000
+        errors = sum(1 for _, ok in rows if not ok)
+        print(f"{endpoint:<12}{len(rows):>8}{errors:>8}"
+              f"{np.percentile(ms, 50):>10.1f}{np.percentile(ms, 99):>10.1f}")
+
+    # Server-side view (excludes network and queueing in the client)
+    conn = http.client.HTTPConnection(args.host, args.port, timeout=10)
+    conn.request('GET', '/stats')
+    server_stats = json.loads(conn.getresponse().read())
+    print("\nServer-side latency:")
+    for endpoint, stats in server_stats['latency'].items():
+        print(f"   • {endpoint}: p50 {stats['p50_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms "
+              f"({stats['requests']} requests)")
+
+
+if __name__ == "__main__":
+    main()
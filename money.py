@@ -0,0 +1,34 @@
+"""
+UAE Promo Pulse - Money
+Exact money arithmetic: amounts are rounded once to int64 fils (1/100 AED),
+summed as integers and converted back to AED only for display
+"""
+
+import numpy as np
+
+
+FILS_PER_AED = 100
+
+
+def to_fils(aed):
+    """AED amounts (scalar or array, NaN allowed) rounded to int64 fils; NaN counts as 0"""
+    fils = np.rint(np.asarray(aed, dtype=np.float64) * FILS_PER_AED)
+    return np.where(np.isnan(fils), 0, fils).astype(np.int64)
+
+
+def to_aed(fils):
+    """fils (int or int array) as AED float"""
+    return np.asarray(fils, dtype=np.int64) / FILS_PER_AED
+
+
+def line_fils(qty, unit_aed):
+    """
+    Per-row qty x unit price in fils. Each line is rounded to the fils once,
+    so sums of lines are exact and the same in any order or partitioning.
+    """
+    return to_fils(np.asarray(qty, dtype=np.float64) * np.asarray(unit_aed, dtype=np.float64))
+
+
+def sum_fils(fils):
+    """Exact total of fils as a Python int (safe to merge across chunks and processes)"""
+    return int(np.sum(fils, dtype=np.int64))
@@ -0,0 +1,141 @@
+"""
+UAE Promo Pulse - Rollups
+Grouping-set aggregates of paid sales (city x channel, category, brand, day,
+week and grand total) computed in one scan
+"""
+
+import numpy as np
+import pandas as pd
+
+from money import line_fils, to_aed
+
+
+ROLLUP_COLUMNS = ['order_time', 'payment_status', 'qty', 'selling_price_aed', 'unit_cost_aed',
+                  'city', 'channel', 'category', 'brand']
+
+# Grouping set name -> key columns ('day' / 'week' are derived from order_time;
+# weeks run Monday to Sunday and are keyed by their Monday)
+GROUPING_SETS = {
+    'city_channel': ['city', 'channel'],
+    'category': ['category'],
+    'brand': ['brand'],
+    'day': ['day'],
+    'week': ['week'],
+    'total': [],
+}
+
+# Additive measures kept per group; money in int64 fils
+MEASURES = ['revenue_fils', 'cogs_fils', 'margin_fils', 'qty', 'orders']
+
+
+def _time_keys(order_time):
+    """Day and Monday-of-week per row as datetime64[D] (NaT stays NaT)"""
+    day = pd.to_datetime(order_time).to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+    # 1970-01-01 was a Thursday, so day + 3 is a multiple of 7 on Mondays
+    weekday = (day.astype(np.int64) + 3) % 7
+    return day, day - weekday.astype('timedelta64[D]')
+
+
+def rollup_partials(sales, sets=GROUPING_SETS):
+    """
+    Summed MEASURES per grouping set for one chunk of enriched sales. Paid
+    rows are scanned once: line amounts are computed once, every key column
+    is factorized once, and each set sums every measure over the combined
+    key codes in one pass. Fils and integer qty are accumulated in int64
+    (np.add.at), so their sums are exact at any size. Rows with a missing key are left out of that set
+    (like groupby). Partials of different chunks merge with merge_rollups.
+    """
+    paid = sales[(sales['payment_status'] == 'Paid').to_numpy(dtype=bool)]
+    integer_qty = pd.api.types.is_integer_dtype(paid['qty'])
+    qty = (paid['qty'].to_numpy(dtype=np.int64) if integer_qty
+           else np.nan_to_num(paid['qty'].to_numpy(dtype=np.float64)))
+    costed = paid['unit_cost_aed'].notna().to_numpy()
+    revenue = line_fils(qty, paid['selling_price_aed'])
+    cogs = line_fils(qty, paid['unit_cost_aed'])
+    measures = {
+        'revenue_fils': revenue,
+        'cogs_fils': cogs,
+        # Rows without a unit cost have no margin (as in a NaN-skipping sum)
+        'margin_fils': np.where(costed, revenue - cogs, 0),
+        'qty': qty,
+        'orders': None,
+    }
+
+    keys = {}
+    needed = {col for columns in sets.values() for col in columns}
+    if needed & {'day', 'week'}:
+        keys['day'], keys['week'] = _time_keys(paid['order_time'])
+    for col in needed - {'day', 'week'}:
+        keys[col] = paid[col]
+    factorized = {col: pd.factorize(keys[col], sort=True) for col in needed}
+
+    partials = {}
+    for name, columns in sets.items():
+        group = np.zeros(len(paid), dtype=np.int64)
+        valid = np.ones(len(paid), dtype=bool)
+        size = 1
+        for col in columns:
+            codes, uniques = factorized[col]
+            group = group * len(uniques) + codes
+            valid &= codes >= 0
+            size *= len(uniques)
+        group = group[valid]
+
+        orders = np.bincount(group, minlength=size)
+        present = np.flatnonzero(orders)
+        frame = {}
+        if columns:
+            positions = np.unravel_index(present, [len(factorized[col][1]) for col in columns])
+            for col, pos in zip(columns, positions):
+                frame[col] = factorized[col][1][pos]
+        for measure, values in measures.items():
+            if values is None:
+                frame[measure] = orders[present]
+            elif values.dtype == np.int64:
+                # bincount weights add in float64; accumulate integers exactly
+                sums = np.zeros(size, dtype=np.int64)
+                np.add.at(sums, group, values[valid])
+                frame[measure] = sums[present]
+            else:
+                frame[measure] = np.bincount(group, weights=values[valid], minlength=size)[present]
+        partials[name] = pd.DataFrame(frame, columns=columns + MEASURES)
+    return partials
+
+
+def merge_rollups(left, right):
+    """Combine the partials of two chunks (exact: every measure is a sum)"""
+    if left is None:
+        return right
+    merged = {}
+    for name, frame in left.items():
+        columns = [col for col in frame.columns if col not in MEASURES]
+        both = pd.concat([frame, right[name]], ignore_index=True)
+        if columns:
+            merged[name] = both.groupby(columns, sort=True, observed=True).sum().reset_index()
+        else:
+            merged[name] = both.sum().to_frame().T.astype(both.dtypes.to_dict())
+    return merged
+
+
+def finalize_rollups(partials):
+    """AED revenue / cogs / margin, qty, orders and margin_pct per grouping set"""
+    result = {}
+    for name, frame in partials.items():
+        columns = [col for col in frame.columns if col not in MEASURES]
+        out = frame[columns].copy()
+        for col in columns:
+            if col in ('day', 'week'):
+                out[col] = pd.to_datetime(out[col])
+            elif isinstance(out[col].dtype, pd.CategoricalDtype):
+                # Store-backed keys are categorical; report plain values like in-memory sales
+                out[col] = out[col].astype(out[col].cat.categories.dtype)
+        out['revenue'] = to_aed(frame['revenue_fils'].to_numpy())
+        out['cogs'] = to_aed(frame['cogs_fils'].to_numpy())
+        out['margin'] = to_aed(frame['margin_fils'].to_numpy())
+        out['qty'] = frame['qty'].to_numpy()
+        out['orders'] = frame['orders'].to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            margin_pct = frame['margin_fils'].to_numpy() / frame['revenue_fils'].to_numpy() * 100
+        out['margin_pct'] = np.where(np.isfinite(margin_pct), margin_pct, 0)
+        result[name] = out
+    return result
@@ -0,0 +1,143 @@
+"""
+UAE Promo Pulse - Sampling
+Stratified sample of the sales history (city x channel x category x month)
+and KPI estimates with confidence intervals computed from it
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from money import line_fils, to_aed
+
+
+SAMPLE_COLUMNS = ['order_time', 'payment_status', 'qty', 'selling_price_aed', 'unit_cost_aed',
+                  'discount_pct', 'return_flag', 'city', 'channel', 'category', 'brand']
+STRATUM_KEYS = ['city', 'channel', 'category', 'month']
+
+# Rows kept per stratum: max(MIN_STRATUM_ROWS, SAMPLE_FRACTION x stratum rows)
+SAMPLE_FRACTION = 0.02
+MIN_STRATUM_ROWS = 30
+SAMPLE_SEED = 42
+
+# Approximate KPI -> (numerator, denominator, scale); totals have no denominator
+APPROX_KPIS = {
+    'gross_revenue': ('gross_revenue', None, 1),
+    'refund_amount': ('refund_amount', None, 1),
+    'net_revenue': ('net_revenue', None, 1),
+    'cogs': ('cogs', None, 1),
+    'gross_margin_aed': ('gross_margin_aed', None, 1),
+    'gross_margin_pct': ('gross_margin_aed', 'net_revenue', 100),
+    'avg_discount_pct': ('discount_sum', 'discount_count', 1),
+    'return_rate_pct': ('returns', 'rows', 100),
+    'payment_failure_rate_pct': ('failed', 'rows', 100),
+    'total_transactions': ('rows', None, 1),
+}
+
+
+def stratified_sample(sales, fraction=SAMPLE_FRACTION, min_rows=MIN_STRATUM_ROWS, rng=None):
+    """
+    Simple random sample without replacement within every city x channel x
+    category x month stratum of one chunk of enriched sales (missing keys
+    form their own strata). A stratum keeps max(min_rows, fraction x its
+    rows), or all of its rows if it is smaller. Sampled rows carry their
+    stratum code and stratum_rows, the stratum's row count in the chunk.
+    Samples of different chunks combine with merge_samples.
+    """
+    rng = np.random.default_rng(SAMPLE_SEED) if rng is None else rng
+    keys = sales[STRATUM_KEYS[:-1]].copy()
+    keys['month'] = (pd.to_datetime(sales['order_time']).to_numpy(dtype='datetime64[ns]')
+                     .astype('datetime64[M]').astype('datetime64[ns]'))
+    strata = keys.groupby(STRATUM_KEYS, dropna=False, observed=True, sort=False).ngroup().to_numpy()
+
+    population = np.bincount(strata)
+    size = np.minimum(population, np.maximum(min_rows, np.ceil(population * fraction).astype(np.int64)))
+    # Random order within each stratum; its first `size` rows are the sample
+    order = np.lexsort((rng.random(len(strata)), strata))
+    starts = np.concatenate([[0], np.cumsum(population)[:-1]])
+    rank = np.arange(len(order)) - starts[strata[order]]
+    rows = np.sort(order[rank < size[strata[order]]])
+
+    sample = sales.iloc[rows][SAMPLE_COLUMNS].reset_index(drop=True)
+    sample['stratum'] = strata[rows]
+    sample['stratum_rows'] = population[strata[rows]]
+    return sample
+
+
+def merge_samples(left, right):
+    """Stack the samples of two chunks, keeping their strata apart"""
+    if left is None:
+        return right
+    right = right.assign(stratum=right['stratum'] + (left['stratum'].max() + 1 if len(left) else 0))
+    return pd.concat([left, right], ignore_index=True)
+
+
+def _kpi_values(sample, mask):
+    """Per sampled row contribution to every KPI numerator / denominator (0 outside mask)"""
+    status = sample['payment_status'].to_numpy(dtype=object)
+    paid = status == 'Paid'
+    refunded = status == 'Refunded'
+    revenue = to_aed(line_fils(sample['qty'], sample['selling_price_aed']))
+    cogs = to_aed(line_fils(sample['qty'], sample['unit_cost_aed']))
+    discount = sample['discount_pct'].to_numpy(dtype=np.float64)
+    values = {
+        'gross_revenue': np.where(paid, revenue, 0),
+        'refund_amount': np.where(refunded, revenue, 0),
+        'cogs': np.where(paid, cogs, 0),
+        'discount_sum': np.nan_to_num(discount),
+        'discount_count': ~np.isnan(discount),
+        'returns': (sample['return_flag'] == 'Y').to_numpy(dtype=bool),
+        'failed': status == 'Failed',
+        'rows': np.ones(len(sample)),
+    }
+    values['net_revenue'] = values['gross_revenue'] - values['refund_amount']
+    values['gross_margin_aed'] = values['net_revenue'] - values['cogs']
+    return {name: np.where(mask, value, 0).astype(np.float64) for name, value in values.items()}
+
+
+def _stratified_total(values, strata, population, size):
+    """Stratified estimate of a population total and its variance (with finite population correction)"""
+    means = np.bincount(strata, weights=values, minlength=len(size)) / size
+    squares = np.bincount(strata, weights=(values - means[strata]) ** 2, minlength=len(size))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = np.where(size > 1, squares / (size - 1), 0)
+    total = np.sum(population * means)
+    return total, np.sum(population ** 2 * (1 - size / population) * variance / size)
+
+
+def estimate_kpis(sample, mask=None, confidence=0.95):
+    """
+    Estimate compute_kpis() for the sales matching mask (a boolean array over
+    the sample rows) from a stratified sample. Money totals are stratified
+    expansion estimates; percentages are ratios of two totals with
+    linearized (Taylor) variances. Returns (kpis, intervals): kpis has the
+    compute_kpis keys, intervals maps each to its (low, high) bounds at the
+    given confidence level.
+    """
+    mask = np.ones(len(sample), dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+    strata, _ = pd.factorize(sample['stratum'])
+    size = np.bincount(strata).astype(np.float64)
+    population = np.zeros(len(size))
+    population[strata] = sample['stratum_rows'].to_numpy(dtype=np.float64)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+    values = _kpi_values(sample, mask)
+    totals = {name: _stratified_total(value, strata, population, size)[0] for name, value in values.items()}
+
+    kpis, intervals = {}, {}
+    for kpi, (numerator, denominator, scale) in APPROX_KPIS.items():
+        if denominator is None:
+            estimate, variance = _stratified_total(values[numerator], strata, population, size)
+        elif totals[denominator] > 0:
+            estimate = totals[numerator] / totals[denominator]
+            residual = values[numerator] - estimate * values[denominator]
+            variance = _stratified_total(residual, strata, population, size)[1] / totals[denominator] ** 2
+        else:
+            # Same fallbacks as compute_kpis on an empty selection
+            estimate = np.nan if kpi == 'avg_discount_pct' else 0.0
+            variance = 0.0
+        half_width = z * np.sqrt(variance) * scale
+        kpis[kpi] = float(estimate * scale)
+        intervals[kpi] = (float(kpis[kpi] - half_width), float(kpis[kpi] + half_width))
+    return kpis, intervals
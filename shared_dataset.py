@@ -0,0 +1,136 @@
+"""
+UAE Promo Pulse - Shared Dataset
+Publishes the simulator's enriched, code-encoded tables once as memory-mapped
+column files so worker processes can attach without re-reading or copying
+"""
+
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from simulator import PromoSimulator
+
+
+MANIFEST_FILE = 'manifest.json'
+SHM_ROOT = '/dev/shm'
+
+# order_id is unique per row and never used by simulation, so it is not shared
+SALES_EXCLUDE = ('order_id',)
+LOOKUP_TABLES = ('products', 'stores')
+
+
+def _code_dtype(n_categories):
+    """Smallest signed integer dtype that can hold the category codes (and -1)"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _write_frame(df, path, table):
+    """Write each column of df as <table>.<column>.npy; returns the column specs"""
+    specs = []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            values = series.to_numpy(dtype='datetime64[ns]').view(np.int64)
+            spec = {'name': col, 'kind': 'datetime'}
+        elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            values = series.to_numpy()
+            spec = {'name': col, 'kind': 'numeric'}
+        else:
+            cat = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+            categories = cat.cat.categories
+            values = cat.cat.codes.to_numpy().astype(_code_dtype(len(categories)), copy=False)
+            spec = {'name': col, 'kind': 'category', 'categories': categories.tolist()}
+        spec['file'] = f"{table}.{len(specs)}.npy"
+        np.save(os.path.join(path, spec['file']), np.ascontiguousarray(values), allow_pickle=False)
+        specs.append(spec)
+    return specs
+
+
+def _read_frame(path, specs, materialize=False):
+    """
+    Attach column files as read-only memory maps and wrap them without copying.
+    materialize=True decodes categories to plain values (for small lookup tables).
+    """
+    columns = {}
+    for spec in specs:
+        values = np.load(os.path.join(path, spec['file']), mmap_mode='r')
+        if spec['kind'] == 'datetime':
+            columns[spec['name']] = values.view('datetime64[ns]')
+        elif spec['kind'] == 'category':
+            dtype = pd.CategoricalDtype(spec['categories'])
+            columns[spec['name']] = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+            if materialize:
+                columns[spec['name']] = np.asarray(columns[spec['name']], dtype=object)
+        else:
+            columns[spec['name']] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+def publish_dataset(sim, path=None):
+    """
+    Write a PromoSimulator's tables to a memory-mappable directory.
+    Defaults to a fresh directory under /dev/shm (RAM-backed) when available.
+    Returns the directory path to hand to attach_dataset().
+    """
+    if path is None:
+        root = SHM_ROOT if os.path.isdir(SHM_ROOT) else None
+        path = tempfile.mkdtemp(prefix='promo_pulse_', dir=root)
+    else:
+        os.makedirs(path, exist_ok=True)
+
+    sales = sim.sales_enriched.drop(columns=[c for c in SALES_EXCLUDE if c in sim.sales_enriched.columns])
+    manifest = {
+        'rows': len(sales),
+        'tables': {
+            'sales': _write_frame(sales, path, 'sales'),
+            'products': _write_frame(sim.products, path, 'products'),
+            'stores': _write_frame(sim.stores, path, 'stores'),
+            'latest_inventory': _write_frame(sim.get_latest_inventory(), path, 'latest_inventory'),
+        },
+    }
+    # Manifest last: its presence marks the dataset as complete
+    with open(os.path.join(path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f)
+    return path
+
+
+def attach_dataset(path):
+    """Map a published dataset and return a PromoSimulator backed by it"""
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    # Products and stores are small lookup tables: decode them so the
+    # simulator's maps and merges see plain values
+    tables = {name: _read_frame(path, specs, materialize=name in LOOKUP_TABLES)
+              for name, specs in manifest['tables'].items()}
+    return PromoSimulator.from_enriched(
+        tables['products'], tables['stores'], tables['sales'],
+        tables['latest_inventory'], latest_inventory=tables['latest_inventory']
+    )
+
+
+def release_dataset(path):
+    """Delete a published dataset directory (attached maps stay valid until closed)"""
+    shutil.rmtree(path, ignore_errors=True)
+
+
+class SharedDataset:
+    """Context manager that publishes a dataset on enter and removes it on exit"""
+
+    def __init__(self, sim, path=None):
+        self.sim = sim
+        self.path = path
+
+    def __enter__(self):
+        self.path = publish_dataset(self.sim, self.path)
+        return self.path
+
+    def __exit__(self, *exc):
+        release_dataset(self.path)
+        return False
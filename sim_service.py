@@ -0,0 +1,328 @@
+"""
+UAE Promo Pulse - Simulation Service
+Local HTTP/JSON API over a warm, in-process PromoSimulator
+
+Usage:
+    python sim_service.py --data-dir . --port 8765 --workers 8
+
+Endpoints:
+    GET  /health     liveness + dataset size
+    GET  /stats      request counts and p50/p99 latency per endpoint
+    POST /kpis       {"city", "channel", "category", "start_date", "end_date"}
+    POST /simulate   simulate_promo parameters (+ "include_rows": true for per-row output)
+    POST /sweep      simulate_promo parameters + "discount_levels": [10, 15, ...]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import numpy as np
+import pandas as pd
+
+from batch_runner import SCENARIO_DEFAULTS, load_simulator
+from elasticity import UPLIFT_MODELS
+from forecast import BASELINE_MODELS
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+DEFAULT_DISCOUNT_LEVELS = [10, 15, 20, 25, 30, 35]
+
+
+class ServiceError(Exception):
+    """Client error mapped to an HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LatencyTracker:
+    """Rolling per-endpoint latency window with p50/p99 reporting"""
+
+    def __init__(self, window=10000):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(int)
+        self._errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok=True):
+        with self._lock:
+            self._samples[endpoint].append(seconds)
+            self._counts[endpoint] += 1
+            if not ok:
+                self._errors[endpoint] += 1
+
+    def snapshot(self):
+        with self._lock:
+            report = {}
+            for endpoint, samples in self._samples.items():
+                ms = np.asarray(samples) * 1000
+                report[endpoint] = {
+                    'requests': self._counts[endpoint],
+                    'errors': self._errors[endpoint],
+                    'p50_ms': float(np.percentile(ms, 50)),
+                    'p99_ms': float(np.percentile(ms, 99)),
+                    'max_ms': float(ms.max()),
+                }
+            return report
+
+
+def _json_default(value):
+    """Serialize numpy / pandas scalars returned by the simulator"""
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return str(value)
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+def _json_safe(value):
+    """Copy of value with NaN / inf floats (and NaT) as None, so the body is strict JSON"""
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, (float, np.floating)):
+        return float(value) if np.isfinite(value) else None
+    if value is pd.NaT or (isinstance(value, np.datetime64) and np.isnat(value)):
+        return None
+    return value
+
+
+def _number(value, name, kind=float):
+    """Convert a request parameter, turning bad input into a 400"""
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise ServiceError(HTTPStatus.BAD_REQUEST, f"{name} must be a number, got {value!r}")
+
+
+def _discount(value, name='discount_pct'):
+    discount = _number(value, name)
+    if not 0 <= discount <= 100:
+        raise ServiceError(HTTPStatus.BAD_REQUEST, f"{name} must be between 0 and 100")
+    return discount
+
+
+class SimulationService:
+    """Request handlers bound to one warm PromoSimulator"""
+
+    def __init__(self, simulator, workers=None):
+        self.sim = simulator
+        self.pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 4,
+                                       thread_name_prefix='sim-worker')
+        self.latency = LatencyTracker()
+        self.started_at = time.time()
+        self.routes = {
+            ('GET', '/health'): self.health,
+            ('GET', '/stats'): self.stats,
+            ('POST', '/kpis'): self.kpis,
+            ('POST', '/simulate'): self.simulate,
+            ('POST', '/sweep'): self.sweep,
+        }
+
+    def warm_up(self):
+        """Build lazy indexes and touch the hot paths once before serving"""
+        self.sim.get_latest_inventory()
+        self.sim.compute_kpis()
+        self.sim.simulate_promo(include_rows=False)
+
+    # ------------------------
+    # Handlers (run in worker threads)
+    # ------------------------
+    def health(self, _payload):
+        return {
+            'status': 'ok',
+            'uptime_s': time.time() - self.started_at,
+            'sales_rows': len(self.sim.sales_enriched),
+        }
+
+    def stats(self, _payload):
+        return {'latency': self.latency.snapshot(), 'stage_cache': self.sim.stage_cache_stats()}
+
+    def kpis(self, payload):
+        try:
+            start = pd.Timestamp(payload['start_date']) if payload.get('start_date') else None
+            # end_date is inclusive
+            end = (pd.Timestamp(payload['end_date']) + pd.Timedelta(days=1)
+                   if payload.get('end_date') else None)
+        except (TypeError, ValueError) as e:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, f"Invalid date: {e}")
+        kpis = self.sim.filtered_kpis(
+            **{col: payload.get(col) for col in ('city', 'channel', 'category', 'brand')},
+            start=start, end=end)
+        return {'kpis': kpis, 'rows': kpis['total_transactions']}
+
+    def _scenario_params(self, payload):
+        unknown = set(payload) - set(SCENARIO_DEFAULTS) - {'include_rows', 'discount_levels'}
+        if unknown:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, f"Unknown parameters: {sorted(unknown)}")
+        params = {k: payload.get(k, default) for k, default in SCENARIO_DEFAULTS.items()}
+        params['discount_pct'] = _discount(params['discount_pct'])
+        for name in ('promo_budget_aed', 'margin_floor_pct'):
+            params[name] = _number(params[name], name)
+        params['simulation_days'] = _number(params['simulation_days'], 'simulation_days', int)
+        if params['simulation_days'] < 1:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "simulation_days must be at least 1")
+        if params['uplift_model'] not in UPLIFT_MODELS:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, f"uplift_model must be one of {list(UPLIFT_MODELS)}")
+        if params['baseline_model'] not in BASELINE_MODELS:
+            raise ServiceError(HTTPStatus.BAD_REQUEST,
+                               f"baseline_model must be one of {list(BASELINE_MODELS)}")
+        return params
+
+    def simulate(self, payload):
+        params = self._scenario_params(payload)
+        simulated, violations, sim_kpis = self.sim.simulate_promo(
+            **params, include_rows=bool(payload.get('include_rows')))
+        response = {'params': params, 'kpis': sim_kpis, 'violations': violations}
+        if payload.get('include_rows'):
+            response['rows'] = simulated.to_dict('records')
+        return response
+
+    def sweep(self, payload):
+        params = self._scenario_params(payload)
+        levels = payload.get('discount_levels', DEFAULT_DISCOUNT_LEVELS)
+        if not isinstance(levels, list):
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "discount_levels must be a list")
+        levels = [_discount(level, 'discount_levels entries') for level in levels]
+        results = []
+        for disc in levels:
+            _, violations, sim_kpis = self.sim.simulate_promo(**{**params, 'discount_pct': disc},
+                                                              include_rows=False)
+            results.append({
+                'discount_pct': disc,
+                'kpis': sim_kpis,
+                'valid': not (violations['budget_exceeded'] or violations['margin_below_floor']),
+            })
+        return {'params': params, 'results': results}
+
+    # ------------------------
+    # Async HTTP front end
+    # ------------------------
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                        {'error': 'Request body too large'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, response = await self.dispatch(method, target.split('?')[0], body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._respond(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, path, body):
+        handler = self.routes.get((method, path))
+        if handler is None:
+            return HTTPStatus.NOT_FOUND, {'error': f"No route for {method} {path}"}
+
+        start_time = time.perf_counter()
+        ok = True
+        try:
+            payload = json.loads(body) if body else {}
+            if not isinstance(payload, dict):
+                raise ServiceError(HTTPStatus.BAD_REQUEST, "JSON body must be an object")
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.pool, handler, payload)
+            return HTTPStatus.OK, result
+        except json.JSONDecodeError as e:
+            ok = False
+            return HTTPStatus.BAD_REQUEST, {'error': f"Invalid JSON: {e}"}
+        except ServiceError as e:
+            ok = False
+            return e.status, {'error': str(e)}
+        except Exception as e:
+            ok = False
+            logger.exception("Request %s %s failed", method, path)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+        finally:
+            self.latency.record(path, time.perf_counter() - start_time, ok)
+
+    async def _respond(self, writer, status, payload, keep_alive=True):
+        body = json.dumps(_json_safe(payload), default=_json_default, allow_nan=False).encode('utf-8')
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+
+async def serve(service, host, port):
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    logger.info("Simulation service listening on http://%s:%d", host, port)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    async with server:
+        await stop.wait()
+
+    for endpoint, stats in service.latency.snapshot().items():
+        logger.info("%s: %d requests, p50 %.1f ms, p99 %.1f ms",
+                    endpoint, stats['requests'], stats['p50_ms'], stats['p99_ms'])
+    service.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve PromoSimulator over local HTTP/JSON")
+    parser.add_argument('--data-dir', default='.', help="Directory with the *_clean.csv files")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None, help="Worker threads (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    start_time = time.time()
+    service = SimulationService(load_simulator(args.data_dir), args.workers)
+    service.warm_up()
+    logger.info("Simulator warm in %.2fs", time.time() - start_time)
+
+    asyncio.run(serve(service, args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
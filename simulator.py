@@ -3,10 +3,131 @@ UAE Promo Pulse - Simulator
 Computes KPIs and runs what-if discount simulations
 """
 
+import copy
+import threading
+from collections import OrderedDict
+
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 
+from elasticity import FIT_COLUMNS, UPLIFT_MODELS, fit_elasticities
+from forecast import BASELINE_MODELS, FORECAST_COLUMNS, DemandForecaster
+from inventory_sim import rebalance_transfers, simulate_replenishment
+from ingest import CLEAN_FILES, read_tables, table_paths
+from money import FILS_PER_AED, line_fils, sum_fils, to_aed, to_fils
+from rollups import ROLLUP_COLUMNS, finalize_rollups, merge_rollups, rollup_partials
+from sampling import SAMPLE_COLUMNS, SAMPLE_SEED, estimate_kpis, merge_samples, stratified_sample
+from sketches import SKETCH_COLUMNS, SalesSketches
+
+# Columns each store-backed query reads (see PromoSimulator.from_store)
+KPI_COLUMNS = ['payment_status', 'qty', 'selling_price_aed', 'unit_cost_aed',
+               'discount_pct', 'return_flag']
+BASELINE_COLUMNS = ['order_time', 'payment_status', 'product_id', 'store_id', 'qty']
+# Latest-snapshot inventory fields used by the simulation
+INVENTORY_COLUMNS = ['stock_on_hand', 'reorder_point', 'lead_time_days']
+
+# Entries kept per simulate_promo stage (see StageCache)
+STAGE_CACHE_SIZES = {'baseline': 32, 'demand': 64, 'rows': 64, 'result': 256, 'rollups': 16}
+
+# Rule-based uplift multipliers (uplift_model='rules'); others get 1.0
+CHANNEL_UPLIFT = {'Marketplace': 1.3, 'App': 1.2, 'Web': 1.0}
+CATEGORY_UPLIFT = {'Electronics': 1.2, 'Fashion': 1.2, 'Beauty': 1.1, 'Sports': 1.1}
+
+
+def _gather(values, codes, fill=np.nan):
+    """values[codes] as float64, with fill where codes is -1 (a left-join miss)"""
+    return np.append(np.asarray(values, dtype=np.float64), fill)[codes]
+
+
+def _top_rows(values, n=10, mask=None):
+    """Positions of the n largest non-NaN values, ties in row order (like nlargest)"""
+    valid = ~np.isnan(values) if mask is None else mask & ~np.isnan(values)
+    rows = np.flatnonzero(valid)
+    if len(rows) > n:
+        threshold = np.partition(values[rows], len(rows) - n)[len(rows) - n]
+        rows = rows[values[rows] >= threshold]
+    return rows[np.argsort(-values[rows], kind='stable')][:n]
+
+
+def _sales_mask(df, filters, start=None, end=None):
+    """Rows of an enriched sales frame matching equality filters ('All' / None: any) and [start, end)"""
+    mask = np.ones(len(df), dtype=bool)
+    for col, value in filters.items():
+        if value and value != 'All':
+            mask &= (df[col] == value).to_numpy(dtype=bool)
+    if start is not None:
+        mask &= (df['order_time'] >= pd.Timestamp(start)).to_numpy(dtype=bool)
+    if end is not None:
+        mask &= (df['order_time'] < pd.Timestamp(end)).to_numpy(dtype=bool)
+    return mask
+
+
+def _records(columns, rows, names):
+    """to_dict('records') for the given positions of aligned columns"""
+    return [dict(zip(names, values))
+            for values in zip(*(columns[name][rows].tolist() for name in names))]
+
+
+class PromoRows:
+    """
+    Per-row simulate_promo output as aligned arrays, one per output column,
+    with the totals computed from them. The DataFrame is only built (once)
+    when a caller asks for per-row output.
+    """
+    
+    def __init__(self, columns, totals):
+        self.columns = columns
+        self.totals = totals
+        self._frame = None
+    
+    def __len__(self):
+        return len(self.columns['product_id'])
+    
+    def frame(self):
+        if self._frame is None:
+            self._frame = pd.DataFrame(self.columns, copy=False)
+        return self._frame
+
+
+class StageCache:
+    """Thread-safe LRU cache per named stage, each bounded to its own entry count"""
+    
+    def __init__(self, sizes=None):
+        self.sizes = dict(STAGE_CACHE_SIZES if sizes is None else sizes)
+        self._entries = {stage: OrderedDict() for stage in self.sizes}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get_or_compute(self, stage, key, compute):
+        """Cached value of stage for key, computing (outside the lock) on a miss"""
+        entries = self._entries[stage]
+        with self._lock:
+            if key in entries:
+                entries.move_to_end(key)
+                self.hits += 1
+                return entries[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            entries[key] = value
+            entries.move_to_end(key)
+            while len(entries) > self.sizes[stage]:
+                entries.popitem(last=False)
+        return value
+    
+    def clear(self):
+        with self._lock:
+            for entries in self._entries.values():
+                entries.clear()
+    
+    def stats(self):
+        with self._lock:
+            return {'entries': {stage: len(e) for stage, e in self._entries.items()},
+                    'hits': self.hits, 'misses': self.misses}
+
+
 class PromoSimulator:
     def __init__(self, products_df, stores_df, sales_df, inventory_df):
         """Initialize simulator with cleaned data"""
@@ -32,45 +153,192 @@ class PromoSimulator:
             on='store_id', 
             how='left'
         )
+        
+        # Lazily built lookup tables
+        self._latest_inventory = None
+        self._elasticity_model = None
+        self._forecaster = None
+        self._promo_lookups = None
+        self._kpi_sample = None
+        self._sales_sketches = None
+        self._stage_cache = StageCache()
+        self.sales_store = None
+    
+    @classmethod
+    def from_store(cls, products_df, stores_df, sales_store, inventory_df):
+        """
+        Build a simulator over an on-disk columnar_store.SalesStore. KPIs,
+        baselines, rollups and time series read only the partitions and
+        columns they need; sales_enriched is not materialized.
+        """
+        sim = cls.__new__(cls)
+        sim.products = products_df.copy()
+        sim.stores = stores_df.copy()
+        sim.inventory = inventory_df.copy()
+        sim.sales = None
+        sim.sales_enriched = None
+        sim.sales_store = sales_store
+        sim._latest_inventory = None
+        sim._elasticity_model = None
+        sim._forecaster = None
+        sim._promo_lookups = None
+        sim._kpi_sample = None
+        sim._sales_sketches = None
+        sim._stage_cache = StageCache()
+        return sim
+    
+    @classmethod
+    def from_enriched(cls, products_df, stores_df, sales_enriched, inventory_df,
+                      latest_inventory=None):
+        """
+        Build a simulator around an already-enriched sales frame without
+        copying or re-merging (used by shared_dataset workers)
+        """
+        sim = cls.__new__(cls)
+        sim.products = products_df
+        sim.stores = stores_df
+        sim.sales = sales_enriched
+        sim.inventory = inventory_df
+        sim.sales_enriched = sales_enriched
+        sim.sales_store = None
+        sim._latest_inventory = latest_inventory
+        sim._elasticity_model = None
+        sim._forecaster = None
+        sim._promo_lookups = None
+        sim._kpi_sample = None
+        sim._sales_sketches = None
+        sim._stage_cache = StageCache()
+        return sim
     
     def compute_kpis(self, df=None):
         """Compute all 12+ KPIs"""
+        if df is None and self.sales_store is not None:
+            # Aggregate month by month, touching only the KPI columns
+            partials = None
+            for part in self.sales_store.iter_partitions(KPI_COLUMNS):
+                partials = self._merge_kpi_partials(partials, self._kpi_partials(part))
+            return self._finalize_kpis(partials or self._kpi_partials(self.sales_store.scan(KPI_COLUMNS)))
+        
         if df is None:
             df = self.sales_enriched
         
+        return self._finalize_kpis(self._kpi_partials(df))
+    
+    def filtered_kpis(self, city=None, channel=None, category=None, brand=None, start=None, end=None):
+        """Exact compute_kpis() for the sales matching the filters (start / end bound order_time as [start, end))"""
+        filters = {'city': city, 'channel': channel, 'category': category, 'brand': brand}
+        if self.sales_store is not None:
+            partials = None
+            for part in self.sales_store.iter_partitions(KPI_COLUMNS, start=start, end=end, filters=filters):
+                partials = self._merge_kpi_partials(partials, self._kpi_partials(part))
+            return self._finalize_kpis(partials or self._kpi_partials(self.sales_store.scan(KPI_COLUMNS)[:0]))
+        
+        df = self.sales_enriched
+        mask = _sales_mask(df, filters, start, end)
+        return self._finalize_kpis(self._kpi_partials(df[mask] if not mask.all() else df))
+    
+    def kpi_sample(self):
+        """Stratified sample of the sales history behind approximate_kpis (built once)"""
+        if self._kpi_sample is None:
+            rng = np.random.default_rng(SAMPLE_SEED)
+            if self.sales_store is not None:
+                # Partitions are months, so every stratum is sampled whole from one partition
+                sample = None
+                for part in self.sales_store.iter_partitions(SAMPLE_COLUMNS):
+                    sample = merge_samples(sample, stratified_sample(part, rng=rng))
+                if sample is None:
+                    sample = stratified_sample(self.sales_store.scan(SAMPLE_COLUMNS), rng=rng)
+            else:
+                sample = stratified_sample(self.sales_enriched, rng=rng)
+            self._kpi_sample = sample
+        return self._kpi_sample
+    
+    def sales_sketches(self):
+        """
+        Distinct-count and quantile sketches per city x channel x category
+        (sketches.SalesSketches). A store-backed simulator uses the sketches
+        written at ingestion; otherwise they are built once from the sales.
+        """
+        if self._sales_sketches is None:
+            sketches = self.sales_store.sketches() if self.sales_store is not None else None
+            if sketches is None and self.sales_store is not None:
+                # Older stores: rebuild from the partitions (no order_id, so no distinct orders)
+                sketches = SalesSketches()
+                columns = [col for col in SKETCH_COLUMNS if col in self.sales_store.columns]
+                for part in self.sales_store.iter_partitions(columns):
+                    sketches.update(part)
+            elif sketches is None:
+                sketches = SalesSketches().update(self.sales_enriched)
+            self._sales_sketches = sketches
+        return self._sales_sketches
+    
+    def approximate_kpis(self, city=None, channel=None, category=None, brand=None, start=None, end=None,
+                         confidence=0.95):
+        """
+        KPIs for the filtered sales estimated from kpi_sample(), with
+        confidence intervals. Returns (kpis, intervals) as sampling.estimate_kpis;
+        filtered_kpis() gives the exact values.
+        """
+        sample = self.kpi_sample()
+        filters = {'city': city, 'channel': channel, 'category': category, 'brand': brand}
+        return estimate_kpis(sample, _sales_mask(sample, filters, start, end), confidence)
+    
+    @staticmethod
+    def _kpi_partials(df):
+        """
+        Additive sums and counts behind the KPIs (mergeable across partitions).
+        Money is summed as integer fils, so partials merge exactly in any order.
+        """
         # Filter to Paid transactions only for revenue
-        paid_df = df[df['payment_status'] == 'Paid'].copy()
-        
-        # 1. Gross Revenue (Paid only)
-        paid_df['revenue'] = paid_df['qty'] * paid_df['selling_price_aed']
-        gross_revenue = paid_df['revenue'].sum()
+        paid_df = df[df['payment_status'] == 'Paid']
         
         # 2. Refund Amount
         refund_df = df[df['payment_status'] == 'Refunded']
-        refund_df['refund_amt'] = refund_df['qty'] * refund_df['selling_price_aed']
-        refund_amount = refund_df['refund_amt'].sum()
         
-        # 3. Net Revenue
-        net_revenue = gross_revenue - refund_amount
+        return {
+            # 1. Gross Revenue (Paid only)
+            'gross_revenue_fils': sum_fils(line_fils(paid_df['qty'], paid_df['selling_price_aed'])),
+            'refund_amount_fils': sum_fils(line_fils(refund_df['qty'], refund_df['selling_price_aed'])),
+            # 4. COGS (Cost of Goods Sold)
+            'cogs_fils': sum_fils(line_fils(paid_df['qty'], paid_df['unit_cost_aed'])),
+            'discount_sum': df['discount_pct'].sum(),
+            'discount_count': df['discount_pct'].count(),
+            'returns': len(df[df['return_flag'] == 'Y']),
+            'failed': len(df[df['payment_status'] == 'Failed']),
+            'rows': len(df),
+        }
+    
+    @staticmethod
+    def _merge_kpi_partials(left, right):
+        if left is None:
+            return right
+        return {k: left[k] + right[k] for k in left}
+    
+    @staticmethod
+    def _finalize_kpis(p):
+        """Turn KPI partial sums into the KPI dictionary (money converted to AED here)"""
+        gross_revenue = to_aed(p['gross_revenue_fils'])
+        refund_amount = to_aed(p['refund_amount_fils'])
+        cogs = to_aed(p['cogs_fils'])
+        n = p['rows']
         
-        # 4. COGS (Cost of Goods Sold)
-        paid_df['cogs'] = paid_df['qty'] * paid_df['unit_cost_aed']
-        cogs = paid_df['cogs'].sum()
+        # 3. Net Revenue
+        net_revenue = to_aed(p['gross_revenue_fils'] - p['refund_amount_fils'])
         
         # 5. Gross Margin (AED)
-        gross_margin = net_revenue - cogs
+        gross_margin = to_aed(p['gross_revenue_fils'] - p['refund_amount_fils'] - p['cogs_fils'])
         
         # 6. Gross Margin %
         gross_margin_pct = (gross_margin / net_revenue * 100) if net_revenue > 0 else 0
         
         # 7. Average Discount %
-        avg_discount = df['discount_pct'].mean()
+        avg_discount = p['discount_sum'] / p['discount_count'] if p['discount_count'] > 0 else np.nan
         
         # 8. Return Rate %
-        return_rate = (len(df[df['return_flag'] == 'Y']) / len(df) * 100) if len(df) > 0 else 0
+        return_rate = (p['returns'] / n * 100) if n > 0 else 0
         
         # 9. Payment Failure Rate %
-        payment_failure_rate = (len(df[df['payment_status'] == 'Failed']) / len(df) * 100) if len(df) > 0 else 0
+        payment_failure_rate = (p['failed'] / n * 100) if n > 0 else 0
         
         kpis = {
             'gross_revenue': gross_revenue,
@@ -81,21 +349,33 @@ class PromoSimulator:
             'gross_margin_pct': gross_margin_pct,
             'avg_discount_pct': avg_discount,
             'return_rate_pct': return_rate,
-            'payment_failure_rate_pct': payment_failure_rate
+            'payment_failure_rate_pct': payment_failure_rate,
+            'total_transactions': n
         }
         
         return kpis
     
     def calculate_baseline_demand(self, city=None, channel=None, category=None):
         """Calculate baseline daily demand per product-store from last 30 days"""
-        # Filter sales to last 30 days
-        self.sales_enriched['order_time'] = pd.to_datetime(self.sales_enriched['order_time'])
-        max_date = self.sales_enriched['order_time'].max()
-        start_date = max_date - timedelta(days=30)
-        
-        recent_sales = self.sales_enriched[
-            (self.sales_enriched['order_time'] >= start_date) & 
-            (self.sales_enriched['payment_status'] == 'Paid')
+        # Filter sales to last 30 days (order_time is parsed once in __init__,
+        # so this method never mutates shared state and is safe across threads)
+        if self.sales_store is not None:
+            # Only the last month(s) of partitions and five columns are read
+            max_date = self.sales_store.max_time
+            start_date = max_date - timedelta(days=30)
+            filters = {'city': city, 'channel': channel, 'category': category}
+            sales = self.sales_store.scan(
+                BASELINE_COLUMNS + [col for col, value in filters.items() if value and value != 'All'],
+                start=start_date, filters=filters
+            )
+        else:
+            sales = self.sales_enriched
+            max_date = sales['order_time'].max()
+            start_date = max_date - timedelta(days=30)
+        
+        recent_sales = sales[
+            (sales['order_time'] >= start_date) & 
+            (sales['payment_status'] == 'Paid')
         ].copy()
         
         # Apply filters
@@ -107,7 +387,7 @@ class PromoSimulator:
             recent_sales = recent_sales[recent_sales['category'] == category]
         
         # Calculate daily demand per product-store
-        baseline = recent_sales.groupby(['product_id', 'store_id']).agg({
+        baseline = recent_sales.groupby(['product_id', 'store_id'], observed=True).agg({
             'qty': 'sum'
         }).reset_index()
         
@@ -117,15 +397,62 @@ class PromoSimulator:
         
         return baseline
     
-    def apply_uplift_logic(self, baseline_df, discount_pct, channel=None, category=None):
+    def demand_forecaster(self):
+        """Holt-Winters forecaster over every product-store series (fitted once)"""
+        if self._forecaster is None:
+            forecaster = DemandForecaster()
+            if self.sales_store is not None:
+                start_date = (self.sales_store.max_time.normalize()
+                              - timedelta(days=forecaster.history_days - 1))
+                sales = self.sales_store.scan(FORECAST_COLUMNS, start=start_date)
+            else:
+                sales = self.sales_enriched
+            self._forecaster = forecaster.fit(sales)
+        return self._forecaster
+    
+    def forecast_baseline_demand(self, city=None, channel=None, category=None, simulation_days=14):
+        """Baseline daily demand per product-store, averaged over the forecast promo horizon"""
+        baseline = self.demand_forecaster().baseline(simulation_days)
+        
+        # Filters are product / store attributes, so they select whole series
+        mask = np.ones(len(baseline), dtype=bool)
+        for col, value, table, key in (('city', city, self.stores, 'store_id'),
+                                       ('channel', channel, self.stores, 'store_id'),
+                                       ('category', category, self.products, 'product_id')):
+            if value and value != 'All':
+                lookup = table.drop_duplicates(key).set_index(key)[col]
+                mask &= (baseline[key].map(lookup) == value).to_numpy(dtype=bool)
+        
+        return baseline[mask].reset_index(drop=True)
+    
+    def elasticity_model(self):
+        """Price elasticities fitted from this simulator's sales history (fitted once)"""
+        if self._elasticity_model is None:
+            # A store-backed history is fitted one month partition at a time
+            sales = ((lambda: self.sales_store.iter_partitions(FIT_COLUMNS))
+                     if self.sales_store is not None else self.sales_enriched)
+            self._elasticity_model = fit_elasticities(sales)
+        return self._elasticity_model
+    
+    def apply_uplift_logic(self, baseline_df, discount_pct, channel=None, category=None,
+                           model='rules'):
         """
-        Apply rule-based demand uplift based on discount and product/channel characteristics
+        Apply demand uplift based on discount and product/channel characteristics
         
-        Assumptions:
+        model='rules' assumptions:
         - Base uplift: discount_pct / 10 (e.g., 20% discount = 2x uplift)
         - Channel multiplier: Marketplace (1.3x), App (1.2x), Web (1.0x)
         - Category multiplier: Electronics/Fashion (1.2x), Others (1.0x)
+        
+        model='elasticity' / 'sku_elasticity' use price elasticities fitted
+        from sales history per category x channel x city (or per SKU)
         """
+        if model not in UPLIFT_MODELS:
+            raise ValueError(f"Unknown uplift model: {model} (use one of {UPLIFT_MODELS})")
+        if model != 'rules':
+            return self._apply_elasticity_uplift(baseline_df, discount_pct,
+                                                 'sku' if model == 'sku_elasticity' else 'segment')
+        
         df = baseline_df.copy()
         
         # Merge with products to get category
@@ -146,19 +473,10 @@ class PromoSimulator:
         base_uplift = 1 + (discount_pct / 10)
         
         # Channel multiplier
-        channel_mult = df['channel'].map({
-            'Marketplace': 1.3,
-            'App': 1.2,
-            'Web': 1.0
-        }).fillna(1.0)
+        channel_mult = df['channel'].map(CHANNEL_UPLIFT).fillna(1.0)
         
         # Category multiplier
-        category_mult = df['category'].map({
-            'Electronics': 1.2,
-            'Fashion': 1.2,
-            'Beauty': 1.1,
-            'Sports': 1.1,
-        }).fillna(1.0)
+        category_mult = df['category'].map(CATEGORY_UPLIFT).fillna(1.0)
         
         # Calculate simulated demand
         df['uplift_factor'] = base_uplift * channel_mult * category_mult
@@ -166,89 +484,320 @@ class PromoSimulator:
         
         return df
     
+    def _apply_elasticity_uplift(self, baseline_df, discount_pct, level):
+        df = baseline_df.merge(
+            self.products[['product_id', 'category']], on='product_id', how='left'
+        ).merge(
+            self.stores[['store_id', 'channel', 'city']], on='store_id', how='left'
+        )
+        
+        uplift, elasticity = self.elasticity_model().uplift(df, discount_pct, level)
+        df = df.drop(columns='city')
+        df['elasticity'] = elasticity
+        df['uplift_factor'] = uplift
+        df['simulated_daily_demand'] = df['daily_demand'] * df['uplift_factor']
+        
+        return df
+    
+    def get_latest_inventory(self):
+        """Latest stock_on_hand, reorder_point and lead_time_days per product-store (built once, then reused)"""
+        if self._latest_inventory is None:
+            columns = [col for col in INVENTORY_COLUMNS if col in self.inventory.columns]
+            latest = self.inventory.sort_values('snapshot_date').groupby(
+                ['product_id', 'store_id']
+            ).last().reset_index()[['product_id', 'store_id'] + columns]
+            # Uploaded inventories may carry stock only: no replenishment then
+            self._latest_inventory = latest.reindex(columns=['product_id', 'store_id'] + INVENTORY_COLUMNS)
+        return self._latest_inventory
+    
     def simulate_promo(self, city='All', channel='All', category='All', 
                       discount_pct=20, promo_budget_aed=100000, 
-                      margin_floor_pct=10, simulation_days=14):
+                      margin_floor_pct=10, simulation_days=14, uplift_model='rules',
+                      baseline_model='average', include_rows=True):
         """
         Run what-if simulation with constraints
         
+        uplift_model: 'rules' (fixed multipliers), 'elasticity' (fitted per
+        category x channel x city) or 'sku_elasticity' (fitted per SKU)
+        baseline_model: 'average' (last 30 days) or 'forecast' (Holt-Winters
+        with weekly seasonality over the simulation_days horizon)
+        include_rows: build the per-row DataFrame; with False None is
+        returned in its place (totals, violations and KPIs are the same)
+        
+        Stages are memoized (bounded LRU) under the parameters they depend on,
+        so e.g. a budget or margin floor change only re-checks constraints.
+        Every call returns its own copies of the rows, violations and KPIs,
+        so callers may modify them without touching the cached stages.
+        
         Returns:
-        - Simulation results DataFrame
+        - Simulation results DataFrame (or None)
         - Constraint violations dictionary
         - Simulation KPIs
         """
-        # 1. Calculate baseline demand
-        baseline = self.calculate_baseline_demand(city, channel, category)
+        if baseline_model not in BASELINE_MODELS:
+            raise ValueError(f"Unknown baseline model: {baseline_model} (use one of {BASELINE_MODELS})")
+        if uplift_model not in UPLIFT_MODELS:
+            raise ValueError(f"Unknown uplift model: {uplift_model} (use one of {UPLIFT_MODELS})")
+        if simulation_days < 0:
+            raise ValueError(f"simulation_days must not be negative, got {simulation_days}")
+        
+        # Stage keys: each stage adds the parameters it depends on
+        horizon = simulation_days if baseline_model == 'forecast' else None
+        scope_key = (city, channel, category, baseline_model, horizon)
+        demand_key = scope_key + (discount_pct, uplift_model)
+        rows_key = demand_key + (simulation_days,)
+        result_key = rows_key + (promo_budget_aed, margin_floor_pct)
+        stage = self._stage_cache.get_or_compute
+        
+        # 1. Calculate baseline demand: (city, channel, category)
+        def baseline():
+            if baseline_model == 'forecast':
+                baseline_df = self.forecast_baseline_demand(city, channel, category, simulation_days)
+            else:
+                baseline_df = self.calculate_baseline_demand(city, channel, category)
+            return self._promo_scope(baseline_df)
+        
+        # 2. Apply uplift logic: + discount
+        def demand():
+            return self._promo_demand(stage('baseline', scope_key, baseline),
+                                      discount_pct, uplift_model)
+        
+        # 3-9. Quantities, financials, inventory and totals: + days
+        def rows():
+            return self._promo_rows(stage('baseline', scope_key, baseline),
+                                    stage('demand', demand_key, demand),
+                                    discount_pct, simulation_days)
+        
+        # 10-12. Constraints and KPIs: + budget / margin floor
+        def result():
+            rows_ = stage('rows', rows_key, rows)
+            return (rows_,) + self._promo_constraints(rows_, promo_budget_aed, margin_floor_pct)
+        
+        promo_rows, violations, sim_kpis = stage('result', result_key, result)
+        return ((promo_rows.frame().copy() if include_rows else None),
+                copy.deepcopy(violations), dict(sim_kpis))
+    
+    def stage_cache_stats(self):
+        """Entries, hits and misses of the simulate_promo stage caches"""
+        return self._stage_cache.stats()
+    
+    def promo_lookups(self):
+        """
+        Product, store and latest-inventory attributes as arrays, with the
+        indexes simulate_promo codes its rows against (built once). The
+        first row per product / store / product-store is used.
+        """
+        if self._promo_lookups is None:
+            products = self.products.drop_duplicates('product_id')
+            stores = self.stores.drop_duplicates('store_id')
+            inventory = self.get_latest_inventory()
+            self._promo_lookups = {
+                'products': pd.Index(products['product_id']),
+                'category': products['category'].array,
+                'category_uplift': products['category'].map(CATEGORY_UPLIFT).to_numpy(dtype=np.float64),
+                'base_price_aed': products['base_price_aed'].to_numpy(dtype=np.float64),
+                'unit_cost_aed': products['unit_cost_aed'].to_numpy(dtype=np.float64),
+                'stores': pd.Index(stores['store_id']),
+                'channel': stores['channel'].array,
+                'city': stores['city'].array,
+                'channel_uplift': stores['channel'].map(CHANNEL_UPLIFT).to_numpy(dtype=np.float64),
+                'inventory': pd.MultiIndex.from_frame(inventory[['product_id', 'store_id']]),
+                **{col: inventory[col].to_numpy(dtype=np.float64) for col in INVENTORY_COLUMNS},
+            }
+        return self._promo_lookups
+    
+    def _promo_scope(self, baseline):
+        """Baseline rows with their product, store and latest-inventory row codes (-1: no match)"""
+        lookups = self.promo_lookups()
+        return {
+            'product_id': baseline['product_id'].array,
+            'store_id': baseline['store_id'].array,
+            'daily_demand': baseline['daily_demand'].to_numpy(dtype=np.float64),
+            'product': lookups['products'].get_indexer(baseline['product_id']),
+            'store': lookups['stores'].get_indexer(baseline['store_id']),
+            'inventory': lookups['inventory'].get_indexer(
+                pd.MultiIndex.from_frame(baseline[['product_id', 'store_id']])),
+        }
+    
+    def _promo_demand(self, scope, discount_pct, uplift_model):
+        """uplift_factor (and elasticity for the fitted models) per baseline row"""
+        uplift, elasticity = self.uplift_factors(scope['product'], scope['store'], discount_pct,
+                                                 uplift_model, scope['product_id'])
+        if elasticity is None:
+            return {'uplift_factor': uplift}
+        return {'elasticity': elasticity, 'uplift_factor': uplift}
+    
+    def uplift_factors(self, product_codes, store_codes, discount_pct, uplift_model='rules',
+                       product_ids=None):
+        """
+        (uplift factor, elasticity or None) per row, for rows given as
+        promo_lookups() product / store codes (-1: unknown). discount_pct is
+        a scalar or one value per row; uplift_model='sku_elasticity' also
+        needs the rows' product_ids.
+        """
+        lookups = self.promo_lookups()
+        if uplift_model == 'rules':
+            # Same multipliers as apply_uplift_logic, gathered by row code
+            base_uplift = 1 + (discount_pct / 10)
+            channel_mult = _gather(lookups['channel_uplift'], store_codes, 1.0)
+            category_mult = _gather(lookups['category_uplift'], product_codes, 1.0)
+            channel_mult[np.isnan(channel_mult)] = 1.0
+            category_mult[np.isnan(category_mult)] = 1.0
+            return base_uplift * channel_mult * category_mult, None
+        
+        keys = pd.DataFrame({
+            'product_id': product_ids,
+            'category': lookups['category'].take(product_codes, allow_fill=True),
+            'channel': lookups['channel'].take(store_codes, allow_fill=True),
+            'city': lookups['city'].take(store_codes, allow_fill=True),
+        })
+        level = 'sku' if uplift_model == 'sku_elasticity' else 'segment'
+        return self.elasticity_model().uplift(keys, discount_pct, level)
+    
+    def _promo_rows(self, scope, demand, discount_pct, simulation_days):
+        """
+        Per-row simulation on aligned arrays (steps 3-9): product prices and
+        inventory are gathered by row code instead of merged, every float
+        column is written into one preallocated buffer, and the totals and
+        rankings that ignore budget and margin floor are computed directly.
+        Money is computed and totalled in int64 fils (prices rounded to the
+        fils once); the AED columns are only for display.
+        """
+        lookups = self.promo_lookups()
+        product, inventory = scope['product'], scope['inventory']
+        n = len(scope['daily_demand'])
+        base_price = _gather(lookups['base_price_aed'], product)
+        unit_cost = _gather(lookups['unit_cost_aed'], product)
+        stock = _gather(lookups['stock_on_hand'], inventory)
+        stock[np.isnan(stock)] = 0
         
-        # 2. Apply uplift logic
-        simulated = self.apply_uplift_logic(baseline, discount_pct, channel, category)
+        buffer = np.empty((8, n))
+        daily, discounted, revenue, cogs, margin, margin_pct, spend, shortfall = buffer
         
         # 3. Calculate simulated qty for the period
-        simulated['simulated_qty'] = simulated['simulated_daily_demand'] * simulation_days
-        simulated['simulated_qty'] = simulated['simulated_qty'].round().astype(int)
-        
-        # 4. Merge with products for pricing
-        simulated = simulated.merge(
-            self.products[['product_id', 'base_price_aed', 'unit_cost_aed']], 
-            on='product_id', 
-            how='left'
-        )
-        
-        # 5. Calculate financial metrics
-        simulated['discounted_price'] = simulated['base_price_aed'] * (1 - discount_pct / 100)
-        simulated['simulated_revenue'] = simulated['simulated_qty'] * simulated['discounted_price']
-        simulated['simulated_cogs'] = simulated['simulated_qty'] * simulated['unit_cost_aed']
-        simulated['simulated_margin'] = simulated['simulated_revenue'] - simulated['simulated_cogs']
-        simulated['margin_pct'] = (simulated['simulated_margin'] / simulated['simulated_revenue'] * 100).replace([np.inf, -np.inf], 0).fillna(0)
+        np.multiply(scope['daily_demand'], demand['uplift_factor'], out=daily)
+        np.multiply(daily, simulation_days, out=shortfall)
+        qty = np.rint(shortfall, out=shortfall).astype(np.int64)
+        
+        # 4-5. Pricing and financial metrics (rows without a price / cost stay NaN)
+        priced = ~np.isnan(base_price)
+        costed = ~np.isnan(unit_cost)
+        np.multiply(base_price, 1 - discount_pct / 100, out=discounted)
+        price_fils = to_fils(discounted)
+        revenue_fils = qty * price_fils
+        cogs_fils = qty * to_fils(unit_cost)
+        margin_fils = np.where(priced & costed, revenue_fils - cogs_fils, 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(margin_fils, revenue_fils, out=margin_pct)
+        np.multiply(margin_pct, 100, out=margin_pct)
+        margin_pct[~np.isfinite(margin_pct) | ~costed] = 0
         
         # 6. Calculate promo spend (discount amount)
-        simulated['promo_spend'] = simulated['simulated_qty'] * simulated['base_price_aed'] * (discount_pct / 100)
-        
-        # 7. Get latest inventory
-        latest_inventory = self.inventory.sort_values('snapshot_date').groupby(
-            ['product_id', 'store_id']
-        ).last().reset_index()[['product_id', 'store_id', 'stock_on_hand']]
-        
-        simulated = simulated.merge(
-            latest_inventory, 
-            on=['product_id', 'store_id'], 
-            how='left'
+        spend_fils = qty * (to_fils(base_price) - price_fils)
+        
+        for fils, aed, valid in ((price_fils, discounted, priced), (revenue_fils, revenue, priced),
+                                 (cogs_fils, cogs, costed), (margin_fils, margin, priced & costed),
+                                 (spend_fils, spend, priced)):
+            np.divide(fils, FILS_PER_AED, out=aed)
+            aed[~valid] = np.nan
+        
+        # 7-8. Stockout risk against the latest inventory
+        stockout_risk = qty > stock
+        np.subtract(qty, stock, out=shortfall)
+        np.maximum(shortfall, 0, out=shortfall)
+        
+        # 8b. Day-by-day depletion with reorders at reorder_point
+        reorder_point = _gather(lookups['reorder_point'], inventory)
+        lead_time_days = _gather(lookups['lead_time_days'], inventory)
+        replenishment = simulate_replenishment(
+            qty / max(simulation_days, 1), stock, reorder_point, lead_time_days,
+            simulation_days, unit_price=discounted
         )
-        simulated['stock_on_hand'] = simulated['stock_on_hand'].fillna(0)
-        
-        # 8. Check stockout risk
-        simulated['stockout_risk'] = simulated['simulated_qty'] > simulated['stock_on_hand']
-        simulated['stock_shortfall'] = (simulated['simulated_qty'] - simulated['stock_on_hand']).clip(lower=0)
+        lost_fils = to_fils(replenishment['lost_revenue'])
+        replenishment['lost_revenue'] = to_aed(lost_fils)
+        
+        columns = {
+            'product_id': scope['product_id'],
+            'store_id': scope['store_id'],
+            'daily_demand': scope['daily_demand'],
+            'category': lookups['category'].take(product, allow_fill=True),
+            'channel': lookups['channel'].take(scope['store'], allow_fill=True),
+            **demand,
+            'simulated_daily_demand': daily,
+            'simulated_qty': qty,
+            'base_price_aed': base_price,
+            'unit_cost_aed': unit_cost,
+            'discounted_price': discounted,
+            'simulated_revenue': revenue,
+            'simulated_cogs': cogs,
+            'simulated_margin': margin,
+            'margin_pct': margin_pct,
+            'promo_spend': spend,
+            'stock_on_hand': stock,
+            'reorder_point': reorder_point,
+            'lead_time_days': lead_time_days,
+            'stockout_risk': stockout_risk,
+            'stock_shortfall': shortfall,
+            **replenishment,
+        }
         
         # 9. Calculate overall metrics
-        total_promo_spend = simulated['promo_spend'].sum()
-        total_revenue = simulated['simulated_revenue'].sum()
-        total_margin = simulated['simulated_margin'].sum()
-        overall_margin_pct = (total_margin / total_revenue * 100) if total_revenue > 0 else 0
+        # Rows by revenue, highest first (ties in row order, like nlargest),
+        # so the margin-floor check only has to mask a precomputed ranking
+        by_revenue = np.argsort(-revenue, kind='stable')
+        by_revenue = by_revenue[~np.isnan(revenue[by_revenue])]
+        totals = {
+            'rows': n,
+            'promo_spend_fils': sum_fils(spend_fils),
+            'revenue_fils': sum_fils(revenue_fils),
+            'margin_fils': sum_fils(margin_fils),
+            'stockouts_exist': stockout_risk.any(),
+            'stockout_rows': stockout_risk.sum(),
+            'projected_stockouts': np.count_nonzero(~np.isnan(replenishment['stockout_day'])),
+            'lost_revenue_fils': sum_fils(lost_fils),
+            'margin_pct_by_revenue': margin_pct[by_revenue],
+            'margin_candidates': {
+                col: columns[col][by_revenue]
+                for col in ['product_id', 'store_id', 'margin_pct', 'simulated_revenue']
+            },
+            'top_budget_contributors': _records(
+                columns, _top_rows(spend), ['product_id', 'store_id', 'promo_spend']),
+            'top_stockout_risks': _records(
+                columns, _top_rows(shortfall, mask=stockout_risk),
+                ['product_id', 'store_id', 'simulated_qty', 'stock_on_hand', 'stock_shortfall']),
+        }
+        
+        return PromoRows(columns, totals)
+    
+    @staticmethod
+    def _promo_constraints(rows, promo_budget_aed, margin_floor_pct):
+        """Constraint checks and KPIs for a cached per-row simulation"""
+        totals = rows.totals
+        total_promo_spend = to_aed(totals['promo_spend_fils'])
+        total_revenue = to_aed(totals['revenue_fils'])
+        total_margin = to_aed(totals['margin_fils'])
+        overall_margin_pct = (totals['margin_fils'] / totals['revenue_fils'] * 100
+                              if totals['revenue_fils'] > 0 else 0)
         profit_proxy = total_margin  # Simplified profit
         
         # 10. Check constraints
         violations = {
             'budget_exceeded': total_promo_spend > promo_budget_aed,
             'margin_below_floor': overall_margin_pct < margin_floor_pct,
-            'stockouts_exist': simulated['stockout_risk'].any(),
+            'stockouts_exist': totals['stockouts_exist'],
             'budget_utilization_pct': (total_promo_spend / promo_budget_aed * 100) if promo_budget_aed > 0 else 0,
             'margin_gap': margin_floor_pct - overall_margin_pct if overall_margin_pct < margin_floor_pct else 0,
-            'stockout_risk_pct': (simulated['stockout_risk'].sum() / len(simulated) * 100) if len(simulated) > 0 else 0
+            'stockout_risk_pct': (totals['stockout_rows'] / totals['rows'] * 100) if totals['rows'] > 0 else 0
         }
         
         # 11. Identify top violators
-        violations['top_budget_contributors'] = simulated.nlargest(10, 'promo_spend')[
-            ['product_id', 'store_id', 'promo_spend']
-        ].to_dict('records')
+        violations['top_budget_contributors'] = totals['top_budget_contributors']
         
-        violations['top_margin_violators'] = simulated[simulated['margin_pct'] < margin_floor_pct].nlargest(10, 'simulated_revenue')[
-            ['product_id', 'store_id', 'margin_pct', 'simulated_revenue']
-        ].to_dict('records')
+        below_floor = np.flatnonzero(totals['margin_pct_by_revenue'] < margin_floor_pct)[:10]
+        violations['top_margin_violators'] = _records(
+            totals['margin_candidates'], below_floor, list(totals['margin_candidates']))
         
-        violations['top_stockout_risks'] = simulated[simulated['stockout_risk']].nlargest(10, 'stock_shortfall')[
-            ['product_id', 'store_id', 'simulated_qty', 'stock_on_hand', 'stock_shortfall']
-        ].to_dict('records')
+        violations['top_stockout_risks'] = totals['top_stockout_risks']
         
         # 12. Simulation KPIs
         sim_kpis = {
@@ -259,73 +808,98 @@ class PromoSimulator:
             'profit_proxy': profit_proxy,
             'budget_utilization_pct': violations['budget_utilization_pct'],
             'stockout_risk_pct': violations['stockout_risk_pct'],
-            'high_risk_skus': simulated['stockout_risk'].sum()
+            'high_risk_skus': totals['stockout_rows'],
+            'projected_stockouts': totals['projected_stockouts'],
+            'lost_revenue': to_aed(totals['lost_revenue_fils'])
         }
         
-        return simulated, violations, sim_kpis
+        return violations, sim_kpis
     
-    def get_time_series_data(self, freq='D'):
+    def recommend_transfers(self, simulated, by='city', keep_safety_stock=True):
+        """
+        Inter-store transfers covering the stock_shortfall of a simulate_promo
+        result from stores of the same city (or channel) with stock beyond
+        their simulated demand. Stores holding a product without simulated
+        demand for it donate too; donors keep reorder_point units unless
+        keep_safety_stock is False. Returns (transfers, summary).
+        """
+        demand = simulated[['product_id', 'store_id', 'simulated_qty']]
+        latest = self.get_latest_inventory()
+        positions = latest[latest['product_id'].isin(demand['product_id'])].merge(
+            demand, on=['product_id', 'store_id'], how='outer'
+        )
+        stock = positions['stock_on_hand'].fillna(0)
+        qty = positions['simulated_qty'].fillna(0)
+        reserve = positions['reorder_point'].fillna(0) if keep_safety_stock else 0
+        positions['surplus'] = (stock - qty - reserve).clip(lower=0)
+        positions['shortfall'] = (qty - stock).clip(lower=0)
+        positions[by] = positions['store_id'].map(
+            self.stores.drop_duplicates('store_id').set_index('store_id')[by]
+        )
+        return rebalance_transfers(positions, by)
+    
+    def rollups(self, city=None, channel=None, category=None, brand=None, start=None, end=None):
+        """
+        Grouping-set rollups of paid sales matching the filters (see
+        rollups.GROUPING_SETS: city_channel, category, brand, day, week and
+        total), computed in one scan and cached per filter signature.
+        start / end bound order_time as [start, end).
+        """
+        key = (city, channel, category, brand, start, end)
+        return self._stage_cache.get_or_compute('rollups', key, lambda: self._compute_rollups(*key))
+    
+    def _compute_rollups(self, city, channel, category, brand, start, end):
+        filters = {'city': city, 'channel': channel, 'category': category, 'brand': brand}
+        if self.sales_store is not None:
+            # Month by month; partials are integer sums, so they merge exactly
+            partials = None
+            for part in self.sales_store.iter_partitions(
+                    ROLLUP_COLUMNS, start=start, end=end, filters={**filters, 'payment_status': 'Paid'}):
+                partials = merge_rollups(partials, rollup_partials(part))
+            return finalize_rollups(partials or rollup_partials(self.sales_store.scan(ROLLUP_COLUMNS)[:0]))
+        
+        df = self.sales_enriched
+        mask = _sales_mask(df, filters, start, end)
+        return finalize_rollups(rollup_partials(df[mask] if not mask.all() else df))
+    
+    def get_time_series_data(self, freq='D', start=None, end=None):
         """Get daily/weekly time series for trend charts"""
-        df = self.sales_enriched[self.sales_enriched['payment_status'] == 'Paid'].copy()
-        df['order_time'] = pd.to_datetime(df['order_time'])
-        df['revenue'] = df['qty'] * df['selling_price_aed']
-        df['cogs'] = df['qty'] * df['unit_cost_aed']
-        df['margin'] = df['revenue'] - df['cogs']
-        
         if freq == 'D':
-            ts = df.set_index('order_time').resample('D').agg({
-                'revenue': 'sum',
-                'margin': 'sum',
-                'qty': 'sum'
-            }).reset_index()
-        else:  # Weekly
-            ts = df.set_index('order_time').resample('W').agg({
-                'revenue': 'sum',
-                'margin': 'sum',
-                'qty': 'sum'
-            }).reset_index()
-        
+            rows = self.rollups(start=start, end=end)['day'].rename(columns={'day': 'order_time'})
+            step = pd.Timedelta(days=1)
+        else:  # Weekly, labelled by the week's Sunday (like resample('W'))
+            rows = self.rollups(start=start, end=end)['week'].rename(columns={'week': 'order_time'})
+            rows['order_time'] += pd.Timedelta(days=6)
+            step = pd.Timedelta(weeks=1)
+        
+        if rows.empty:
+            return pd.DataFrame(columns=['order_time', 'revenue', 'margin', 'qty', 'margin_pct'])
+        
+        # Every period in range, empty ones as zero
+        periods = pd.date_range(rows['order_time'].min(), rows['order_time'].max(), freq=step)
+        ts = rows.set_index('order_time')[['revenue', 'margin', 'qty']].reindex(periods, fill_value=0)
+        ts = ts.rename_axis('order_time').reset_index()
         ts['margin_pct'] = (ts['margin'] / ts['revenue'] * 100).replace([np.inf, -np.inf], 0).fillna(0)
         
         return ts
     
     def get_city_channel_breakdown(self):
         """Get revenue breakdown by city and channel"""
-        df = self.sales_enriched[self.sales_enriched['payment_status'] == 'Paid'].copy()
-        df['revenue'] = df['qty'] * df['selling_price_aed']
-        
-        breakdown = df.groupby(['city', 'channel']).agg({
-            'revenue': 'sum',
-            'qty': 'sum'
-        }).reset_index()
-        
-        return breakdown
+        return self.rollups()['city_channel'][['city', 'channel', 'revenue', 'qty']]
     
     def get_category_margin(self):
         """Get margin % by category"""
-        df = self.sales_enriched[self.sales_enriched['payment_status'] == 'Paid'].copy()
-        df['revenue'] = df['qty'] * df['selling_price_aed']
-        df['cogs'] = df['qty'] * df['unit_cost_aed']
-        df['margin'] = df['revenue'] - df['cogs']
-        
-        cat_margin = df.groupby('category').agg({
-            'revenue': 'sum',
-            'margin': 'sum'
-        }).reset_index()
-        
-        cat_margin['margin_pct'] = (cat_margin['margin'] / cat_margin['revenue'] * 100).replace([np.inf, -np.inf], 0).fillna(0)
-        
-        return cat_margin
+        return self.rollups()['category'][['category', 'revenue', 'margin', 'margin_pct']]
+
 
 def main():
     """Test the simulator"""
     print("Loading cleaned datasets...")
     
     try:
-        products = pd.read_csv('products_clean.csv')
-        stores = pd.read_csv('stores_clean.csv')
-        sales = pd.read_csv('sales_clean.csv')
-        inventory = pd.read_csv('inventory_clean.csv')
+        tables = read_tables(table_paths(CLEAN_FILES))
+        products, stores, sales, inventory = (tables['products'], tables['stores'],
+                                              tables['sales'], tables['inventory'])
         
         print("Initializing simulator...")
         sim = PromoSimulator(products, stores, sales, inventory)
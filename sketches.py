@@ -0,0 +1,307 @@
+"""
+UAE Promo Pulse - Sketches
+Mergeable constant-memory summaries of sales: HyperLogLog distinct counts
+and KLL quantiles, kept per city x channel x category segment
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+
+HLL_PRECISION = 12      # 4096 registers, ~1.6% standard error at any cardinality
+QUANTILE_K = 200        # top compactor size, ~1% rank error
+SKETCH_SEED = 42
+
+SEGMENT_COLUMNS = ['city', 'channel', 'category']
+# Reported name -> sales column
+DISTINCT_COLUMNS = {'distinct_orders': 'order_id', 'distinct_products': 'product_id'}
+# Cleaned sales have one row per order, so a row's qty is its basket qty
+QUANTILE_COLUMNS = {'discount_pct': 'discount_pct', 'selling_price_aed': 'selling_price_aed',
+                    'basket_qty': 'qty'}
+SKETCH_COLUMNS = list(DISTINCT_COLUMNS.values()) + list(QUANTILE_COLUMNS.values()) + SEGMENT_COLUMNS
+PERCENTILES = (50, 90, 99)
+
+
+def _hll_sigma(x):
+    """Ertl's correction for the share x of empty registers"""
+    if x == 1:
+        return np.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _hll_tau(x):
+    """Ertl's correction for the share x of saturated registers"""
+    if x == 0 or x == 1:
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = np.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+def _bit_length(values):
+    """Number of significant bits of each uint64"""
+    values = values.copy()
+    length = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >= np.uint64(1 << shift)
+        length += high * shift
+        values[high] >>= np.uint64(shift)
+    return length + (values > 0)
+
+
+class HyperLogLog:
+    """
+    Distinct-count sketch: each value's 64-bit hash picks a register by its
+    top `precision` bits and records the position of the first set bit in
+    the rest. Merging takes register-wise maxima, so chunks and workers can
+    sketch separately and combine exactly as if they had seen all values.
+    """
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=object)
+        values = values[~pd.isna(values)]
+        if not len(values):
+            return self
+        # Ids are mostly distinct, so hashing them directly beats categorizing first
+        hashes = pd.util.hash_array(values, categorize=False)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        # The low sentinel bit caps the rank at 64 - precision + 1
+        rest = (hashes << np.uint64(self.precision)) | np.uint64(1 << (self.precision - 1))
+        rank = (65 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches of precision {self.precision} and {other.precision}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        """
+        Estimated number of distinct values. Uses Ertl's improved estimator
+        (2017), which corrects for empty and saturated registers directly, so
+        there is no biased switchover between linear counting and the raw
+        HyperLogLog estimate.
+        """
+        m = len(self.registers)
+        q = 64 - self.precision
+        counts = np.bincount(self.registers, minlength=q + 2).astype(np.float64)
+        z = m * _hll_tau(1 - counts[q + 1] / m)
+        for rank in range(q, 0, -1):
+            z = 0.5 * (z + counts[rank])
+        z += m * _hll_sigma(counts[0] / m)
+        return int(round(m * m / (2 * np.log(2) * z)))
+
+    def to_dict(self):
+        return {'precision': self.precision, 'registers': self.registers.tobytes().hex()}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['precision'])
+        sketch.registers = np.frombuffer(bytes.fromhex(data['registers']), dtype=np.uint8).copy()
+        return sketch
+
+
+class QuantileSketch:
+    """
+    KLL quantile sketch: a stack of compactors where an item at level h
+    stands for 2**h values. A level over its capacity is sorted and every
+    other item (random offset) moves up a level, so memory stays O(k) for
+    any number of values. Merging stacks the levels and compacts again.
+    """
+
+    def __init__(self, k=QUANTILE_K, seed=SKETCH_SEED):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        # Capacities shrink geometrically below the top level
+        return max(8, int(np.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - level))))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                odd = len(items) % 2
+                promoted = items[odd:][self._rng.integers(2)::2]
+                self.levels[level] = items[:odd]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.count += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge quantile sketches with k={self.k} and k={other.k}")
+        self.levels += [np.empty(0)] * (len(other.levels) - len(self.levels))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        """Estimated values at quantiles qs (0..1); NaN for an empty sketch"""
+        qs = np.asarray(qs, dtype=np.float64)
+        if not self.count:
+            return np.full(qs.shape, np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items_), 2.0 ** level)
+                                  for level, items_ in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, qs * cumulative[-1], side='left')
+        result = items[order][np.minimum(positions, len(items) - 1)]
+        # Extremes are tracked exactly
+        return np.where(qs <= 0, self.min, np.where(qs >= 1, self.max, result))
+
+    def to_dict(self):
+        return {'k': self.k, 'count': self.count, 'min': float(self.min), 'max': float(self.max),
+                'levels': [items.tolist() for items in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['k'])
+        sketch.count = data['count']
+        sketch.min, sketch.max = data['min'], data['max']
+        sketch.levels = [np.asarray(items, dtype=np.float64) for items in data['levels']]
+        return sketch
+
+
+class SalesSketches:
+    """
+    HyperLogLog distinct order / product counts and KLL quantiles of
+    discount_pct, selling_price_aed and basket qty per city x channel x
+    category segment. update() takes any chunk of enriched sales (columns
+    it lacks are skipped); sketches of different chunks or processes
+    combine with merge(). Any city / channel / category filter is answered
+    by merging the matching segments.
+    """
+
+    def __init__(self):
+        self.segments = {}
+
+    @staticmethod
+    def _new_segment():
+        segment = {name: HyperLogLog() for name in DISTINCT_COLUMNS}
+        segment.update({name: QuantileSketch() for name in QUANTILE_COLUMNS})
+        return segment
+
+    def update(self, sales):
+        # Plain arrays: Series keys would align on the chunk's index, not its positions
+        keys = [sales[col].astype(object).to_numpy() for col in SEGMENT_COLUMNS]
+        groups = pd.Series(np.zeros(len(sales))).groupby(keys, dropna=False, sort=False).indices
+        columns = {**DISTINCT_COLUMNS, **QUANTILE_COLUMNS}
+        values = {name: sales[col].to_numpy() for name, col in columns.items() if col in sales}
+        for key, rows in groups.items():
+            key = tuple(None if pd.isna(part) else str(part) for part in key)
+            segment = self.segments.setdefault(key, self._new_segment())
+            for name, column in values.items():
+                segment[name].update(column[rows])
+        return self
+
+    def merge(self, other):
+        for key, segment in other.segments.items():
+            mine = self.segments.setdefault(key, self._new_segment())
+            for name, sketch in segment.items():
+                mine[name].merge(sketch)
+        return self
+
+    def select(self, city=None, channel=None, category=None):
+        """One merged segment for the matching city / channel / category ('All' / None: any)"""
+        filters = dict(zip(SEGMENT_COLUMNS, (city, channel, category)))
+        merged = self._new_segment()
+        for key, segment in self.segments.items():
+            if all(not value or value == 'All' or part == value
+                   for part, value in zip(key, filters.values())):
+                for name, sketch in segment.items():
+                    merged[name].merge(sketch)
+        return merged
+
+    @staticmethod
+    def _describe(segment, percentiles):
+        row = {name: segment[name].count() for name in DISTINCT_COLUMNS}
+        for name in QUANTILE_COLUMNS:
+            estimates = segment[name].quantiles(np.asarray(percentiles) / 100)
+            row.update({f"{name}_p{p}": float(v) for p, v in zip(percentiles, estimates)})
+        return row
+
+    def summary(self, city=None, channel=None, category=None, percentiles=PERCENTILES):
+        """Distinct orders / products and p50 / p90 / p99 of each quantile column"""
+        return self._describe(self.select(city, channel, category), percentiles)
+
+    def breakdown(self, by='channel', city=None, channel=None, category=None, percentiles=PERCENTILES):
+        """summary() per value of one segment column, within the filters"""
+        filters = dict(zip(SEGMENT_COLUMNS, (city, channel, category)))
+        position = SEGMENT_COLUMNS.index(by)
+        values = sorted({key[position] for key in self.segments if key[position] is not None})
+        rows = []
+        for value in values:
+            if filters[by] and filters[by] not in ('All', value):
+                continue
+            row = self._describe(self.select(**{**filters, by: value}), percentiles)
+            rows.append({by: value, **row})
+        return pd.DataFrame(rows)
+
+    def to_dict(self):
+        return {'segments': [
+            {'key': list(key), **{name: sketch.to_dict() for name, sketch in segment.items()}}
+            for key, segment in self.segments.items()
+        ]}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketches = cls()
+        for entry in data['segments']:
+            segment = {name: HyperLogLog.from_dict(entry[name]) for name in DISTINCT_COLUMNS}
+            segment.update({name: QuantileSketch.from_dict(entry[name]) for name in QUANTILE_COLUMNS})
+            sketches.segments[tuple(entry['key'])] = segment
+        return sketches
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,28 @@
+"""
+UAE Promo Pulse - Test fixtures
+Simulator over the cleaned sample datasets in clean_data/
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, 'clean_data')
+sys.path.insert(0, ROOT)
+
+from ingest import CLEAN_FILES, read_tables, table_paths  # noqa: E402
+from simulator import PromoSimulator  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def tables():
+    """Cleaned products, stores, sales and inventory frames"""
+    return read_tables(table_paths(CLEAN_FILES, DATA_DIR))
+
+
+@pytest.fixture(scope='session')
+def sim(tables):
+    """In-memory simulator shared by all tests (read-only)"""
+    return PromoSimulator(tables['products'], tables['stores'], tables['sales'], tables['inventory'])
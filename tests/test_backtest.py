@@ -0,0 +1,59 @@
+"""
+UAE Promo Pulse - Backtest tests
+Trailing-window sums and scoring over the sample sales history
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import run_backtest, trailing_sums
+from simulator import PromoSimulator
+
+
+def test_trailing_sums_match_brute_force():
+    rng = np.random.default_rng(3)
+    series = rng.integers(0, 6, 2000)
+    days = rng.integers(0, 90, 2000)
+    values = rng.integers(0, 10, 2000).astype(np.float64)
+    query_series = rng.integers(0, 7, 500)
+    query_days = rng.integers(0, 95, 500)
+
+    sums = trailing_sums(series, days, values, query_series, query_days, window=30)
+    expected = [values[(series == s) & (days >= d - 30) & (days <= d - 1)].sum()
+                for s, d in zip(query_series, query_days)]
+    np.testing.assert_array_equal(sums, expected)
+
+
+def test_segment_metrics_add_up_to_summary(sim):
+    metrics, summary = run_backtest(sim)
+    total, _ = run_backtest(sim, by=[])
+
+    assert summary['cells'] > 0
+    assert metrics['cells'].sum() == summary['cells'] == total.loc[0, 'cells']
+    assert metrics['realized_qty'].sum() == pytest.approx(summary['realized_qty'])
+    assert metrics['realized_revenue'].sum() == pytest.approx(summary['realized_revenue'])
+    assert summary['start'] > pd.Timestamp(sim.sales_enriched['order_time'].min()).date()
+
+
+def test_discount_levels_filter_cells(sim):
+    metrics, summary = run_backtest(sim, discount_levels=[10, 20], by=['discount_pct'])
+    assert set(metrics['discount_pct']) <= {10.0, 20.0}
+    assert metrics['cells'].sum() == summary['cells']
+
+
+def test_empty_range_returns_zero_cells(sim):
+    metrics, summary = run_backtest(sim, start='2030-01-01')
+    assert metrics.empty
+    assert list(metrics.columns[:3]) == ['category', 'channel', 'city']
+    assert summary['cells'] == 0
+    assert np.isnan(summary['wape_pct'])
+
+
+def test_no_paid_sales_returns_zero_cells(tables):
+    sales = tables['sales'].assign(payment_status='Failed')
+    unpaid = PromoSimulator(tables['products'], tables['stores'], sales, tables['inventory'])
+    metrics, summary = run_backtest(unpaid)
+    assert metrics.empty
+    assert summary['cells'] == 0
+    assert summary['start'] is None and summary['end'] is None
@@ -0,0 +1,41 @@
+"""
+UAE Promo Pulse - Batch runner tests
+Scenario loading and single- vs multi-process scoring
+"""
+
+import pandas as pd
+
+from batch_runner import SCENARIO_DEFAULTS, load_scenarios, run_batch
+from conftest import DATA_DIR
+
+
+def write_scenarios(tmp_path):
+    path = tmp_path / 'scenarios.csv'
+    pd.DataFrame({
+        'city': ['All', 'Dubai', 'Sharjah', 'All', 'Abu Dhabi'],
+        'channel': ['All', 'App', 'All', 'Web', 'All'],
+        'category': ['Electronics', 'All', 'All', 'All', 'All'],
+        'discount_pct': [25, 10, 30, 15, 20],
+        'simulation_days': [14, 7, 10, None, -1],
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+def test_load_scenarios_applies_defaults(tmp_path):
+    scenarios = load_scenarios(write_scenarios(tmp_path))
+    assert list(scenarios.columns) == ['scenario_id'] + list(SCENARIO_DEFAULTS)
+    assert scenarios['scenario_id'].tolist() == [f"SC{i:06d}" for i in range(1, 6)]
+    assert scenarios.loc[3, 'simulation_days'] == SCENARIO_DEFAULTS['simulation_days']
+    assert (scenarios['promo_budget_aed'] == SCENARIO_DEFAULTS['promo_budget_aed']).all()
+
+
+def test_workers_match_single_process(tmp_path):
+    scenarios = load_scenarios(write_scenarios(tmp_path))
+    results, violations = run_batch(scenarios, DATA_DIR, workers=1)
+    pooled, pooled_violations = run_batch(scenarios, DATA_DIR, workers=2, chunksize=1)
+
+    pd.testing.assert_frame_equal(results, pooled)
+    pd.testing.assert_frame_equal(violations, pooled_violations)
+    assert results['error'].isna().sum() == 4
+    assert 'simulation_days' in results.loc[4, 'error']
+    assert set(violations['scenario_id']) <= set(results['scenario_id'][:4])
@@ -0,0 +1,86 @@
+"""
+UAE Promo Pulse - Inventory simulation tests
+Interval-overlap transfer matching against a per-group greedy reference
+"""
+
+import numpy as np
+import pandas as pd
+
+from inventory_sim import rebalance_transfers
+
+
+def random_positions(seed, rows=400):
+    rng = np.random.default_rng(seed)
+    surplus = rng.integers(0, 12, rows) * (rng.random(rows) < 0.5)
+    return pd.DataFrame({
+        'product_id': rng.choice([f"P{i:03d}" for i in range(25)], rows),
+        'store_id': [f"S{i:04d}" for i in range(rows)],
+        'city': rng.choice(['Dubai', 'Abu Dhabi', 'Sharjah', None], rows),
+        'surplus': surplus,
+        'shortfall': rng.integers(0, 12, rows) * (surplus == 0),
+    })
+
+
+def greedy_transfers(positions, by='city'):
+    """Largest donors to largest shortfalls, one product x pool at a time"""
+    rows = []
+    positions = positions[positions['product_id'].notna() & positions[by].notna()]
+    for (product, pool), group in positions.groupby(['product_id', by], sort=False):
+        donors = group[group['surplus'] > 0].sort_values('surplus', ascending=False, kind='stable')
+        receivers = group[group['shortfall'] > 0].sort_values('shortfall', ascending=False, kind='stable')
+        donors = [[store, units] for store, units in zip(donors['store_id'], donors['surplus'])]
+        receivers = [[store, units] for store, units in zip(receivers['store_id'], receivers['shortfall'])]
+        d = r = 0
+        while d < len(donors) and r < len(receivers):
+            qty = min(donors[d][1], receivers[r][1])
+            rows.append((product, pool, donors[d][0], receivers[r][0], qty))
+            donors[d][1] -= qty
+            receivers[r][1] -= qty
+            d += donors[d][1] == 0
+            r += receivers[r][1] == 0
+    return pd.DataFrame(rows, columns=['product_id', by, 'from_store', 'to_store', 'qty'])
+
+
+def test_transfers_match_greedy_reference():
+    for seed in range(5):
+        positions = random_positions(seed)
+        transfers, summary = rebalance_transfers(positions)
+        expected = greedy_transfers(positions)
+
+        key = ['product_id', 'city', 'from_store', 'to_store']
+        pd.testing.assert_frame_equal(
+            transfers.sort_values(key).reset_index(drop=True),
+            expected.sort_values(key).reset_index(drop=True),
+            check_dtype=False,
+        )
+        assert summary['transfers'] == len(expected)
+        assert summary['units_moved'] == expected['qty'].sum()
+        assert summary['residual_shortfall'] == summary['shortfall_before'] - summary['units_moved']
+
+
+def test_transfers_respect_stock_and_pools():
+    positions = random_positions(7)
+    transfers, _ = rebalance_transfers(positions)
+    stores = positions.set_index('store_id')
+
+    assert (transfers['qty'] > 0).all()
+    sent = transfers.groupby('from_store')['qty'].sum()
+    received = transfers.groupby('to_store')['qty'].sum()
+    assert (sent <= stores.loc[sent.index, 'surplus']).all()
+    assert (received <= stores.loc[received.index, 'shortfall']).all()
+    for side in ('from_store', 'to_store'):
+        assert (stores.loc[transfers[side], 'product_id'].to_numpy() == transfers['product_id']).all()
+        assert (stores.loc[transfers[side], 'city'].to_numpy() == transfers['city']).all()
+
+
+def test_no_transfers_without_matching_demand():
+    positions = pd.DataFrame({
+        'product_id': ['P1', 'P1', 'P2'],
+        'store_id': ['S1', 'S2', 'S3'],
+        'city': ['Dubai', 'Sharjah', 'Dubai'],
+        'surplus': [5, 0, 0],
+        'shortfall': [0, 4, 3],
+    })
+    transfers, summary = rebalance_transfers(positions)
+    assert transfers.empty
+    assert summary == {'transfers': 0, 'units_moved': 0, 'shortfall_before': 7, 'residual_shortfall': 7}
@@ -0,0 +1,81 @@
+"""
+UAE Promo Pulse - Money tests
+Fils rounding and compute_kpis against the original float implementation
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar_store import SalesStore
+from money import line_fils, sum_fils, to_aed, to_fils
+from simulator import PromoSimulator
+
+
+def reference_kpis(df):
+    """compute_kpis as first written: float sums straight over the rows"""
+    paid = df[df['payment_status'] == 'Paid']
+    refunded = df[df['payment_status'] == 'Refunded']
+    gross_revenue = (paid['qty'] * paid['selling_price_aed']).sum()
+    refund_amount = (refunded['qty'] * refunded['selling_price_aed']).sum()
+    net_revenue = gross_revenue - refund_amount
+    cogs = (paid['qty'] * paid['unit_cost_aed']).sum()
+    gross_margin = net_revenue - cogs
+    return {
+        'gross_revenue': gross_revenue,
+        'refund_amount': refund_amount,
+        'net_revenue': net_revenue,
+        'cogs': cogs,
+        'gross_margin_aed': gross_margin,
+        'gross_margin_pct': gross_margin / net_revenue * 100 if net_revenue > 0 else 0,
+        'avg_discount_pct': df['discount_pct'].mean(),
+        'return_rate_pct': (df['return_flag'] == 'Y').sum() / len(df) * 100 if len(df) else 0,
+        'payment_failure_rate_pct': (df['payment_status'] == 'Failed').sum() / len(df) * 100 if len(df) else 0,
+        'total_transactions': len(df),
+    }
+
+
+def test_to_fils_rounds_once_and_zeroes_missing():
+    assert to_fils([1.25, 19.99, np.nan, -3.1, 0.004]).tolist() == [125, 1999, 0, -310, 0]
+    assert to_fils(12.5).dtype == np.int64
+    assert to_aed(np.array([125, -310])).tolist() == [1.25, -3.1]
+    assert line_fils([3, 2], [19.99, 0.10]).tolist() == [5997, 20]
+
+
+def test_fils_sums_are_order_independent():
+    rng = np.random.default_rng(0)
+    fils = line_fils(rng.integers(1, 20, 100_000), rng.integers(100, 100_000, 100_000) / 100)
+    total = sum_fils(fils)
+    assert isinstance(total, int)
+    assert total == sum_fils(rng.permutation(fils))
+    assert total == sum(sum_fils(part) for part in np.array_split(fils, 7))
+
+
+def test_compute_kpis_matches_reference(sim):
+    kpis = sim.compute_kpis()
+    expected = reference_kpis(sim.sales_enriched)
+    assert kpis.keys() == expected.keys()
+    for name, value in expected.items():
+        assert kpis[name] == pytest.approx(value, rel=1e-9, abs=0.01), name
+
+
+def test_filtered_kpis_match_reference(sim):
+    df = sim.sales_enriched
+    kpis = sim.filtered_kpis(city='Dubai', channel='App')
+    expected = reference_kpis(df[(df['city'] == 'Dubai') & (df['channel'] == 'App')])
+    for name, value in expected.items():
+        assert kpis[name] == pytest.approx(value, rel=1e-9, abs=0.01), name
+
+
+def test_store_backed_kpis_are_exact(sim, tables, tmp_path):
+    # Month partitions sum in a different order; integer fils must not drift
+    shuffled = tables['sales'].sample(frac=1, random_state=1)
+    chunks = [shuffled.iloc[start:start + 10_000] for start in range(0, len(shuffled), 10_000)]
+    store = SalesStore.build(chunks, str(tmp_path / 'store'), tables['products'], tables['stores'])
+    stored = PromoSimulator.from_store(tables['products'], tables['stores'], store, tables['inventory'])
+
+    kpis, expected = stored.compute_kpis(), sim.compute_kpis()
+    for name in ('gross_revenue', 'refund_amount', 'net_revenue', 'cogs', 'gross_margin_aed',
+                 'total_transactions'):
+        assert kpis[name] == expected[name], name
+    assert kpis['avg_discount_pct'] == pytest.approx(expected['avg_discount_pct'], rel=1e-12)
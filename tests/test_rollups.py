@@ -0,0 +1,62 @@
+"""
+UAE Promo Pulse - Rollup tests
+Grouping-set rollups against pandas groupby over the paid sales
+"""
+
+import numpy as np
+import pandas as pd
+
+from money import line_fils
+from rollups import ROLLUP_COLUMNS, finalize_rollups, merge_rollups, rollup_partials
+
+
+def paid_sales(sim):
+    paid = sim.sales_enriched[sim.sales_enriched['payment_status'] == 'Paid'].copy()
+    paid['revenue_fils'] = line_fils(paid['qty'], paid['selling_price_aed'])
+    paid['cogs_fils'] = line_fils(paid['qty'], paid['unit_cost_aed'])
+    paid['day'] = pd.to_datetime(paid['order_time']).dt.normalize()
+    return paid
+
+
+def test_partials_match_groupby(sim):
+    partials = rollup_partials(sim.sales_enriched)
+    paid = paid_sales(sim)
+
+    expected = paid.groupby(['city', 'channel']).agg(
+        revenue_fils=('revenue_fils', 'sum'), cogs_fils=('cogs_fils', 'sum'),
+        qty=('qty', 'sum'), orders=('qty', 'size')).reset_index()
+    actual = partials['city_channel'][expected.columns]
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+    days = paid.groupby('day')['revenue_fils'].sum()
+    result = finalize_rollups(partials)
+    np.testing.assert_array_equal(result['day']['day'], days.index)
+    np.testing.assert_array_equal(partials['day']['revenue_fils'], days.to_numpy())
+    assert partials['total']['orders'].iloc[0] == len(paid)
+
+
+def test_weeks_start_on_monday(sim):
+    partials = rollup_partials(sim.sales_enriched)
+    weeks = finalize_rollups(partials)['week']
+    assert (weeks['week'].dt.dayofweek == 0).all()
+    # Every grouping set covers the same paid rows, so fils totals agree exactly
+    for name in ('week', 'day', 'category', 'city_channel'):
+        assert partials[name]['revenue_fils'].sum() == partials['total']['revenue_fils'].iloc[0], name
+
+
+def test_merged_chunks_equal_one_pass(sim):
+    sales = sim.sales_enriched[ROLLUP_COLUMNS]
+    merged = None
+    for start in range(0, len(sales), 7_000):
+        merged = merge_rollups(merged, rollup_partials(sales.iloc[start:start + 7_000]))
+    whole = rollup_partials(sales)
+    for name, frame in whole.items():
+        pd.testing.assert_frame_equal(merged[name].reset_index(drop=True), frame, check_dtype=False, obj=name)
+
+
+def test_breakdown_views_use_rollups(sim):
+    breakdown = sim.get_city_channel_breakdown()
+    paid = paid_sales(sim)
+    expected = paid.groupby(['city', 'channel'])['revenue_fils'].sum() / 100
+    actual = breakdown.set_index(['city', 'channel'])['revenue']
+    np.testing.assert_allclose(actual.loc[expected.index], expected, rtol=0, atol=1e-6)
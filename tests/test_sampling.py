@@ -0,0 +1,66 @@
+"""
+UAE Promo Pulse - Sampling tests
+Stratified estimates, their variances and confidence-interval coverage
+"""
+
+import numpy as np
+import pytest
+
+from sampling import SAMPLE_COLUMNS, estimate_kpis, merge_samples, stratified_sample
+
+MONEY_KPIS = ['gross_revenue', 'net_revenue', 'cogs', 'gross_margin_aed']
+RATE_KPIS = ['gross_margin_pct', 'return_rate_pct', 'payment_failure_rate_pct']
+REPEATS = 150
+
+
+def test_census_sample_is_exact(sim):
+    # Every row sampled: estimates are exact and the finite population correction zeroes the variance
+    sample = stratified_sample(sim.sales_enriched, fraction=1.0)
+    kpis, intervals = estimate_kpis(sample)
+    expected = sim.compute_kpis()
+    for name in MONEY_KPIS + RATE_KPIS + ['avg_discount_pct', 'total_transactions']:
+        assert kpis[name] == pytest.approx(expected[name], rel=1e-9), name
+        assert intervals[name][0] == pytest.approx(intervals[name][1], abs=1e-6), name
+
+
+def test_sample_keeps_minimum_rows_per_stratum(sim):
+    sample = stratified_sample(sim.sales_enriched)
+    sizes = sample.groupby('stratum').size()
+    population = sample.groupby('stratum')['stratum_rows'].first()
+    assert (sizes == np.minimum(population, np.maximum(30, np.ceil(population * 0.02)))).all()
+    assert population.sum() == len(sim.sales_enriched)
+
+
+def test_merged_samples_keep_strata_apart(sim):
+    sales = sim.sales_enriched
+    half = len(sales) // 2
+    left = stratified_sample(sales.iloc[:half])
+    merged = merge_samples(left, stratified_sample(sales.iloc[half:]))
+    assert merged['stratum'].nunique() == left['stratum'].nunique() + merged['stratum'][len(left):].nunique()
+    kpis, _ = estimate_kpis(merged)
+    assert kpis['total_transactions'] == pytest.approx(len(sales))
+
+
+def test_variance_and_coverage_over_repeated_samples(sim):
+    sales = sim.sales_enriched[SAMPLE_COLUMNS]
+    mask_of = lambda sample: (sample['city'] == 'Dubai').to_numpy()
+    truth = sim.filtered_kpis(city='Dubai')
+    estimates = {name: [] for name in MONEY_KPIS + RATE_KPIS}
+    half_widths = {name: [] for name in estimates}
+    covered = {name: 0 for name in estimates}
+    for seed in range(REPEATS):
+        sample = stratified_sample(sales, rng=np.random.default_rng(seed))
+        kpis, intervals = estimate_kpis(sample, mask_of(sample))
+        for name in estimates:
+            low, high = intervals[name]
+            estimates[name].append(kpis[name])
+            half_widths[name].append((high - low) / 2)
+            covered[name] += low <= truth[name] <= high
+
+    for name in estimates:
+        # Unbiased, predicted spread close to the observed one, ~95% coverage
+        spread = np.std(estimates[name], ddof=1)
+        predicted = np.sqrt(np.mean(np.square(half_widths[name]))) / 1.959964
+        assert abs(np.mean(estimates[name]) - truth[name]) < 4 * spread / np.sqrt(REPEATS), name
+        assert 0.75 < predicted / spread < 1.3, name
+        assert covered[name] / REPEATS >= 0.88, name
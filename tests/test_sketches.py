@@ -0,0 +1,63 @@
+"""
+UAE Promo Pulse - Sketch tests
+HyperLogLog and KLL accuracy, and merges equal to sketching the union
+"""
+
+import numpy as np
+import pytest
+
+from sketches import HyperLogLog, QuantileSketch, SalesSketches
+
+
+@pytest.mark.parametrize('n', [50, 1_000, 5_000, 10_000, 20_000, 200_000])
+def test_hll_count_error(n):
+    # Around the old linear-counting switchover (~10k for 4096 registers) too
+    errors = []
+    for seed in range(5):
+        ids = np.array([f"O{seed}-{i}" for i in range(n)], dtype=object)
+        errors.append(HyperLogLog().update(ids).count() / n - 1)
+    assert abs(np.mean(errors)) < 0.02
+    assert np.max(np.abs(errors)) < 0.05
+
+
+def test_hll_merge_equals_union():
+    ids = np.array([f"O{i}" for i in range(30_000)], dtype=object)
+    whole = HyperLogLog().update(ids)
+    parts = [HyperLogLog().update(part) for part in np.array_split(ids, 4)]
+    # Overlapping chunks and duplicates must not change the union
+    parts.append(HyperLogLog().update(ids[5_000:9_000]))
+    merged = HyperLogLog()
+    for part in parts:
+        merged.merge(part)
+    np.testing.assert_array_equal(merged.registers, whole.registers)
+    assert merged.count() == whole.count()
+    assert HyperLogLog().count() == 0
+    assert HyperLogLog.from_dict(whole.to_dict()).count() == whole.count()
+
+
+def test_kll_merge_quantiles():
+    rng = np.random.default_rng(5)
+    values = rng.lognormal(3, 1, 200_000)
+    merged = QuantileSketch()
+    for part in np.array_split(values, 8):
+        merged.merge(QuantileSketch().update(part))
+
+    qs = np.array([0.01, 0.1, 0.5, 0.9, 0.99])
+    ranks = np.searchsorted(np.sort(values), merged.quantiles(qs)) / len(values)
+    assert np.max(np.abs(ranks - qs)) < 0.02
+    assert merged.count == len(values)
+    assert merged.quantiles([0, 1]).tolist() == [values.min(), values.max()]
+
+
+def test_sales_sketches_match_exact_counts(sim):
+    sales = sim.sales_enriched
+    sketches = SalesSketches()
+    for start in range(0, len(sales), 8_000):
+        sketches.merge(SalesSketches().update(sales.iloc[start:start + 8_000]))
+
+    for city, orders in sales.groupby('city')['order_id'].nunique().items():
+        assert sketches.summary(city=city)['distinct_orders'] == pytest.approx(orders, rel=0.05), city
+    summary = sketches.summary()
+    assert summary['distinct_orders'] == pytest.approx(sales['order_id'].nunique(), rel=0.03)
+    assert summary == SalesSketches.from_dict(sketches.to_dict()).summary()
+    assert summary['discount_pct_p50'] == pytest.approx(sales['discount_pct'].median(), abs=5)